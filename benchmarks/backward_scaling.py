@@ -0,0 +1,53 @@
+"""Backward time vs. graph size.
+
+Two graphs are built for increasing sizes n:
+- chain:  y = (((x * a) + b) * a) + b ...        (narrow frontier)
+- fan-in: y = x*w_0 + x*w_1 + ... + x*w_{n-1}    (the Mul nodes pile up
+          in the backward queue while the Add chain is processed)
+
+With the heap-based scheduler each Function is pushed and popped once, so
+the time per node should stay roughly flat as n grows.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+
+
+def chain(n):
+    x = Variable(np.ones((4, 4)))
+    y = x
+    for i in range(n // 2):
+        y = y * 1.0001
+        y = y + 0.5
+    return x, y
+
+
+def fan_in(n):
+    x = Variable(np.ones((4, 4)))
+    y = x * 1.0
+    for i in range(n // 2):
+        y = y + x * float(i)
+    return x, y
+
+
+def measure(build, n, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        x, y = build(n)
+        start = time.perf_counter()
+        y.backward()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    sizes = [1000, 2000, 4000, 8000, 16000]
+    for build in (chain, fan_in):
+        print(build.__name__)
+        print('{:>8} {:>12} {:>14}'.format('nodes', 'backward[s]', 'per node[us]'))
+        for n in sizes:
+            t = measure(build, n)
+            print('{:>8} {:>12.4f} {:>14.2f}'.format(n, t, t / n * 1e6))
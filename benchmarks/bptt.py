@@ -0,0 +1,64 @@
+"""Memory of training an LSTM on a long sequence.
+
+- full:       the losses of the whole sequence are summed and
+              backpropagated once at the end (the graph grows with length)
+- truncated:  `TruncatedBPTT` with bptt_length=30
+
+Memory is the bytes allocated (tracemalloc) right before the last
+backward, time is per step.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import gc
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+from dezero import Model, optimizers
+from dezero.bptt import TruncatedBPTT
+
+
+class Net(Model):
+    def __init__(self, hidden_size=64):
+        super().__init__()
+        self.rnn = L.LSTM(hidden_size)
+        self.fc = L.Linear(1)
+
+    def forward(self, x):
+        return self.fc(self.rnn(x))
+
+
+def run(length, bptt_length):
+    np.random.seed(0)
+    xs = np.sin(np.linspace(0, 100, length + 1)).reshape(-1, 1, 1)
+    xs = np.tile(xs, (1, 16, 1)).astype(np.float32)
+    model = Net()
+    optimizer = optimizers.Adam().setup(model)
+    bptt = TruncatedBPTT(model, optimizer, bptt_length)
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    peak = 0
+    for x, t in zip(xs[:-1], xs[1:]):
+        loss = F.mean_squared_error(model(x), t)
+        if bptt.steps == bptt.bptt_length - 1:
+            peak = max(peak, tracemalloc.get_traced_memory()[0])
+        bptt.add(loss)
+    peak = max(peak, tracemalloc.get_traced_memory()[0])
+    bptt.flush()
+    elapsed = (time.perf_counter() - start) / length
+    tracemalloc.stop()
+    return peak, elapsed, bptt.graph
+
+
+if __name__ == '__main__':
+    print('{:>7} {:>10} {:>10} {:>9} {:>8}'.format(
+        'length', 'policy', 'mem[MB]', 'step[ms]', 'nodes'))
+    for length in (600, 1200, 2400):
+        for name, bptt_length in (('full', length), ('truncated', 30)):
+            peak, elapsed, graph = run(length, bptt_length)
+            print('{:>7} {:>10} {:>10.1f} {:>9.2f} {:>8}'.format(
+                length, name, peak / 2 ** 20, elapsed * 1e3, graph['nodes']))
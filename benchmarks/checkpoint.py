@@ -0,0 +1,66 @@
+"""Memory of a conv stack with and without `F.checkpoint`.
+
+The stack has 8 Conv2d+ReLU layers split in 4 segments. With checkpointing
+only the segment inputs are kept after forward; the rest is recomputed
+during backward.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+from dezero import Model
+
+
+class ConvStack(Model):
+    def __init__(self, use_checkpoint, channels=32, depth=8, segment=2):
+        super().__init__()
+        self.use_checkpoint = use_checkpoint
+        self.segment = segment
+        self.convs = []
+        for i in range(depth):
+            conv = L.Conv2d(channels, kernel_size=3, pad=1)
+            setattr(self, 'conv' + str(i), conv)
+            self.convs.append(conv)
+        self.fc = L.Linear(10)
+
+    def run(self, convs):
+        def fn(x):
+            for conv in convs:
+                x = F.relu(conv(x))
+            return x
+        return fn
+
+    def forward(self, x):
+        for i in range(0, len(self.convs), self.segment):
+            fn = self.run(self.convs[i:i + self.segment])
+            x = F.checkpoint(fn, x) if self.use_checkpoint else fn(x)
+        return self.fc(F.flatten(x))
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    x = np.random.randn(8, 3, 32, 32).astype(np.float32)
+    t = np.random.randint(0, 10, 8)
+    MB = 2 ** 20
+    print('{:>10} {:>10} {:>10} {:>10}'.format('checkpoint', 'graph[MB]',
+                                               'peak[MB]', 'step[s]'))
+    for use_checkpoint in (False, True):
+        model = ConvStack(use_checkpoint)
+        model(x)  # initialize the parameters
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        base = tracemalloc.get_traced_memory()[0]
+        loss = F.softmax_cross_entropy(model(x), t)
+        graph = tracemalloc.get_traced_memory()[0] - base
+        model.cleargrads()
+        loss.backward()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+        print('{:>10} {:>10.1f} {:>10.1f} {:>10.2f}'.format(
+            str(use_checkpoint), graph / MB, peak / MB, elapsed))
@@ -0,0 +1,52 @@
+"""Directional derivative of a model with few inputs and many outputs.
+
+J v for an MLP R^8 -> R^1024 (batch 64) computed
+- forward: one `dezero.jvp` pass
+- reverse: one backward per output (rows of J), then J v
+
+The forward-mode pass keeps no graph.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable, jvp
+from dezero.models import MLP
+
+
+def forward_mode(model, x, v):
+    _, ty = jvp(model, [x], [v])
+    return ty
+
+
+def reverse_mode(model, x, v):
+    x = Variable(x)
+    y = model(x)
+    ty = np.empty_like(y.data)
+    for j in range(y.shape[1]):
+        x.cleargrad()
+        y[:, j].backward(retain_graph=True)  # reused for every output
+        ty[:, j] = (x.grad.data * v).sum(axis=1)
+    return ty
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    model = MLP([256, 1024])
+    x = np.random.randn(64, 8)
+    v = np.random.randn(64, 8)
+    model(x)
+
+    start = time.perf_counter()
+    ty_f = forward_mode(model, x, v)
+    t_f = time.perf_counter() - start
+    start = time.perf_counter()
+    ty_r = reverse_mode(model, x, v)
+    t_r = time.perf_counter() - start
+
+    print('max relative difference: {:.2e}'.format(
+        np.abs(ty_f - ty_r).max() / np.abs(ty_r).max()))
+    print('{:>8} {:>10}'.format('mode', 'time[ms]'))
+    print('{:>8} {:>10.1f}'.format('forward', t_f * 1e3))
+    print('{:>8} {:>10.1f}'.format('reverse', t_r * 1e3))
@@ -0,0 +1,57 @@
+"""Fine-tuning VGG16 with a frozen convolutional backbone.
+
+- full:     every parameter is trained
+- frozen:   conv1_1 ... conv5_3 have `requires_grad = False`; only the fc
+            layers are trained
+- forward:  the forward pass alone under `no_grad` (lower bound)
+
+With the backbone frozen and raw input data no graph is recorded for the
+convolutions, so the step should cost one forward pass plus the backward
+of the fc layers.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+import dezero.functions as F
+from dezero import no_grad
+from dezero.models import VGG16
+
+
+def step(model, x, t):
+    loss = F.softmax_cross_entropy(model(x), t)
+    model.cleargrads()
+    loss.backward()
+
+
+def forward(model, x, t):
+    with no_grad():
+        F.softmax_cross_entropy(model(x), t)
+
+
+def measure(fn, model, x, t, repeat=3):
+    fn(model, x, t)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(model, x, t)
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    x = np.random.randn(4, 3, 32, 32).astype(np.float32)
+    t = np.random.randint(0, 1000, 4)
+    model = VGG16()
+
+    full = measure(step, model, x, t)
+    for name in model._params:
+        if name.startswith('conv'):
+            for param in getattr(model, name).params():
+                param.requires_grad = False
+    frozen = measure(step, model, x, t)
+    fwd = measure(forward, model, x, t)
+
+    print('{:>8} {:>10}'.format('mode', 'step[ms]'))
+    for name, elapsed in (('full', full), ('frozen', frozen), ('forward', fwd)):
+        print('{:>8} {:>10.1f}'.format(name, elapsed * 1e3))
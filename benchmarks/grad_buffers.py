@@ -0,0 +1,55 @@
+"""Gradient accumulation with and without persistent buffers.
+
+A Linear layer shared by `branches` inputs receives one gradient per branch.
+By default every extra contribution allocates a new array (and an Add
+node); with `Config.inplace_grad` the contributions are summed into a
+buffer owned by the Parameter.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+from dezero import Model, using_config
+
+
+class SharedLinear(Model):
+    def __init__(self, size):
+        super().__init__()
+        self.l = L.Linear(size, in_size=size)
+
+    def forward(self, *xs):
+        y = 0
+        for x in xs:
+            y = y + F.sum(self.l(x))
+        return y
+
+
+def run(inplace, size=512, branches=16, steps=20):
+    np.random.seed(0)
+    model = SharedLinear(size)
+    xs = [np.random.randn(8, size).astype(np.float32) for _ in range(branches)]
+
+    with using_config('inplace_grad', inplace):
+        model.cleargrads()
+        model(*xs).backward()  # warm up (allocates the buffers)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.cleargrads()
+            model(*xs).backward()
+        elapsed = (time.perf_counter() - start) / steps
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == '__main__':
+    print('{:>8} {:>10} {:>12}'.format('inplace', 'step[ms]', 'peak[MB]'))
+    for inplace in (False, True):
+        t, peak = run(inplace)
+        print('{:>8} {:>10.2f} {:>12.2f}'.format(str(inplace), t * 1e3, peak / 2**20))
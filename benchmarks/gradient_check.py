@@ -0,0 +1,50 @@
+"""Per-element central differences against `utils.gradient_check` (random
+projections) on a VGG16-sized Conv2d(512, 3) with a 14x14 input.
+
+The per-element check needs two forwards per parameter; its time is
+extrapolated from the first 20 elements of W.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+from dezero import no_grad
+from dezero.utils import gradient_check
+
+
+def per_element(layer, x, n, eps=1e-4):
+    W = layer.W.data.reshape(-1)
+    for i in range(n):
+        w = W[i]
+        with no_grad():
+            W[i] = w + eps
+            plus = F.sum(layer(x)).data
+            W[i] = w - eps
+            minus = F.sum(layer(x)).data
+        W[i] = w
+        (plus - minus) / (2 * eps)
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    layer = L.Conv2d(512, 3, pad=1)
+    x = np.random.randn(2, 512, 14, 14).astype(np.float32)
+    layer(x)
+    size = sum(p.data.size for p in layer.params()) + x.size
+
+    n = 20
+    start = time.perf_counter()
+    per_element(layer, x, n)
+    naive = (time.perf_counter() - start) / n * size
+
+    start = time.perf_counter()
+    error = gradient_check(layer, x)
+    fast = time.perf_counter() - start
+
+    print('coordinates:      {}'.format(size))
+    print('per element:      {:.0f} s (extrapolated)'.format(naive))
+    print('gradient_check:   {:.1f} s, worst relative error {:.1e}'.format(
+        fast, error))
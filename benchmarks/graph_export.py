@@ -0,0 +1,53 @@
+"""Graph export of large graphs with `utils.write_graph`.
+
+- chain:  y = -(-(...(x))) with n Functions (2n nodes), full export
+- rnn:    an RNN unrolled over T steps, full / collapsed to one node per
+          RNN call / limited to 10 hops
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import os
+import tempfile
+import time
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+from dezero import Variable, utils
+
+
+def export(y, fmt='dot', **kwargs):
+    path = os.path.join(tempfile.gettempdir(), 'dezero_graph.' + fmt)
+    start = time.perf_counter()
+    utils.write_graph(y, path, fmt, **kwargs)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    os.remove(path)
+    return elapsed, size
+
+
+def report(name, y, **kwargs):
+    for fmt in ('dot', 'json'):
+        elapsed, size = export(y, fmt, **kwargs)
+        print('{:<28} {:>5} {:>8.2f} s {:>9.0f} KB'.format(
+            name, fmt, elapsed, size / 1024))
+
+
+if __name__ == '__main__':
+    n = 500000
+    y = Variable(np.array(1.0))
+    for _ in range(n):
+        y = -y
+    report('chain {} nodes'.format(2 * n), y)
+    del y
+
+    T = 20000
+    rnn = L.RNN(8)
+    x = np.random.randn(1, 4)
+    with L.record_layers():
+        for _ in range(T):
+            h = rnn(x)
+        loss = F.sum(h)
+    report('rnn T={} full'.format(T), loss)
+    report('rnn T={} collapse'.format(T), loss, collapse=True)
+    report('rnn T={} max_depth=10'.format(T), loss, collapse=True, max_depth=10)
@@ -0,0 +1,51 @@
+"""Memory of backward with the graph kept (`retain_graph=True`) and freed
+as it is processed (the default).
+
+A deep tanh MLP is trained for one step while the loss is still held, as in
+a usual training loop:
+- graph: bytes allocated after forward (the activations kept for backward)
+- peak:  peak bytes during backward
+- after: bytes still allocated after backward, before the loss is dropped
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+from dezero.models import MLP
+
+
+def run(retain_graph):
+    np.random.seed(0)
+    x = np.random.randn(512, 256).astype(np.float32)
+    model = MLP([512] * 16 + [1], activation=F.tanh)
+    model(x)  # initialize the parameters
+    for param in model.params():
+        param.grad = None
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    loss = F.sum(model(x))
+    graph = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    loss.backward(retain_graph=retain_graph)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - base
+    # the gradients of the parameters are not part of the graph
+    grads = sum(p.grad.data.nbytes for p in model.params())
+    after = tracemalloc.get_traced_memory()[0] - base - grads
+    tracemalloc.stop()
+    return graph, peak, after, elapsed
+
+
+if __name__ == '__main__':
+    MB = 2 ** 20
+    print('{:>12} {:>10} {:>10} {:>10} {:>12}'.format(
+        'retain_graph', 'graph[MB]', 'peak[MB]', 'after[MB]', 'backward[ms]'))
+    for retain_graph in (True, False):
+        graph, peak, after, elapsed = run(retain_graph)
+        print('{:>12} {:>10.1f} {:>10.1f} {:>10.1f} {:>12.1f}'.format(
+            str(retain_graph), graph / MB, peak / MB, after / MB, elapsed * 1e3))
@@ -0,0 +1,56 @@
+"""Batch-1 inference latency.
+
+- graph:   plain forward (the graph is recorded)
+- no_grad: under `no_grad()`/`test_mode()`, where Functions call forward
+           on the arrays directly and record no graph
+- numpy:   the same MLP written directly in NumPy (lower bound)
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import timeit
+import numpy as np
+from dezero import no_grad, test_mode
+from dezero.models import MLP, VGG16
+
+
+def best(fn, number, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def mlp_numpy(params, x):
+    for W, b in params[:-1]:
+        x = np.tanh((x.dot(W) + b) * 0.5) * 0.5 + 0.5
+    W, b = params[-1]
+    return x.dot(W) + b
+
+
+def report(name, model, x, number, numpy_fn=None):
+    def inference():
+        with no_grad(), test_mode():
+            return model(x)
+
+    def graph():
+        with test_mode():
+            return model(x)
+
+    print('{}:'.format(name))
+    print('  {:<8} {:>10.3f} ms'.format('graph', best(graph, number) * 1e3))
+    print('  {:<8} {:>10.3f} ms'.format('no_grad', best(inference, number) * 1e3))
+    if numpy_fn is not None:
+        print('  {:<8} {:>10.3f} ms'.format('numpy', best(numpy_fn, number) * 1e3))
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    x = np.random.randn(1, 784).astype(np.float32)
+    mlp = MLP([100, 100, 10])
+    mlp(x)
+    params = [(l.W.data, l.b.data) for l in mlp.layers]
+    report('MLP 784-100-100-10', mlp, x, 10000, lambda: mlp_numpy(params, x))
+
+    x = np.random.randn(1, 3, 224, 224).astype(np.float32)
+    vgg = VGG16()
+    with no_grad():
+        vgg(x)
+    report('VGG16 224x224', vgg, x, 1, None)
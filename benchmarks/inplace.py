@@ -0,0 +1,82 @@
+"""`F.relu` against the in-place `F.relu_` in a stack of conv layers and in
+a stack of wide linear layers.
+
+For each variant one training step is measured:
+- graph: bytes still allocated after forward (the activations kept for
+  backward)
+- fwd:   peak bytes during forward (the conv output and the relu output
+         are both alive unless relu works in place)
+- step:  time of forward + backward
+
+The forward peak of the conv stack is set by the im2col buffer of Conv2d,
+so it only changes for the linear stack.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+from dezero import Model
+
+
+class Stack(Model):
+    def __init__(self, layers, relu):
+        super().__init__()
+        self.relu = relu
+        self.stack = layers
+        for i, layer in enumerate(layers):
+            setattr(self, 'l%d' % i, layer)
+
+    def forward(self, x):
+        for layer in self.stack:
+            x = self.relu(layer(x))
+        return x
+
+
+def conv_stack(relu, depth=8):
+    x = np.random.randn(16, 32, 32, 32).astype(np.float32)
+    return Stack([L.Conv2d(32, 3, pad=1) for _ in range(depth)], relu), x
+
+
+def linear_stack(relu, depth=8):
+    x = np.random.randn(1024, 2048).astype(np.float32)
+    return Stack([L.Linear(2048) for _ in range(depth)], relu), x
+
+
+def run(build, relu, steps=3):
+    np.random.seed(0)
+    model, x = build(relu)
+
+    def step(measure=False):
+        if measure:
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+        loss = F.sum(model(x))
+        if measure:
+            graph, peak = [m - base for m in tracemalloc.get_traced_memory()]
+            tracemalloc.stop()
+        model.cleargrads()
+        loss.backward()
+        if measure:
+            return graph, peak
+
+    step()  # initialize the parameters
+    graph, peak = step(measure=True)
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    return graph, peak, (time.perf_counter() - start) / steps
+
+
+if __name__ == '__main__':
+    MB = 2 ** 20
+    print('{:>8} {:>8} {:>10} {:>10} {:>10}'.format(
+        'stack', 'relu', 'graph[MB]', 'fwd[MB]', 'step[ms]'))
+    for stack, build in (('conv', conv_stack), ('linear', linear_stack)):
+        for name, relu in (('relu', F.relu), ('relu_', F.relu_)):
+            graph, peak, elapsed = run(build, relu)
+            print('{:>8} {:>8} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+                stack, name, graph / MB, peak / MB, elapsed * 1e3))
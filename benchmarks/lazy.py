@@ -0,0 +1,73 @@
+"""Eager against lazy evaluation (`dezero.lazy.lazy`) under no_grad.
+
+- matmul chain:  (x W1) W2 with a wide x W1; lazy reassociates it to
+                 x (W1 W2)
+- bias chain:    linear(x, W, b1) + b2 + b3; lazy adds the biases together
+                 and then once to x W
+- elementwise:   tanh(exp(-x * 2) + 1) * 3; lazy writes every op into the
+                 buffer of the previous temporary
+
+For each case the time and the peak memory of one evaluation are shown.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+from dezero import Variable, no_grad
+from dezero.lazy import lazy
+
+np.random.seed(0)
+x = Variable(np.random.randn(2000, 64))
+W1 = Variable(np.random.randn(64, 2000))
+W2 = Variable(np.random.randn(2000, 16))
+W = Variable(np.random.randn(64, 1024))
+b1, b2, b3 = [Variable(np.random.randn(1024)) for _ in range(3)]
+big = Variable(np.random.randn(1000, 1000))
+
+
+def matmul_chain():
+    return F.matmul(F.matmul(x, W1), W2)
+
+
+def bias_chain():
+    return F.linear(x, W, b1) + b2 + b3
+
+
+def elementwise():
+    return F.tanh(F.exp(-big * 2) + 1) * 3
+
+
+def measure(fn, use_lazy, repeat=5):
+    def run():
+        with no_grad():
+            if use_lazy:
+                with lazy():
+                    y = fn()
+            else:
+                y = fn()
+            return y.data
+
+    run()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return (time.perf_counter() - start) / repeat, peak
+
+
+if __name__ == '__main__':
+    MB = 2 ** 20
+    print('{:<14} {:>10} {:>10} {:>10} {:>10}'.format(
+        'case', 'eager[ms]', 'lazy[ms]', 'eager[MB]', 'lazy[MB]'))
+    for name, fn in (('matmul chain', matmul_chain), ('bias chain', bias_chain),
+                     ('elementwise', elementwise)):
+        te, me = measure(fn, False)
+        tl, ml = measure(fn, True)
+        print('{:<14} {:>10.2f} {:>10.2f} {:>10.1f} {:>10.1f}'.format(
+            name, te * 1e3, tl * 1e3, me / MB, ml / MB))
@@ -0,0 +1,70 @@
+"""Mixed precision (float16 activations, float32 master weights) against
+pure float32.
+
+For each policy one training step of an MLP is measured:
+- graph: bytes still allocated after forward (the activations kept for
+  backward)
+- peak:  peak bytes during forward + backward + update
+- step:  time of forward + backward + update
+
+With mixed precision the input batch is given in float16, as a data
+pipeline would provide it. On CPU the float16 products are accumulated in
+float32 (see `utils.dot`), so the extra casts make the step slower; the
+speedup only shows on a GPU with float16 arithmetic (cupy).
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+from dezero import optimizers, using_config
+from dezero.models import MLP
+
+
+def run(compute_dtype, steps=5):
+    np.random.seed(0)
+    x = np.random.randn(2048, 784).astype(compute_dtype or np.float32)
+    t = np.random.randint(0, 10, 2048)
+    model = MLP([256, 256, 10])
+    optimizer = optimizers.SGD().setup(model)
+    scaler = None
+    if compute_dtype is not None:
+        scaler = optimizers.LossScaler()
+        optimizer.set_loss_scaler(scaler)
+
+    def step(measure=False):
+        if measure:
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+        with using_config('compute_dtype', compute_dtype):
+            y = model(x)
+        loss = F.softmax_cross_entropy(F.astype(y, np.float32), t)
+        if measure:
+            graph = tracemalloc.get_traced_memory()[0] - base
+        model.cleargrads()
+        (loss if scaler is None else scaler.scale(loss)).backward()
+        optimizer.update()
+        if measure:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            tracemalloc.stop()
+            return graph, peak
+
+    step()  # initialize the parameters
+    graph, peak = step(measure=True)
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    elapsed = (time.perf_counter() - start) / steps
+    return graph, peak, elapsed
+
+
+if __name__ == '__main__':
+    MB = 2 ** 20
+    print('{:>8} {:>10} {:>10} {:>10}'.format('policy', 'graph[MB]',
+                                             'peak[MB]', 'step[ms]'))
+    for name, dtype in (('float32', None), ('mixed', np.float16)):
+        graph, peak, elapsed = run(dtype)
+        print('{:>8} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            name, graph / MB, peak / MB, elapsed * 1e3))
@@ -0,0 +1,90 @@
+"""Hessian-vector products and Newton-CG.
+
+- hvp:    one `hvp` against forming the Hessian explicitly (one double
+          backward per parameter, as the steps scripts do for Newton's
+          method), time and peak memory
+- train:  full-batch regression with an MLP, NewtonCG against Adam and
+          SGD (loss after the same wall time)
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+from dezero import hvp, optimizers
+from dezero.models import MLP
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def explicit_hessian(loss, params):
+    for p in params:
+        p.cleargrad()
+    loss.backward(create_graph=True)
+    grads = [p.grad for p in params]
+    rows = []
+    for g in grads:
+        flat = F.reshape(g, (-1,))
+        for i in range(flat.shape[0]):
+            for p in params:
+                p.cleargrad()
+            flat[i].backward(retain_graph=True)
+            rows.append(np.concatenate([p.grad.data.ravel() for p in params]))
+    H = np.stack(rows)
+    for p, g in zip(params, grads):
+        p.grad = g
+    return H
+
+
+def train(optimizer, model, x, t, seconds):
+    optimizer.setup(model)
+    start = time.perf_counter()
+    steps = 0
+    while time.perf_counter() - start < seconds:
+        loss = F.mean_squared_error(model(x), t)
+        if isinstance(optimizer, optimizers.NewtonCG):
+            optimizer.update(loss)
+        else:
+            model.cleargrads()
+            loss.backward()
+            optimizer.update()
+        steps += 1
+    return float(F.mean_squared_error(model(x), t).data), steps
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    x = np.random.randn(256, 8)
+    t = np.sin(x.sum(axis=1, keepdims=True))
+
+    model = MLP([16, 1], activation=F.tanh)
+    loss = F.mean_squared_error(model(x), t)
+    params = list(model.params())
+    v = [np.random.randn(*p.shape) for p in params]
+    n = sum(p.size for p in params)
+    t_hvp, m_hvp = measure(lambda: hvp(loss, params, v))
+    t_h, m_h = measure(lambda: explicit_hessian(loss, params))
+    print('{} parameters'.format(n))
+    print('{:<10} {:>10} {:>10}'.format('', 'time[ms]', 'peak[KB]'))
+    print('{:<10} {:>10.1f} {:>10.0f}'.format('hvp', t_hvp * 1e3, m_hvp / 1024))
+    print('{:<10} {:>10.1f} {:>10.0f}'.format('Hessian', t_h * 1e3, m_h / 1024))
+
+    print()
+    print('{:<10} {:>10} {:>8}'.format('optimizer', 'loss', 'steps'))
+    for name, optimizer in (('SGD', optimizers.SGD(lr=0.1)),
+                            ('Adam', optimizers.Adam(alpha=0.01)),
+                            ('NewtonCG', optimizers.NewtonCG(max_iter=20))):
+        np.random.seed(1)
+        model = MLP([16, 1], activation=F.tanh)
+        loss, steps = train(optimizer, model, x, t, seconds=2.0)
+        print('{:<10} {:>10.4f} {:>8}'.format(name, loss, steps))
@@ -0,0 +1,56 @@
+"""Per-op Python overhead on tiny arrays.
+
+- Variable():         creating a Variable
+- add (graph):        x + y with backprop enabled (Function, Variable,
+                      weakref and generation bookkeeping)
+- add (no_grad):      x + y with backprop disabled
+- tanh+backward:      F.tanh(x) followed by backward
+- bytes/node:         memory of one Function and its output Variable
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import gc
+import sys
+import timeit
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+from dezero import Variable, no_grad
+
+x = Variable(np.array(1.0))
+y = Variable(np.array(2.0))
+a = np.array(1.0)
+
+
+def tanh_backward():
+    z = F.tanh(x)
+    z.backward()
+
+
+def bytes_per_node(n=10000):
+    gc.collect()
+    tracemalloc.start()
+    z = x
+    for _ in range(n):
+        z = -z
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / n
+
+
+if __name__ == '__main__':
+    number = 100000
+    cases = [
+        ('Variable()', lambda: Variable(a)),
+        ('add (graph)', lambda: x + y),
+    ]
+    for name, fn in cases:
+        t = min(timeit.repeat(fn, number=number, repeat=3)) / number
+        print('{:<16} {:>8.2f} us'.format(name, t * 1e6))
+    with no_grad():
+        t = min(timeit.repeat(lambda: x + y, number=number, repeat=3)) / number
+    print('{:<16} {:>8.2f} us'.format('add (no_grad)', t * 1e6))
+    t = min(timeit.repeat(tanh_backward, number=number // 10, repeat=3)) / (number // 10)
+    print('{:<16} {:>8.2f} us'.format('tanh+backward', t * 1e6))
+    print('{:<16} {:>8.0f} B'.format('bytes/node', bytes_per_node()))
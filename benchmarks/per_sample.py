@@ -0,0 +1,74 @@
+"""Per-sample gradients and Jacobians: Python loop against one vectorized
+pass.
+
+- per-sample grads: one backward per sample vs `batching.per_sample_grads`
+- jacobian: one backward per output element vs `batching.jacobian`
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+import dezero.functions as F
+from dezero import Variable
+from dezero.batching import per_sample_grads, jacobian
+from dezero.models import MLP
+
+
+def timeit(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def loop_grads(model, x, t):
+    grads = {}
+    for n in range(len(x)):
+        model.cleargrads()
+        F.softmax_cross_entropy(model(x[n:n + 1]), t[n:n + 1]).backward()
+        for p in model.params():
+            grads.setdefault(p, []).append(p.grad.data)
+    return {p: np.stack(g) for p, g in grads.items()}
+
+
+def loop_jacobian(model, x):
+    x = Variable(x)
+    y = model(x)
+    N, M = y.shape
+    J = np.empty((N, M) + x.shape[1:], dtype=x.dtype)
+    for m in range(M):
+        seed = np.zeros(y.shape, dtype=y.dtype)
+        seed[:, m] = 1
+        x.cleargrad()
+        y.grad = Variable(seed)
+        y.backward(retain_graph=True)
+        J[:, m] = x.grad.data
+    return J
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    x = np.random.randn(256, 64).astype(np.float32)
+    t = np.random.randint(0, 10, 256)
+    model = MLP([128, 128, 10])
+    model(x)
+
+    ref = loop_grads(model, x, t)
+    grads = per_sample_grads(model, F.softmax_cross_entropy, x, t)
+    err = max(np.abs(grads[p] - ref[p]).max() for p in ref)
+    t_loop = timeit(lambda: loop_grads(model, x, t))
+    t_vec = timeit(lambda: per_sample_grads(model, F.softmax_cross_entropy, x, t))
+    print('per-sample grads  loop {:8.1f} ms  vectorized {:8.1f} ms  '
+          'x{:.1f}  max err {:.1e}'.format(t_loop * 1e3, t_vec * 1e3,
+                                           t_loop / t_vec, err))
+
+    xs = x[:32]
+    err = np.abs(jacobian(model, xs) - loop_jacobian(model, xs)).max()
+    t_loop = timeit(lambda: loop_jacobian(model, xs))
+    t_vec = timeit(lambda: jacobian(model, xs))
+    print('jacobian          loop {:8.1f} ms  vectorized {:8.1f} ms  '
+          'x{:.1f}  max err {:.1e}'.format(t_loop * 1e3, t_vec * 1e3,
+                                           t_loop / t_vec, err))
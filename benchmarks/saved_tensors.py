@@ -0,0 +1,56 @@
+"""Memory held by the graph with and without the saved-tensor policy.
+
+For each model one training step is measured with tracemalloc:
+- graph: bytes still allocated after forward (the activations kept for
+  backward)
+- peak:  peak bytes during forward + backward
+
+`keep all` records the step on a tape (see dezero.tracing), which keeps
+every input Variable alive as Functions did before `Function.saves`. The
+tape also holds them through backward, so its peak is an upper bound.
+"""
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import tracemalloc
+import numpy as np
+import dezero.functions as F
+from dezero import using_config
+from dezero.models import MLP, VGG16
+
+
+def measure(model, x, t, keep_all):
+    tape = [] if keep_all else None
+    with using_config('tape', tape):
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        y = model(x)
+        loss = F.softmax_cross_entropy(y, t)
+        del y
+        graph = tracemalloc.get_traced_memory()[0] - base
+        model.cleargrads()
+        loss.backward()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+    return graph, peak
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    cases = [
+        ('MLP', MLP([1000, 1000, 10]),
+         np.random.randn(256, 784).astype(np.float32)),
+        ('VGG16', VGG16(),
+         np.random.randn(2, 3, 64, 64).astype(np.float32)),
+    ]
+    MB = 2 ** 20
+    print('{:>6} {:>10} {:>10} {:>10}'.format('model', 'policy', 'graph[MB]',
+                                             'peak[MB]'))
+    for name, model, x in cases:
+        t = np.random.randint(0, 10, len(x))
+        model(x)  # initialize the parameters
+        for keep_all in (True, False):
+            graph, peak = measure(model, x, t, keep_all)
+            print('{:>6} {:>10} {:>10.1f} {:>10.1f}'.format(
+                name, 'keep all' if keep_all else 'saves', graph / MB,
+                peak / MB))
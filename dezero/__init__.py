@@ -16,6 +16,11 @@ else:
     from dezero.core import using_config
     from dezero.core import no_grad
     from dezero.core import test_mode
+    from dezero.core import profile
+    from dezero.core import jvp
+    from dezero.core import hvp
+    from dezero.core import taylor
+    from dezero.core import derivatives
     from dezero.core import as_array
     from dezero.core import as_variable
     from dezero.core import setup_variable
@@ -28,5 +33,6 @@ else:
     import dezero.dataloaders
     import dezero.optimizers
     import dezero.functions
+    import dezero.lazy
     
 setup_variable()
\ No newline at end of file
@@ -0,0 +1,263 @@
+import numpy as np
+from dezero import cuda
+from dezero.core import (Variable, Parameter, Add, Sub, Mul, no_grad,
+                         using_config)
+from dezero.functions import (Linear, MatMul, BiasActivation, BatchNorm,
+                              GetItem)
+from dezero.functions_conv import Conv2d, Deconv2d, im2col_array
+
+
+# =============================================================================
+# per-sample gradients
+# =============================================================================
+def per_sample_grads(model, loss_fn, x, t, reduction='mean'):
+    """Gradients of the loss of each sample w.r.t. the parameters of `model`.
+
+    The model runs once on the whole batch and the graph is backpropagated
+    once. Each Function that takes a Parameter then recomputes its
+    parameter gradient per sample from its saved inputs and output
+    gradient. Axis 0 of every array in the model must be the sample axis,
+    samples must not interact (no BatchNorm in train mode) and parameters
+    must be used directly, not through Functions of parameters only.
+
+    Args:
+        model (`dezero.Layer`): Model to differentiate.
+        loss_fn (callable): Called as `loss_fn(y, t)`; returns the mean
+            (or sum, see `reduction`) of the per-sample losses.
+        x (`ndarray`): Input batch of shape `(N, ...)`.
+        t (`ndarray`): Targets.
+        reduction (str): `'mean'` or `'sum'`, how `loss_fn` reduces the
+            batch.
+
+    Returns:
+        dict: `{param: ndarray of shape (N, *param.shape)}` for every
+            parameter that received a gradient. The summed gradient is left
+            in `param.grad` as after a normal backward.
+    """
+    N = len(x)
+    x = Variable(x, requires_grad=False)
+    # the rules below read the gradients of intermediate outputs: the tape
+    # keeps them alive (Functions that do not read their inputs only link
+    # them, see Function.saves)
+    ops = []
+    with using_config('tape', ops):
+        loss = loss_fn(model(x), t)
+    model.cleargrads()
+    # the saved inputs are used by the per-sample rules below
+    loss.backward(retrain_grad=True, retain_graph=True)
+
+    funcs = _functions(loss)
+    batched = _batched(funcs, x)
+    grads = {}
+    for f in funcs:
+        if f.uses_params:
+            raise NotImplementedError(
+                f'{type(f).__name__} hides its parameters from the graph')
+        if not any(isinstance(v, Parameter) for v in f.inputs):
+            continue
+        if f not in batched:
+            raise NotImplementedError(
+                f'{type(f).__name__} is applied to parameters only; per-sample '
+                'gradients need the parameters to be used directly')
+        rule = _rules.get(type(f))
+        if rule is None:
+            raise NotImplementedError(
+                f'no per-sample rule for {type(f).__name__}')
+        y = f.outputs[0]()
+        if y is None or y.grad is None:
+            continue
+        gxs = rule(f, y.grad.data)
+        for v, gx in zip(f.inputs, gxs):
+            if gx is None or not isinstance(v, Parameter) or not v.requires_grad:
+                continue
+            grads[v] = gx if v not in grads else grads[v] + gx
+
+    if reduction == 'mean':
+        for param in grads:
+            grads[param] = grads[param] * N  # may be a view of a grad
+    elif reduction != 'sum':
+        raise ValueError('reduction must be mean or sum: {}'.format(reduction))
+    return grads
+
+
+def _functions(y):
+    funcs = []
+    seen_set = set()
+    if y.creator is not None:
+        funcs.append(y.creator)
+        seen_set.add(y.creator)
+    for f in funcs:
+        for x in f.inputs:
+            if x.creator is not None and x.creator not in seen_set:
+                funcs.append(x.creator)
+                seen_set.add(x.creator)
+    return funcs
+
+
+def _batched(funcs, x):
+    # Functions whose output depends on the input batch (an embedding lookup
+    # is batched by its index array)
+    batched = set()
+    for f in sorted(funcs, key=lambda f: f.generation):
+        if (any(v is x or v.creator in batched for v in f.inputs)
+                or isinstance(f, GetItem) and hasattr(f.slices, 'ndim')):
+            batched.add(f)
+    return batched
+
+
+def _sum_to(g, shape):
+    # (N, *y_shape) -> (N, *shape) where `shape` broadcasts to the batch
+    N = g.shape[0]
+    full = (1,) * (g.ndim - len(shape)) + tuple(shape)
+    axis = tuple(i for i in range(1, g.ndim) if full[i] == 1 and g.shape[i] != 1)
+    if axis:
+        g = g.sum(axis=axis, keepdims=True)
+    return g.reshape((N,) + tuple(shape))
+
+
+def _linear(f, gy):
+    x, W = f.inputs[0].data, f.inputs[1].data
+    xp = cuda.get_array_module(gy)
+    gW = xp.einsum('ni,no->nio', x, gy)
+    gb = gy if len(f.inputs) > 2 and f.inputs[2].data is not None else None
+    return None, gW, gb
+
+
+def _conv2d(f, gy):
+    x, W = f.inputs[0].data, f.inputs[1].data
+    xp = cuda.get_array_module(gy)
+    col = im2col_array(x, W.shape[2:], f.stride, f.pad, to_matrix=False)
+    gW = xp.einsum('nohw,ncklhw->nockl', gy, col)
+    return None, gW, gy.sum(axis=(2, 3))
+
+
+def _deconv2d(f, gy):
+    x, W = f.inputs[0].data, f.inputs[1].data
+    xp = cuda.get_array_module(gy)
+    col = im2col_array(gy, W.shape[2:], f.stride, f.pad, to_matrix=False)
+    gW = xp.einsum('nchw,noklhw->ncokl', x, col)
+    return None, gW, gy.sum(axis=(2, 3))
+
+
+def _param_sum_to(f, gys, shapes):
+    # only Parameters are reduced; other inputs already have the batch axis
+    return tuple(_sum_to(gy, shape) if isinstance(x, Parameter) else None
+                 for x, gy, shape in zip(f.inputs, gys, shapes))
+
+
+def _add(f, gy):
+    return _param_sum_to(f, (gy, gy), (f.x0_shape, f.x1_shape))
+
+
+def _sub(f, gy):
+    return _param_sum_to(f, (gy, -gy), (f.x0_shape, f.x1_shape))
+
+
+def _mul(f, gy):
+    x0, x1 = f.inputs[0].data, f.inputs[1].data
+    return _param_sum_to(f, (gy * x1, gy * x0), (x0.shape, x1.shape))
+
+
+def _bias_activation(f, gy):
+    y = f.outputs[0]().data
+    if f.activation == 'sigmoid':
+        gz = gy * y * (1 - y)
+    elif f.activation == 'tanh':
+        gz = gy * (1 - y * y)
+    else:
+        gz = gy * (y > 0)
+    return _param_sum_to(f, (gz, gz), (f.x_shape, f.b_shape))
+
+
+def _batch_norm(f, gy):
+    x, gamma = f.inputs[0].data, f.inputs[1].data
+    xp = cuda.get_array_module(gy)
+    C = gamma.size
+    # (N, C, H, W) -> (N, H*W, C)
+    x = x.reshape(len(x), C, -1).transpose(0, 2, 1) if x.ndim == 4 else x[:, None]
+    gy = gy.reshape(len(gy), C, -1).transpose(0, 2, 1) if gy.ndim == 4 else gy[:, None]
+    if f.inv_std is not None:
+        mean = x.reshape(-1, C).mean(axis=0)
+        xc = (x - mean) * f.inv_std
+    else:
+        xc = (x - f.avg_mean) / xp.sqrt(f.avg_var + f.eps)
+    return None, (xc * gy).sum(axis=1), gy.sum(axis=1)
+
+
+def _get_item(f, gy):
+    # embedding lookup W[ids] with ids of shape (N, ...)
+    W = f.inputs[0]
+    ids = f.slices
+    if not hasattr(ids, 'ndim'):
+        raise NotImplementedError('per-sample GetItem needs an index array')
+    xp = cuda.get_array_module(gy)
+    N = len(gy)
+    gW = xp.zeros((N,) + W.shape, dtype=gy.dtype)
+    rows = xp.broadcast_to(xp.arange(N).reshape((N,) + (1,) * (ids.ndim - 1)),
+                           ids.shape)
+    if xp is np:
+        np.add.at(gW, (rows, ids), gy)
+    else:
+        xp.scatter_add(gW, (rows, ids), gy)
+    return gW,
+
+
+_rules = {
+    Linear: _linear,
+    MatMul: lambda f, gy: _linear(f, gy)[:2],
+    Conv2d: _conv2d,
+    Deconv2d: _deconv2d,
+    Add: _add,
+    Sub: _sub,
+    Mul: _mul,
+    BiasActivation: _bias_activation,
+    BatchNorm: _batch_norm,
+    GetItem: _get_item,
+}
+
+
+# =============================================================================
+# Jacobian
+# =============================================================================
+def jacobian(f, x):
+    """Per-sample Jacobians of `f` in one vectorized forward/backward pass.
+
+    The batch is repeated once per output element and the copies are
+    backpropagated together, each seeded with the one-hot vector of its
+    output. The copies run as one batch of `M * N` samples, so `f` must
+    treat axis 0 as independent samples.
+
+    Args:
+        f (callable): Function or `dezero.Layer` mapping `(N, *in_shape)`
+            to `(N, *out_shape)`.
+        x (`ndarray`): Input batch.
+
+    Returns:
+        `ndarray`: Jacobians of shape `(N, *out_shape, *in_shape)`.
+    """
+    xp = cuda.get_array_module(x)
+    N, in_shape = len(x), x.shape[1:]
+    with no_grad():
+        out_shape = f(x[:1]).shape[1:]
+    M = int(np.prod(out_shape))
+
+    xs = Variable(xp.tile(x, (M,) + (1,) * len(in_shape)))
+    y = f(xs)
+    seed = xp.zeros((M, N, M), dtype=y.dtype)
+    seed[xp.arange(M), :, xp.arange(M)] = 1
+    y.grad = Variable(seed.reshape(y.shape))
+
+    # only the input gradient is needed
+    params = [v for g in _functions(y) for v in g.inputs
+              if isinstance(v, Parameter) and v.requires_grad]
+    for param in params:
+        param.requires_grad = False
+    try:
+        y.backward()
+    finally:
+        for param in params:
+            param.requires_grad = True
+
+    J = xs.grad.data.reshape((M, N) + in_shape)
+    J = xp.moveaxis(J, 0, 1)
+    return J.reshape((N,) + out_shape + in_shape)
@@ -0,0 +1,121 @@
+from dezero.core import Variable, Parameter
+from dezero.layers import Layer
+
+
+class TruncatedBPTT:
+    """Truncated backpropagation through time for stateful models.
+
+    The losses of `bptt_length` consecutive steps are summed, then the sum
+    is backpropagated, the parameters are updated and the graph is cut:
+    every Variable kept as state by a Layer of `model` (e.g. `h` and `c`
+    of `L.RNN`/`L.LSTM`) loses its creator. Only the graph of the last
+    `bptt_length` steps is ever alive, so memory does not grow with the
+    length of the sequence.
+
+    Args:
+        model (`dezero.Layer`): Model holding the recurrent state.
+        optimizer (`dezero.optimizers.Optimizer`): Optimizer set up on
+            `model`.
+        bptt_length (int): Number of steps backpropagated together.
+
+    Attributes:
+        graph (dict): Size of the last truncated graph: `steps`, `nodes`
+            (Functions) and `bytes` (arrays kept for backward).
+        sum_loss (float): Sum of the step losses added so far.
+
+    Usage:
+        bptt = TruncatedBPTT(model, optimizer, bptt_length=30)
+        for x, t in SeqDataLoader(train_set, batch_size=1):
+            y = model(x)
+            bptt.add(F.mean_squared_error(y, t))
+        bptt.flush()
+    """
+    def __init__(self, model, optimizer, bptt_length):
+        self.model = model
+        self.optimizer = optimizer
+        self.bptt_length = bptt_length
+        self.loss = None
+        self.steps = 0
+        self.graph = {'steps': 0, 'nodes': 0, 'bytes': 0}
+        self.sum_loss = 0.0
+
+    def add(self, loss):
+        """Add the loss of one step.
+
+        Returns:
+            bool: True if `bptt_length` steps were reached and the model
+                was updated.
+        """
+        self.loss = loss if self.loss is None else self.loss + loss
+        self.steps += 1
+        self.sum_loss += float(loss.data)
+        if self.steps >= self.bptt_length:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Backpropagate and update with the steps added so far (e.g. at the
+        end of a sequence)."""
+        if self.loss is None:
+            return
+        loss = self.loss
+        nodes, nbytes = _graph_size(loss)
+        self.model.cleargrads()
+        loss.backward()  # frees the graph as it goes
+        for v in _state_variables(self.model):
+            v.unchain()
+        self.optimizer.update()
+        self.graph = {'steps': self.steps, 'nodes': nodes, 'bytes': nbytes}
+        self.loss = None
+        self.steps = 0
+
+    def reset_state(self):
+        """Drop the pending steps and reset the state of `model`."""
+        if self.loss is not None:
+            self.loss.unchain_backward()
+        self.loss = None
+        self.steps = 0
+        for layer in _layers(self.model):
+            if hasattr(layer, 'reset_state'):
+                layer.reset_state()
+
+
+def _graph_size(y):
+    # the number of Functions and the bytes of the inputs they keep
+    # (a Variable used by several Functions is counted once; inputs kept as a
+    # _Link hold no array)
+    nbytes = 0
+    seen_set = set()
+    seen_vars = set()
+    funcs = []
+    if y.creator is not None:
+        funcs.append(y.creator)
+        seen_set.add(y.creator)
+    while funcs:
+        f = funcs.pop()
+        for x in f.inputs:
+            if x.creator is not None:
+                if x.creator not in seen_set:
+                    funcs.append(x.creator)
+                    seen_set.add(x.creator)
+                if (isinstance(x, Variable) and x.data is not None
+                        and id(x) not in seen_vars):
+                    seen_vars.add(id(x))
+                    nbytes += x.data.nbytes
+    return len(seen_set), nbytes
+
+
+def _layers(layer):
+    yield layer
+    for value in layer.__dict__.values():
+        if isinstance(value, Layer):
+            yield from _layers(value)
+
+
+def _state_variables(model):
+    # Variables (not Parameters) kept as attributes of the Layers
+    for layer in _layers(model):
+        for value in layer.__dict__.values():
+            if isinstance(value, Variable) and not isinstance(value, Parameter):
+                yield value
@@ -1,12 +1,38 @@
 import numpy as np
+import heapq
 import weakref
+import time
 import contextlib
+import threading
 import dezero
 
-class Config:
+class _Config(threading.local):
+    # スレッドごとに値を持つ: 各スレッドは以下の既定値から始まり、
+    # using_configなどで変えても他のスレッドには影響しない
     enable_backprop = True
     train = True
-    
+    # list that records (function, inputs, outputs) of each op (see dezero.tracing)
+    tape = None
+    # accumulate Parameter gradients into preallocated buffers (create_graph=False only)
+    inplace_grad = False
+    # active Profiler (see profile())
+    profiler = None
+    # dtype used by Linear/Conv2d forward (e.g. np.float16); Parameters keep
+    # their own dtype as master copy
+    compute_dtype = None
+    # forward-mode AD: WeakKeyDictionary {Variable: tangent array} (see jvp()),
+    # or a TaylorTable {Variable: [coefficients]} (see taylor())
+    forward_ad = None
+    # innermost LayerScope while Layer calls are recorded (see layers.record_layers)
+    layer_scope = None
+    # record Functions and compute them when .data is read (see dezero.lazy)
+    lazy = False
+    # Arena used by memory.empty/zeros/empty_like (see dezero.memory)
+    arena = None
+
+
+Config = _Config()
+
 try:
     import cupy
     array_types = (np.ndarray, cupy.ndarray)
@@ -30,9 +56,11 @@ def test_mode():
     return using_config('train', False)
 
 class Variable:
+    __slots__ = ('data', 'grad', 'creator', 'generation', 'name',
+                 'requires_grad', '_version', '__weakref__')
     __array_priority__ = 200
     
-    def __init__(self, data, name=None):
+    def __init__(self, data, name=None, requires_grad=True):
         if data is not None:
             if not isinstance(data, array_types):
                 raise TypeError(f'{type(data)} is not supported')
@@ -42,6 +70,10 @@ class Variable:
         self.creator = None
         self.generation = 0
         self.name = name
+        # Falseなら勾配を求めない (生のndarrayから作られたVariableなど)
+        self.requires_grad = requires_grad
+        # in-placeで書き換えられた回数 ([n]; 同じ配列を持つVariableで共有する)
+        self._version = None
         
     def __len__(self):
         return len(self.data)
@@ -106,69 +138,298 @@ class Variable:
         if self.data is not None:
             self.data = dezero.cuda.as_cupu(self.data)
         
-    def backward(self, retrain_grad=False, create_graph=False):
-        
+    def backward(self, retrain_grad=False, create_graph=False,
+                 retain_graph=None):
+        if Config.lazy:
+            # .dataを読むと前向きの計算が行われる; 逆伝播はそのまま実行する
+            with using_config('lazy', False):
+                return self.backward(retrain_grad, create_graph, retain_graph)
         if self.grad is None:
             xp = dezero.cuda.get_array_module(self.data)
             self.grad = Variable(np.ones_like(self.data))
-            
-        funcs = []
-        seen_set = set()
-        
-        def add_func(f):
-            if f not in seen_set:
-                funcs.append(f)
-                seen_set.add(f)
-                funcs.sort(key=lambda x: x.generation)
-        
-        add_func(self.creator)
-        
-        while funcs:
-            f = funcs.pop() # 関数を取得
-            gys = [output().grad for output in f.outputs]
-            
-            with using_config('enable_backprop', create_graph):
-                gxs = f.backward(*gys)
-                
-                if not isinstance(gxs, tuple):
-                    gxs = (gxs,)
-            
-                for x, gx in zip(f.inputs, gxs):
-                    if x.grad is None:
-                        x.grad = gx
-                    else:
-                        x.grad = x.grad + gx
-                    if x.creator is not None:
-                        add_func(x.creator)
-                    
-            if not retrain_grad:
-                for y in f.outputs:
-                    y().grad = None # yはweakref
+        _backward([self], retrain_grad, create_graph, retain_graph)
     
     def unchain_backward(self):
         if self.creator is not None:
             funcs = [self.creator]
             while funcs:
                 f = funcs.pop()
-                for x in f.inputs:
-                    if x.creator is not None:
-                        funcs.append(x.creator)
-                        x.unchain()
+                for x, g in _input_links(f):
+                    if g is not None:
+                        funcs.append(g)
+                        if x is not None:
+                            x.unchain()
+                _cut_links(f)
                     
+def _backward(ys, retrain_grad=False, create_graph=False, retain_graph=None):
+    # 勾配を設定済みの変数ys (1つ以上) から1回の逆伝播を行う
+    # retain_graph=Falseなら処理した関数から順に保存物を捨てる
+    # (create_graph=Trueの時は勾配のグラフが前向きのグラフを使うので残す)
+    if retain_graph is None:
+        retain_graph = create_graph
+        
+    funcs = []
+    seen_set = set()
+    
+    def add_func(f):
+        if f not in seen_set:
+            # generationの大きい順に取り出すため符号を反転してheapに積む
+            # (len(seen_set)は同じgenerationの関数同士の比較を避けるための通し番号)
+            heapq.heappush(funcs, (-f.generation, len(seen_set), f))
+            seen_set.add(f)
+    
+    for y in ys:
+        if y.creator is not None:
+            add_func(y.creator)
+    inplace = Config.inplace_grad and not create_graph
+    profiler = Config.profiler
+    # グラフを解放する時、勾配を受け取った変数はcreatorの処理まで生かしておく
+    alive = None if retain_graph else {}
+    # もう生きていない途中の変数の勾配 {(creator, 出力の番号): 勾配} (_Linkを参照)
+    pending = {}
+    
+    while funcs:
+        f = heapq.heappop(funcs)[2] # 関数を取得
+        gys = _output_grads(f, pending)
+        
+        with using_config('enable_backprop', create_graph):
+            if profiler is None:
+                gxs = f.backward(*gys)
+            else:
+                gxs = profiler.backward(f, gys)
+            for g in _accumulate_grads(f, gxs, inplace, alive, pending):
+                add_func(g)
+                
+        _finish(f, retrain_grad, alive)
+
+
+def _accumulate_grad(x, gx, inplace):
+    if inplace and isinstance(x, Parameter):
+        x.accumulate_grad(gx)
+    elif x.grad is None:
+        x.grad = gx
+    else:
+        x.grad = x.grad + gx
+
+
+def _output_grads(f, pending):
+    if f.inputs is None:
+        raise RuntimeError(_freed_message)
+    _check_versions(f)
+    gys = []
+    for i, output in enumerate(f.outputs):
+        y = output()
+        gys.append(pending.pop((f, i), None) if y is None else y.grad)
+    return gys
+
+
+def _accumulate_grads(f, gxs, inplace, alive, pending):
+    # fの入力に勾配を足し、勾配を受け取った変数のcreatorを返す
+    # (aliveがNoneでなければグラフの解放までその変数を生かしておく)
+    if not isinstance(gxs, tuple):
+        gxs = (gxs,)
+    creators = []
+    for x, gx in zip(f.inputs, gxs):
+        if gx is None or not x.requires_grad:
+            continue
+        if isinstance(x, _Link):
+            v = x()
+            if v is None:
+                # 変数はもうないので、creatorが取り出すまでpendingに置く
+                key = (x.creator, x.index)
+                pending[key] = gx if key not in pending else pending[key] + gx
+                creators.append(x.creator)
+                continue
+            x = v
+        _accumulate_grad(x, gx, inplace)
+        if x.creator is not None:
+            creators.append(x.creator)
+            if alive is not None:
+                alive.setdefault(x.creator, []).append(x)
+    return creators
+
+
+def _finish(f, retrain_grad, alive):
+    # fの逆伝播が済んだ後の後始末 (aliveがNoneならグラフを残す)
+    if not retrain_grad:
+        for y in f.outputs:
+            y = y() # yはweakref
+            if y is not None:
+                y.grad = None
+    if alive is not None:
+        _free(f)
+        alive.pop(f, None)
+
+
+_freed_message = ('the graph was freed by a previous backward; pass '
+                  'retain_graph=True to the first backward to backpropagate '
+                  'through it again or to draw it')
+
+
+def _free(f):
+    # 逆伝播の済んだ関数の入力と、forwardで保存した配列 (maskなど) を捨てる。
+    # __init__で受け取った値 (Pow.cなど) は残すので、関数はもう一度呼べる。
+    # inputs=Noneが解放済みの印で、もう一度たどると_freed_messageのエラーになる。
+    # unchain_backwardのため、入力へのweakref (_Linkはそのまま) とそのcreatorは残す
+    f.sources = tuple([(x if isinstance(x, _Link) else weakref.ref(x),
+                        x.creator) for x in f.inputs])
+    f.inputs = None
+    f.versions = None
+    for name in f.saved_attrs:
+        setattr(f, name, None)
+
+
+def _input_links(f):
+    # (入力, 入力のcreator)の組 (解放済みの入力はNone)
+    if f.inputs is not None:
+        return [(x() if isinstance(x, _Link) else x, x.creator)
+                for x in f.inputs]
+    sources, f.sources = f.sources, ()  # 一度たどったら捨てる
+    return [(x(), g) for x, g in sources]
+
+
+class _Link:
+    """Input of a Function whose backward does not read its array: output
+    `index` of `creator`. Calling it returns the Variable, or None once
+    nothing else keeps the Variable (and its array) alive.
+    """
+    __slots__ = ('creator', 'index')
+    requires_grad = True
+    
+    def __init__(self, creator, index):
+        self.creator = creator
+        self.index = index
+        
+    def __call__(self):
+        return self.creator.outputs[self.index]()
+
+
+def _link(x):
+    # 途中の変数はcreatorと出力の番号でつなぐ
+    # (creatorのbackwardが出力を読むならそのまま持つ)
+    f = x.creator
+    if f is None or f.saves in (None, 'outputs'):
+        return x
+    for i, y in enumerate(f.outputs):
+        if y() is x:
+            return _Link(f, i)
+    return x
+
+
+def _cut_links(f):
+    # unchain_backward: _Linkを入力そのものに置き換える
+    # (生きていればunchain済みの変数、そうでなければ配列のない変数)
+    if f.inputs is None:
+        return
+    inputs = []
+    for x in f.inputs:
+        if isinstance(x, _Link):
+            x = x()
+            if x is None:
+                x = Variable(None, requires_grad=False)
+        inputs.append(x)
+    f.inputs = tuple(inputs)
+
+
+def _check_versions(f):
+    # 逆伝播で使う配列がin-placeで書き換えられていたらエラー
+    if f.saves in (None, 'inputs'):
+        versions = getattr(f, 'versions', None)
+        for i, x in enumerate(f.inputs):
+            if x._version is not None and x._version[0] != (
+                    0 if versions is None else versions[i]):
+                raise RuntimeError(_modified_message(f, x))
+    if f.saves in (None, 'outputs'):
+        for y in f.outputs:
+            y = y()
+            if y is not None and y._version is not None and y._version[0]:
+                raise RuntimeError(_modified_message(f, y))
+
+
+def _modified_message(f, x):
+    return (f'{type(f).__name__}.backward needs {x.name or "a Variable"} '
+            f'(shape {x.shape}) that was modified by an in-place operation '
+            f'after it was saved')
+
+
 class Parameter(Variable):
-    pass
+    __slots__ = ('grad_buffer',)
+    
+    def __init__(self, data, name=None):
+        super().__init__(data, name)
+        self.grad_buffer = None
+        
+    def accumulate_grad(self, gx):
+        """Add `gx` into the persistent gradient buffer without allocating.
+        
+        The buffer is allocated on the first call and reused afterwards, so
+        `self.grad` is overwritten in place by the next backward.
+        """
+        buf = self.grad_buffer
+        if self.grad is not None and self.grad is buf:
+            buf.data += gx.data
+        elif self.grad is not None:
+            self.grad = self.grad + gx
+        elif buf is None or buf.shape != gx.shape:
+            self.grad_buffer = self.grad = Variable(gx.data.copy())
+        else:
+            buf.data[...] = gx.data
+            self.grad = buf
 
 class Function:
+    # What backward needs from forward:
+    #   None      : unknown; the arrays of the inputs and outputs
+    #   'inputs'  : the arrays of the input Variables
+    #   'outputs' : only the arrays of the outputs (self.outputs)
+    #   'shapes'  : nothing; shapes are stored on self by forward
+    #   'mask'    : nothing; a compact mask is stored on self by forward
+    # Unless the inputs are read, intermediate inputs are kept as a _Link to
+    # their creator, so their arrays can be freed before backward. Only the
+    # arrays declared here are checked for in-place modification (see
+    # modified) and kept by dezero.lazy.
+    saves = None
+    # Attributes that forward sets for backward (e.g. 'mask'); they are set
+    # to None when backward frees the graph
+    saved_attrs = ()
+    # True if forward uses Parameters that are not passed as inputs (see
+    # F.checkpoint): the graph is then recorded even if no input requires grad.
+    uses_params = False
+    # True if forward is (piecewise) linear in the inputs, so that Taylor
+    # coefficients go through jvp one by one (see Function.taylor)
+    linear = False
+    # inputs/outputsはtupleで持つ (サブクラスも__slots__を宣言すれば__dict__を持たない)
+    __slots__ = ('inputs', 'outputs', 'generation', 'scope', 'versions',
+                 'sources')
+    
     # *inputsで可変長引数にする
     def __call__(self, *inputs):
+        if (not Config.enable_backprop and Config.tape is None
+                and Config.forward_ad is None and not Config.lazy):
+            # 推論: Variableの生成やグラフの記録を省く
+            ys = self.forward(*[x.data if isinstance(x, Variable) else x
+                                for x in inputs])
+            if not isinstance(ys, tuple):
+                ys = (ys,)
+            outputs = [Variable(as_array(y), requires_grad=False) for y in ys]
+            return outputs if len(outputs) > 1 else outputs[0]
+        
         inputs = [as_variable(x) for x in inputs]
-        xs = [x.data for x in inputs]
-        ys = self.forward(*xs) # アスタリスクをつけてUnpacking
-        if not isinstance(ys, tuple): # tupleでない場合の追加対応
-            ys = (ys,)
-        outputs = [Variable(as_array(y)) for y in ys]
+        # 勾配が必要な入力がなければグラフを作らない
+        requires_grad = Config.enable_backprop and (
+            self.uses_params or any([x.requires_grad for x in inputs]))
+        outputs = None
+        if (Config.lazy and Config.tape is None
+                and Config.forward_ad is None):
+            outputs = dezero.lazy.defer(self, inputs, requires_grad)
+        if outputs is None:
+            xs = [x.data for x in inputs]
+            ys = self.forward(*xs) # アスタリスクをつけてUnpacking
+            if not isinstance(ys, tuple): # tupleでない場合の追加対応
+                ys = (ys,)
+            outputs = [Variable(as_array(y), requires_grad=requires_grad)
+                       for y in ys]
         
-        if Config.enable_backprop:
+        if requires_grad:
             # generationを設定
             self.generation = max([x.generation for x in inputs])
         
@@ -176,21 +437,98 @@ class Function:
                 # memorize parent creator to output
                 output.set_creator(self)
             # memorize inputs
-            self.inputs = inputs
+            if self.saves in (None, 'inputs'):
+                self.inputs = tuple(inputs)
+                for x in inputs:
+                    if x._version is not None:
+                        self.versions = tuple([x._version[0] if x._version
+                                               else 0 for x in inputs])
+                        break
+            else:
+                # 途中の変数は持たない (配列を他で使わなければ解放される)
+                self.inputs = tuple([_link(x) for x in inputs])
             # memorize outputs
-            self.outputs = [weakref.ref(output) for output in outputs]
+            self.outputs = tuple([weakref.ref(output) for output in outputs])
+            if Config.layer_scope is not None:
+                self.scope = Config.layer_scope
+            
+        if Config.tape is not None:
+            Config.tape.append((self, inputs, outputs))
+            
+        if Config.forward_ad is not None:
+            self._push_tangents(inputs, xs, ys, outputs)
         
         # リストの要素が1つの時は最初の要素を返す
         return outputs if len(outputs) > 1 else outputs[0]
     
+    def _push_tangents(self, inputs, xs, ys, outputs):
+        tangents = Config.forward_ad
+        txs = [tangents.get(x) for x in inputs]
+        if all(t is None for t in txs):
+            return
+        if isinstance(tangents, TaylorTable):
+            self._push_series(tangents, xs, ys, txs, outputs)
+            return
+        tys = self.jvp(xs, ys, txs)
+        if not isinstance(tys, tuple):
+            tys = (tys,)
+        for output, ty in zip(outputs, tys):
+            if ty is not None:
+                tangents[output] = as_array(ty)
+    
+    def _push_series(self, table, xs, ys, txs, outputs):
+        # 係数のリストの先頭に値(0次の係数)を付けて渡す
+        sxs = [[x] + (t if t is not None else [None] * table.order)
+               for x, t in zip(xs, txs)]
+        series = self.taylor(xs, ys, sxs)
+        if not isinstance(series, tuple):
+            series = (series,)
+        for output, y, sy in zip(outputs, ys, series):
+            coefs = [None if c is None else sum_tangents(y.shape, as_array(c))
+                     for c in sy[1:]]
+            if any(c is not None for c in coefs):
+                table[output] = coefs
+    
     def forward(self, x):
         raise NotImplementedError()
         
     def backward(self, x):
         raise NotImplementedError()
+    
+    def jvp(self, xs, ys, txs):
+        """Tangent rule for forward-mode AD.
+        
+        Receives the input arrays, the output arrays and the input tangents
+        (None for inputs without one, e.g. constants and Parameters) and
+        returns the output tangents as arrays.
+        """
+        raise NotImplementedError(
+            f'{type(self).__name__} does not support forward-mode AD')
+    
+    def taylor(self, xs, ys, sxs):
+        """Series rule for Taylor-mode AD.
+        
+        Receives the input arrays, the output arrays and the truncated
+        Taylor series of the inputs as lists `[x, x1, ..., xK]` (None for
+        coefficients that are zero) and returns the series of the outputs
+        in the same form. Linear Functions apply `jvp` to each coefficient.
+        """
+        if not self.linear:
+            raise NotImplementedError(
+                f'{type(self).__name__} does not support Taylor-mode AD')
+        sy = [ys[0]]
+        for k in range(1, len(sxs[0])):
+            txs = [sx[k] for sx in sxs]
+            sy.append(None if all(t is None for t in txs)
+                      else self.jvp(xs, ys, txs))
+        return sy
         
         
 class Add(Function):
+    __slots__ = ('x0_shape', 'x1_shape')
+    saves = 'shapes'
+    linear = True
+    
     def forward(self, x0, x1):
         self.x0_shape, self.x1_shape = x0.shape, x1.shape
         y = x0 + x1
@@ -203,36 +541,92 @@ class Add(Function):
             gx1 = dezero.functions.sum_to(gx1, self.x1_shape)
         return gx0, gx1
     
+    def jvp(self, xs, ys, txs):
+        return sum_tangents(ys[0].shape, *txs)
+    
 def add(x0, x1):
-    x1 = as_array(x1, dezero.cuda.get_array_module(x0.data))
+    x1 = as_array(x1, dezero.cuda.get_array_module(x0))
     return Add()(x0, x1)
 
 
+class AddInplace(Add):
+    __slots__ = ()
+    
+    def forward(self, x0, x1):
+        self.x0_shape, self.x1_shape = x0.shape, x1.shape
+        x0 += x1
+        return x0
+    
+def add_(x0, x1):
+    """`x0 + x1` written into the array of `x0` (e.g. an accumulator).
+    
+    The returned Variable shares the array with `x0`. Backward raises a
+    RuntimeError if a Function saved `x0` before it was modified.
+    """
+    x1 = as_array(x1, dezero.cuda.get_array_module(x0))
+    return modified(x0, AddInplace()(x0, x1))
+
+
+def modified(x, y):
+    """Mark that the array of `x` was modified in place and is now also the
+    array of `y`; returns `y`."""
+    if isinstance(x, Variable):
+        if x._version is None:
+            x._version = [0]
+        x._version[0] += 1
+        if isinstance(y, Variable):
+            y._version = x._version
+    return y
+
+
 class Mul(Function):
+    __slots__ = ()
+    saves = 'inputs'
+    
     def forward(self, x0, x1):
         y = x0 * x1
         return y
     def backward(self, gy):
         x0, x1 = self.inputs
-        gx0 = gy * x1
-        gx1 = gy * x0
-        if x0.shape != x1.shape:  # for broadcast
-            gx0 = dezero.functions.sum_to(gx0, x0.shape)
-            gx1 = dezero.functions.sum_to(gx1, x1.shape)
+        gx0 = gx1 = None
+        if x0.requires_grad:
+            gx0 = gy * x1
+            if x0.shape != gx0.shape:  # for broadcast
+                gx0 = dezero.functions.sum_to(gx0, x0.shape)
+        if x1.requires_grad:
+            gx1 = gy * x0
+            if x1.shape != gx1.shape:
+                gx1 = dezero.functions.sum_to(gx1, x1.shape)
         return gx0, gx1
     
+    def jvp(self, xs, ys, txs):
+        (x0, x1), (t0, t1) = xs, txs
+        return sum_tangents(ys[0].shape, None if t0 is None else t0 * x1,
+                            None if t1 is None else x0 * t1)
+    
+    def taylor(self, xs, ys, sxs):
+        s0, s1 = sxs
+        return [ys[0]] + [series_mul(s0, s1, k) for k in range(1, len(s0))]
+    
 
 def mul(x0, x1):
-    x1 = as_array(x1, dezero.cuda.get_array_module(x0.data))
+    x1 = as_array(x1, dezero.cuda.get_array_module(x0))
     return Mul()(x0, x1)
 
 
 class Neg(Function):
+    __slots__ = ()
+    saves = 'shapes'
+    linear = True
+    
     def forward(self, x):
         return -x
     
     def backward(self, gy):
         return -gy
+    
+    def jvp(self, xs, ys, txs):
+        return -txs[0]
 
 
 def neg(x):
@@ -240,6 +634,10 @@ def neg(x):
 
 
 class Sub(Function):
+    __slots__ = ('x0_shape', 'x1_shape')
+    saves = 'shapes'
+    linear = True
+    
     def forward(self, x0, x1):
         self.x0_shape, self.x1_shape = x0.shape, x1.shape
         y = x0 - x1
@@ -253,41 +651,70 @@ class Sub(Function):
             gx1 = dezero.functions.sum_to(gx1, self.x1_shape)
         return gx0, gx1
     
+    def jvp(self, xs, ys, txs):
+        t0, t1 = txs
+        return sum_tangents(ys[0].shape, t0, None if t1 is None else -t1)
+    
     
 def sub(x0, x1):
-    x1 = as_array(x1, dezero.cuda.get_array_module(x0.data))
+    x1 = as_array(x1, dezero.cuda.get_array_module(x0))
     return Sub()(x0, x1)
 
 def rsub(x0, x1):
-    x1 = as_array(x1, dezero.cuda.get_array_module(x0.data))
+    x1 = as_array(x1, dezero.cuda.get_array_module(x0))
     return Sub()(x1, x0) # x1, x0を入れ替え
 
 
 class Div(Function):
+    __slots__ = ()
+    saves = 'inputs'
+    
     def forward(self, x0, x1):
         y = x0 / x1
         return y
     def backward(self, gy):
         x0, x1 = self.inputs
-        gx0 = gy / x1
-        gx1 = gy * (-x0 / x1 ** 2)
-        if x0.shape != x1.shape:  # for broadcast
-            gx0 = dezero.functions.sum_to(gx0, x0.shape)
-            gx1 = dezero.functions.sum_to(gx1, x1.shape)
+        gx0 = gx1 = None
+        if x0.requires_grad:
+            gx0 = gy / x1
+            if x0.shape != gx0.shape:  # for broadcast
+                gx0 = dezero.functions.sum_to(gx0, x0.shape)
+        if x1.requires_grad:
+            gx1 = gy * (-x0 / x1 ** 2)
+            if x1.shape != gx1.shape:
+                gx1 = dezero.functions.sum_to(gx1, x1.shape)
         return gx0, gx1
+    
+    def jvp(self, xs, ys, txs):
+        (x0, x1), (t0, t1) = xs, txs
+        return sum_tangents(ys[0].shape, None if t0 is None else t0 / x1,
+                            None if t1 is None else -t1 * ys[0] / x1)
+    
+    def taylor(self, xs, ys, sxs):
+        # y = x0 / x1 より x0 = x1 * y を y の係数について解く
+        (s0, s1), x1 = sxs, xs[1]
+        sy = [ys[0]]
+        for k in range(1, len(s0)):
+            t = series_mul(s1, sy, k, start=1)
+            t = sum_tangents(ys[0].shape, s0[k], None if t is None else -t)
+            sy.append(None if t is None else t / x1)
+        return sy
 
     
 def div(x0, x1):
-    x1 = as_array(x1, dezero.cuda.get_array_module(x0.data))
+    x1 = as_array(x1, dezero.cuda.get_array_module(x0))
     return Div()(x0, x1)
 
 
 def rdiv(x0, x1):
-    x1 = as_array(x1, dezero.cuda.get_array_module(x0.data))
+    x1 = as_array(x1, dezero.cuda.get_array_module(x0))
     return Div()(x1, x0) # x1, x0を入れ替え
 
 
 class Pow(Function):
+    __slots__ = ('c',)
+    saves = 'inputs'
+    
     def __init__(self, c):
         self.c = c
         
@@ -301,12 +728,33 @@ class Pow(Function):
         gx = c * x ** (c-1) * gy
         return gx
     
+    def jvp(self, xs, ys, txs):
+        c = self.c
+        return c * xs[0] ** (c-1) * txs[0]
+    
+    def taylor(self, xs, ys, sxs):
+        # x y' = c x' y の係数を比べる (x = 0 では定義されない)
+        sx, c = sxs[0], self.c
+        sy = [ys[0]]
+        for k in range(1, len(sx)):
+            t = None
+            for j in range(1, k + 1):
+                if sx[j] is None or sy[k - j] is None:
+                    continue
+                term = ((c + 1) * j - k) * sx[j] * sy[k - j]
+                t = term if t is None else t + term
+            sy.append(None if t is None else t / (k * xs[0]))
+        return sy
+    
 
 def pow(x, c):
     return Pow(c)(x)
 
 
 class Square(Function):
+    __slots__ = ()
+    saves = 'inputs'
+    
     def forward(self, x):
         y = x ** 2
         return y
@@ -316,10 +764,243 @@ class Square(Function):
         gx = 2 * x * gy
         return gx
     
+    def jvp(self, xs, ys, txs):
+        return 2 * xs[0] * txs[0]
+    
+    def taylor(self, xs, ys, sxs):
+        sx = sxs[0]
+        return [ys[0]] + [series_mul(sx, sx, k) for k in range(1, len(sx))]
+    
 def square(x):
     return Square()(x)
         
+
+# =============================================================================
+# forward-mode AD
+# =============================================================================
+def sum_tangents(shape, *terms):
+    """Add the tangent terms that are not None and broadcast the result to
+    `shape` (None if there is no term)."""
+    ty = None
+    for t in terms:
+        if t is None:
+            continue
+        ty = t if ty is None else ty + t
+    if ty is not None and ty.shape != shape:
+        xp = dezero.cuda.get_array_module(ty)
+        ty = xp.broadcast_to(ty, shape)
+    return ty
+
+
+def jvp(f, inputs, tangents):
+    """Jacobian-vector product by forward-mode AD.
+    
+    `f` is evaluated once without building a graph; every Function
+    propagates the tangents of its inputs through `Function.jvp`.
+    
+    Args:
+        f (callable): Function of Variables (e.g. a `dezero.Layer`).
+        inputs (list of `dezero.Variable` or `ndarray`): Inputs of `f`.
+        tangents (list of `ndarray`): Direction for each input (None for
+            inputs that are held fixed).
+    
+    Returns:
+        tuple: `(outputs, output_tangents)`. `output_tangents` has an array
+            for each output (zeros for outputs that do not depend on the
+            inputs).
+    
+    Usage:
+        y, ty = jvp(model, [x], [v])  # ty = (dy/dx) v
+    """
+    inputs = [as_variable(x) for x in inputs]
+    table = weakref.WeakKeyDictionary()
+    for x, t in zip(inputs, tangents):
+        if t is not None:
+            table[x] = as_array(t)
+    
+    with no_grad(), using_config('forward_ad', table):
+        outputs = f(*inputs)
+    
+    if isinstance(outputs, Variable):
+        ty = table.get(outputs)
+        return outputs, _zero_tangent(outputs) if ty is None else ty
+    tys = tuple(_zero_tangent(y) if table.get(y) is None else table[y]
+                for y in outputs)
+    return outputs, tys
+
+
+def _zero_tangent(y):
+    xp = dezero.cuda.get_array_module(y.data)
+    return xp.zeros_like(y.data)
+
+# =============================================================================
+# Taylor-mode AD
+# =============================================================================
+class TaylorTable(weakref.WeakKeyDictionary):
+    """`Config.forward_ad` table of Taylor-mode AD: {Variable: [x1, ..., xK]}
+    (see taylor())."""
+    def __init__(self, order):
+        super().__init__()
+        self.order = order
+
+
+def series_mul(a, b, k, start=0, mul=None):
+    """k-th coefficient of the product of the series `a` and `b` (Cauchy
+    product over a[start:k+1]); None coefficients are zero.
+    `mul` replaces `*` (e.g. `utils.dot`)."""
+    y = None
+    for i in range(start, k + 1):
+        if a[i] is None or b[k - i] is None:
+            continue
+        t = a[i] * b[k - i] if mul is None else mul(a[i], b[k - i])
+        y = t if y is None else y + t
+    return y
+
+
+def series_compose(x, g, k):
+    """k-th coefficient of y where y' = g x' (k >= 1), e.g. g = y for exp.
+    Only g[:k] is read, so the coefficients are computed in order."""
+    y = None
+    for j in range(1, k + 1):
+        if x[j] is None or g[k - j] is None:
+            continue
+        t = j * x[j] * g[k - j]
+        y = t if y is None else y + t
+    return None if y is None else y / k
+
+
+def taylor(f, inputs, series):
+    """Truncated Taylor series of `f` by Taylor-mode AD.
+    
+    Each input moves along `x(t) = x + x1 t + x2 t**2 + ... + xK t**K` and
+    `f` is evaluated once without building a graph; every Function pushes
+    the K coefficients of its inputs through `Function.taylor`, which costs
+    O(K**2) array operations. The k-th derivative of an output along the
+    curve is `k! * yk` (see derivatives()).
+    
+    Args:
+        f (callable): Function of Variables (e.g. a `dezero.Layer`).
+        inputs (list of `dezero.Variable` or `ndarray`): Inputs of `f`.
+        series (list): `[x1, ..., xK]` for each input (None for inputs that
+            are held fixed, and for zero coefficients).
+    
+    Returns:
+        tuple: `(outputs, output_series)`. `output_series` has the list
+            `[y1, ..., yK]` of each output (zeros where it does not depend
+            on the inputs).
+    
+    Usage:
+        y, (y1, y2, y3) = taylor(F.sin, [x], [[v, None, None]])
+    """
+    inputs = [as_variable(x) for x in inputs]
+    order = max(len(s) for s in series if s is not None)
+    table = TaylorTable(order)
+    for x, s in zip(inputs, series):
+        if s is not None:
+            table[x] = [None if c is None else as_array(c) for c in s] + \
+                       [None] * (order - len(s))
+    
+    with no_grad(), using_config('forward_ad', table):
+        outputs = f(*inputs)
+    
+    def output_series(y):
+        coefs = table.get(y, [None] * order)
+        return [_zero_tangent(y) if c is None else c for c in coefs]
+    
+    if isinstance(outputs, Variable):
+        return outputs, output_series(outputs)
+    return outputs, tuple(output_series(y) for y in outputs)
+
+
+def derivatives(f, x, order, v=None):
+    """Derivatives of `f(x + t v)` with respect to t at t = 0 up to `order`
+    in a single forward pass (see taylor()).
+    
+    With the default `v` (ones) and an elementwise `f` these are the
+    elementwise derivatives `f(x), f'(x), ..., f^(order)(x)`.
+    
+    Returns:
+        list of `ndarray`: `order + 1` arrays, the first one is `f(x)`.
+    
+    Usage:
+        y, gy, ggy = derivatives(F.tanh, x, 2)
+    """
+    x = as_variable(x)
+    if v is None:
+        xp = dezero.cuda.get_array_module(x.data)
+        v = xp.ones_like(x.data)
+    y, sy = taylor(f, [x], [[v] + [None] * (order - 1)])
+    ds = [y.data]
+    scale = 1
+    for k, c in enumerate(sy, 1):
+        scale *= k
+        ds.append(scale * c)
+    return ds
+
+# =============================================================================
+# Hessian-vector product
+# =============================================================================
+def hvp(loss, params, v, grads=None):
+    """Hessian-vector product by double backward.
+    
+    The gradients are computed once with `create_graph=True` and
+    `sum(grad * v)` is backpropagated through their graph, so `H v` costs
+    about two backward passes and the Hessian is never formed.
+    
+    Args:
+        loss (`dezero.Variable`): Scalar to differentiate.
+        params (list of `dezero.Variable`): Variables the Hessian is taken
+            with respect to.
+        v (list of `ndarray`): Direction, one array per parameter.
+        grads (list of `dezero.Variable`): Gradients of `loss` built with
+            `create_graph=True`. Pass them to reuse the first backward for
+            several products.
+    
+    Returns:
+        list of `ndarray`: `H v` for each parameter. The gradients are left
+            in `param.grad` as after `loss.backward(create_graph=True)`.
+    
+    Usage:
+        loss.backward(create_graph=True)
+        grads = [p.grad for p in params]
+        hv = hvp(loss, params, v, grads)
+    """
+    params = list(params)
+    if grads is None:
+        for param in params:
+            param.cleargrad()
+        loss.backward(create_graph=True)
+        grads = [param.grad for param in params]
+    
+    gv = None
+    for g, vi in zip(grads, v):
+        if g is None:
+            continue
+        term = dezero.functions.sum(g * as_array(vi))
+        gv = term if gv is None else gv + term
+    
+    for param in params:
+        param.cleargrad()
+    if gv is not None:
+        gv.backward(retain_graph=True)  # the graph of grads is used again
+    
+    hv = []
+    for param, g in zip(params, grads):
+        h = param.grad
+        if h is None:
+            xp = dezero.cuda.get_array_module(param.data)
+            hv.append(xp.zeros_like(param.data))
+        elif h is getattr(param, 'grad_buffer', None):
+            hv.append(h.data.copy())  # overwritten by the next backward
+        else:
+            hv.append(h.data)
+        param.grad = g
+    return hv
+
+
 def as_array(x, array_module=np):
+    if isinstance(x, array_types):
+        return x
     if np.isscalar(x):
         return array_module.array(x)
     return x
@@ -327,7 +1008,152 @@ def as_array(x, array_module=np):
 def as_variable(obj):
     if isinstance(obj, Variable):
         return obj
-    return Variable(obj)
+    return Variable(obj, requires_grad=False)
+
+# =============================================================================
+# profiler
+# =============================================================================
+_function_call = Function.__call__
+
+
+_profiling = 0  # number of active profile() contexts (in any thread)
+_profiling_lock = threading.Lock()
+
+
+def _profiled_call(self, *inputs):
+    profiler = Config.profiler
+    if profiler is None:  # another thread is profiling
+        return _function_call(self, *inputs)
+    return profiler.forward(self, inputs)
+
+
+def _nbytes(arrays):
+    return sum(getattr(a, 'nbytes', 0) for a in arrays if a is not None)
+
+
+class Profiler:
+    """Per Function class counters collected by `profile()`.
+
+    Times are self times: a Function called inside another forward (e.g. by
+    `F.checkpoint`) or a nested backward is counted for itself only. The
+    ops a backward is built from (`gy * x1`, ...) are part of that
+    backward and not counted separately. Bytes are the sizes of the arrays
+    returned by forward / backward.
+    """
+    _fields = ('calls', 'forward_time', 'forward_bytes',
+               'backward_calls', 'backward_time', 'backward_bytes')
+
+    def __init__(self):
+        self.records = {}
+        self._stack = []
+        self._backward_depth = 0
+
+    def _record(self, f, offset, elapsed, nbytes):
+        name = type(f).__name__
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = [0, 0.0, 0, 0, 0.0, 0]
+        record[offset] += 1
+        record[offset + 1] += elapsed
+        record[offset + 2] += nbytes
+
+    def _enter(self):
+        self._stack.append(0.0)
+        return time.perf_counter()
+
+    def _exit(self, start):
+        elapsed = time.perf_counter() - start
+        child = self._stack.pop()
+        if self._stack:
+            self._stack[-1] += elapsed
+        return elapsed - child
+
+    def forward(self, f, inputs):
+        if self._backward_depth:
+            return _function_call(f, *inputs)
+        start = self._enter()
+        try:
+            outputs = _function_call(f, *inputs)
+        finally:
+            elapsed = self._exit(start)
+        ys = outputs if isinstance(outputs, list) else (outputs,)
+        self._record(f, 0, elapsed, _nbytes([y.data for y in ys]))
+        return outputs
+
+    def backward(self, f, gys):
+        start = self._enter()
+        self._backward_depth += 1
+        try:
+            gxs = f.backward(*gys)
+        finally:
+            self._backward_depth -= 1
+            elapsed = self._exit(start)
+        gs = gxs if isinstance(gxs, tuple) else (gxs,)
+        self._record(f, 3, elapsed,
+                     _nbytes([g.data for g in gs if g is not None]))
+        return gxs
+
+    def as_dict(self):
+        """Return `{function name: {field: value}}`."""
+        return {name: dict(zip(self._fields, record))
+                for name, record in self.records.items()}
+
+    def table(self, sort_by='total_time', limit=None):
+        """Return the counters as a text table sorted in descending order.
+
+        Args:
+            sort_by (str): `'total_time'` or one of `Profiler._fields`.
+            limit (int): Number of rows to show (all if None).
+        """
+        rows = []
+        for name, stats in self.as_dict().items():
+            stats['total_time'] = stats['forward_time'] + stats['backward_time']
+            rows.append((name, stats))
+        rows.sort(key=lambda row: row[1][sort_by], reverse=True)
+
+        lines = ['{:<24} {:>8} {:>11} {:>11} {:>11} {:>11}'.format(
+            'function', 'calls', 'forward[ms]', 'backward[ms]', 'total[ms]',
+            'bytes[MB]')]
+        for name, s in rows[:limit]:
+            lines.append('{:<24} {:>8} {:>11.2f} {:>12.2f} {:>11.2f} {:>11.2f}'.format(
+                name, s['calls'], s['forward_time'] * 1e3,
+                s['backward_time'] * 1e3, s['total_time'] * 1e3,
+                (s['forward_bytes'] + s['backward_bytes']) / 2 ** 20))
+        return '\n'.join(lines)
+
+    def print_table(self, sort_by='total_time', limit=None):
+        print(self.table(sort_by, limit))
+
+
+@contextlib.contextmanager
+def profile():
+    """Collect call count, time and bytes per Function class.
+
+    `Function.__call__` is only swapped while the context is active, so
+    there is no cost when profiling is off. Only the Functions called by
+    the current thread are counted.
+
+    Usage:
+        with dezero.profile() as prof:
+            loss = model(x)
+            loss.backward()
+        prof.print_table(limit=10)
+    """
+    global _profiling
+    profiler = Profiler()
+    old_profiler = Config.profiler
+    Config.profiler = profiler
+    with _profiling_lock:
+        _profiling += 1
+        Function.__call__ = _profiled_call
+    try:
+        yield profiler
+    finally:
+        Config.profiler = old_profiler
+        with _profiling_lock:
+            _profiling -= 1
+            if _profiling == 0:
+                Function.__call__ = _function_call
 
 def setup_variable():
     Variable.__add__ = add
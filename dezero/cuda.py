@@ -10,11 +10,11 @@ except ImportError:
 from dezero import Variable
 
 def get_array_module(x):
+    if not gpu_enable:
+        return np
     if isinstance(x, Variable):
         x = x.data
     
-    if not gpu_enable:
-        return np
     xp = cp.get_array_module(x)
     return xp
 
@@ -65,8 +65,8 @@ class SeqDataLoader(DataLoader):
         batch = [self.dataset[i] for i in batch_index]
         
         xp = cuda.cupy if self.gpu else np
-        x = np.array([example[0] for example in batch])
-        t = np.array([example[1] for example in batch])
+        x = xp.array([example[0] for example in batch])
+        t = xp.array([example[1] for example in batch])
         
         self. iteration += 1
         return x, t
@@ -1,13 +1,18 @@
 import numpy as np
 import dezero
 from dezero import cuda, utils
-from dezero.core import Function, Variable, as_variable, as_array
+from dezero.core import (Function, Variable, as_variable, as_array,
+                         sum_tangents, modified, series_mul, series_compose,
+                         _backward)
 
 
 # =============================================================================
 # Basic functions: sin / cos / tanh / exp / log
 # =============================================================================
 class Sin(Function):
+    __slots__ = ()
+    saves = 'inputs'
+
     def forward(self, x):
         xp = cuda.get_array_module(x)
         y = xp.sin(x)
@@ -18,12 +23,22 @@ class Sin(Function):
         gx = gy * cos(x)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        xp = cuda.get_array_module(xs[0])
+        return xp.cos(xs[0]) * txs[0]
+
+    def taylor(self, xs, ys, sxs):
+        return _sin_cos_series(xs[0], sxs[0])[0]
+
 
 def sin(x):
     return Sin()(x)
 
 
 class Cos(Function):
+    __slots__ = ()
+    saves = 'inputs'
+
     def forward(self, x):
         xp = cuda.get_array_module(x)
         y = xp.cos(x)
@@ -34,12 +49,33 @@ class Cos(Function):
         gx = gy * -sin(x)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        xp = cuda.get_array_module(xs[0])
+        return -xp.sin(xs[0]) * txs[0]
+
+    def taylor(self, xs, ys, sxs):
+        return _sin_cos_series(xs[0], sxs[0])[1]
+
+
+def _sin_cos_series(x, sx):
+    # sin' = cos x', cos' = -sin x' を交互に解く
+    xp = cuda.get_array_module(x)
+    s, c = [xp.sin(x)], [xp.cos(x)]
+    for k in range(1, len(sx)):
+        s.append(series_compose(sx, c, k))
+        t = series_compose(sx, s, k)
+        c.append(None if t is None else -t)
+    return s, c
+
 
 def cos(x):
     return Cos()(x)
 
 
 class Tanh(Function):
+    __slots__ = ()
+    saves = 'outputs'
+
     def forward(self, x):
         xp = cuda.get_array_module(x)
         y = xp.tanh(x)
@@ -50,12 +86,29 @@ class Tanh(Function):
         gx = gy * (1 - y * y)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        y = ys[0]
+        return (1 - y * y) * txs[0]
+
+    def taylor(self, xs, ys, sxs):
+        # y' = (1 - y^2) x'
+        sx, y = sxs[0], ys[0]
+        sy, sg = [y], [1 - y * y]
+        for k in range(1, len(sx)):
+            sy.append(series_compose(sx, sg, k))
+            t = series_mul(sy, sy, k)
+            sg.append(None if t is None else -t)
+        return sy
+
 
 def tanh(x):
     return Tanh()(x)
 
 
 class Exp(Function):
+    __slots__ = ()
+    saves = 'outputs'
+
     def forward(self, x):
         xp = cuda.get_array_module(x)
         y = xp.exp(x)
@@ -66,12 +119,25 @@ class Exp(Function):
         gx = gy * y
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return ys[0] * txs[0]
+
+    def taylor(self, xs, ys, sxs):
+        # y' = y x'
+        sx, sy = sxs[0], [ys[0]]
+        for k in range(1, len(sx)):
+            sy.append(series_compose(sx, sy, k))
+        return sy
+
 
 def exp(x):
     return Exp()(x)
 
 
 class Log(Function):
+    __slots__ = ()
+    saves = 'inputs'
+
     def forward(self, x):
         xp = cuda.get_array_module(x)
         y = xp.log(x)
@@ -82,15 +148,36 @@ class Log(Function):
         gx = gy / x
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return txs[0] / xs[0]
+
+    def taylor(self, xs, ys, sxs):
+        # x y' = x' を y の係数について解く
+        sx, x = sxs[0], xs[0]
+        sy = [ys[0]]
+        for k in range(1, len(sx)):
+            t = sx[k]
+            for j in range(1, k):
+                if sy[j] is None or sx[k - j] is None:
+                    continue
+                term = (j / k) * sy[j] * sx[k - j]
+                t = -term if t is None else t - term
+            sy.append(None if t is None else t / x)
+        return sy
+
 
 def log(x):
     return Log()(x)
 
 
 # =============================================================================
-# Tensor operations: reshape / transpose / get_item / expand_dims / flatten
+# Tensor operations: reshape / transpose / get_item / expand_dims / flatten / astype
 # =============================================================================
 class Reshape(Function):
+    __slots__ = ('shape', 'x_shape')
+    saves = 'shapes'
+    linear = True
+
     def __init__(self, shape):
         self.shape = shape
 
@@ -102,6 +189,9 @@ class Reshape(Function):
     def backward(self, gy):
         return reshape(gy, self.x_shape)
 
+    def jvp(self, xs, ys, txs):
+        return txs[0].reshape(self.shape)
+
 
 def reshape(x, shape):
     if x.shape == shape:
@@ -110,6 +200,10 @@ def reshape(x, shape):
 
 
 class Transpose(Function):
+    __slots__ = ('axes',)
+    saves = 'shapes'
+    linear = True
+
     def __init__(self, axes=None):
         self.axes = axes
 
@@ -125,26 +219,40 @@ class Transpose(Function):
         inv_axes = tuple(np.argsort([ax % axes_len for ax in self.axes]))
         return transpose(gy, inv_axes)
 
+    def jvp(self, xs, ys, txs):
+        return txs[0].transpose(self.axes)
+
 
 def transpose(x, axes=None):
     return Transpose(axes)(x)
 
 
 class GetItem(Function):
+    __slots__ = ('slices', 'x_shape')
+    saves = 'shapes'
+    linear = True
+
     def __init__(self, slices):
         self.slices = slices
 
     def forward(self, x):
+        self.x_shape = x.shape
         y = x[self.slices]
         return y
 
     def backward(self, gy):
-        x, = self.inputs
-        f = GetItemGrad(self.slices, x.shape)
+        f = GetItemGrad(self.slices, self.x_shape)
         return f(gy)
 
+    def jvp(self, xs, ys, txs):
+        return txs[0][self.slices]
+
 
 class GetItemGrad(Function):
+    __slots__ = ('in_shape', 'slices')
+    saves = 'shapes'
+    linear = True
+
     def __init__(self, slices, in_shape):
         self.slices = slices
         self.in_shape = in_shape
@@ -162,6 +270,9 @@ class GetItemGrad(Function):
     def backward(self, ggx):
         return get_item(ggx, self.slices)
 
+    def jvp(self, xs, ys, txs):
+        return self.forward(txs[0])
+
 
 def get_item(x, slices):
     f = GetItem(slices)
@@ -180,10 +291,46 @@ def flatten(x):
     return reshape(x, (x.shape[0], -1))
 
 
+class AsType(Function):
+    __slots__ = ('dtype', 'x_dtype')
+    saves = 'shapes'
+    linear = True
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+
+    def forward(self, x):
+        self.x_dtype = x.dtype
+        y = x.astype(self.dtype)
+        return y
+
+    def backward(self, gy):
+        return astype(gy, self.x_dtype)
+
+    def jvp(self, xs, ys, txs):
+        return txs[0].astype(self.dtype)
+
+
+def astype(x, dtype):
+    """Casts `x` to `dtype`. The gradient is cast back to the dtype of `x`.
+
+    `None` (e.g. a missing bias) is returned as is.
+    """
+    if x is None:
+        return None
+    if x.dtype == dtype:
+        return as_variable(x)
+    return AsType(dtype)(x)
+
+
 # =============================================================================
 # sum / sum_to / broadcast_to / average / matmul / linear
 # =============================================================================
 class Sum(Function):
+    __slots__ = ('axis', 'keepdims', 'x_shape')
+    saves = 'shapes'
+    linear = True
+
     def __init__(self, axis, keepdims):
         self.axis = axis
         self.keepdims = keepdims
@@ -199,12 +346,19 @@ class Sum(Function):
         gx = broadcast_to(gy, self.x_shape)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return txs[0].sum(axis=self.axis, keepdims=self.keepdims)
+
 
 def sum(x, axis=None, keepdims=False):
     return Sum(axis, keepdims)(x)
 
 
 class SumTo(Function):
+    __slots__ = ('shape', 'x_shape')
+    saves = 'shapes'
+    linear = True
+
     def __init__(self, shape):
         self.shape = shape
 
@@ -217,6 +371,9 @@ class SumTo(Function):
         gx = broadcast_to(gy, self.x_shape)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return utils.sum_to(txs[0], self.shape)
+
 
 def sum_to(x, shape):
     if x.shape == shape:
@@ -225,6 +382,10 @@ def sum_to(x, shape):
 
 
 class BroadcastTo(Function):
+    __slots__ = ('shape', 'x_shape')
+    saves = 'shapes'
+    linear = True
+
     def __init__(self, shape):
         self.shape = shape
 
@@ -238,6 +399,10 @@ class BroadcastTo(Function):
         gx = sum_to(gy, self.x_shape)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        xp = dezero.cuda.get_array_module(txs[0])
+        return xp.broadcast_to(txs[0], self.shape)
+
 
 def broadcast_to(x, shape):
     if x.shape == shape:
@@ -248,42 +413,72 @@ def broadcast_to(x, shape):
 def average(x, axis=None, keepdims=False):
     x = as_variable(x)
     y = sum(x, axis, keepdims)
-    return y * (y.data.size / x.data.size)
+    return y * (y.size / x.size)
 
 
 mean = average
 
 
 class MatMul(Function):
+    __slots__ = ()
+    saves = 'inputs'
+
     def forward(self, x, W):
-        y = x.dot(W)
+        y = utils.dot(x, W)
         return y
 
     def backward(self, gy):
         x, W = self.inputs
-        gx = matmul(gy, W.T)
-        gW = matmul(x.T, gy)
+        gx = matmul(gy, W.T) if x.requires_grad else None
+        gW = matmul(x.T, gy) if W.requires_grad else None
         return gx, gW
 
+    def jvp(self, xs, ys, txs):
+        (x, W), (tx, tW) = xs, txs
+        return sum_tangents(ys[0].shape,
+                            None if tx is None else utils.dot(tx, W),
+                            None if tW is None else utils.dot(x, tW))
+
+    def taylor(self, xs, ys, sxs):
+        sx, sW = sxs
+        return [ys[0]] + [series_mul(sx, sW, k, mul=utils.dot)
+                          for k in range(1, len(sx))]
+
 
 def matmul(x, W):
     return MatMul()(x, W)
 
 
 class Linear(Function):
+    __slots__ = ()
+    saves = 'inputs'
+
     def forward(self, x, W, b):
-        y = x.dot(W)
+        y = utils.dot(x, W)
         if b is not None:
             y += b
         return y
 
     def backward(self, gy):
         x, W, b = self.inputs
-        gb = None if b.data is None else sum_to(gy, b.shape)
-        gx = matmul(gy, W.T)
-        gW = matmul(x.T, gy)
+        gb = sum_to(gy, b.shape) if b.requires_grad else None
+        gx = matmul(gy, W.T) if x.requires_grad else None
+        gW = matmul(x.T, gy) if W.requires_grad else None
         return gx, gW, gb
 
+    def jvp(self, xs, ys, txs):
+        (x, W, b), (tx, tW, tb) = xs, txs
+        return sum_tangents(ys[0].shape,
+                            None if tx is None else utils.dot(tx, W),
+                            None if tW is None else utils.dot(x, tW), tb)
+
+    def taylor(self, xs, ys, sxs):
+        sx, sW, sb = sxs
+        return [ys[0]] + [sum_tangents(ys[0].shape,
+                                       series_mul(sx, sW, k, mul=utils.dot),
+                                       sb[k])
+                          for k in range(1, len(sx))]
+
 
 def linear(x, W, b=None):
     return Linear()(x, W, b)
@@ -310,6 +505,9 @@ def sigmoid_simple(x):
 
 
 class Sigmoid(Function):
+    __slots__ = ()
+    saves = 'outputs'
+
     def forward(self, x):
         xp = cuda.get_array_module(x)
         # y = 1 / (1 + xp.exp(-x))
@@ -321,28 +519,63 @@ class Sigmoid(Function):
         gx = gy * y * (1 - y)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        y = ys[0]
+        return y * (1 - y) * txs[0]
+
+    def taylor(self, xs, ys, sxs):
+        # y' = (y - y^2) x'
+        sx, y = sxs[0], ys[0]
+        sy, sg = [y], [y * (1 - y)]
+        for k in range(1, len(sx)):
+            sy.append(series_compose(sx, sg, k))
+            t = series_mul(sy, sy, k)
+            sg.append(sum_tangents(y.shape, sy[k], None if t is None else -t))
+        return sy
+
 
 def sigmoid(x):
     return Sigmoid()(x)
 
 
 class ReLU(Function):
+    __slots__ = ('mask',)
+    saves = 'mask'
+    saved_attrs = ('mask',)
+    linear = True
+
     def forward(self, x):
         xp = cuda.get_array_module(x)
+        self.mask = x > 0
         y = xp.maximum(x, 0.0)
         return y
 
     def backward(self, gy):
-        x, = self.inputs
-        mask = x.data > 0
-        gx = gy * mask
+        gx = gy * self.mask
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return txs[0] * self.mask
+
 
 def relu(x):
     return ReLU()(x)
 
 
+class ReLUInplace(ReLU):
+    __slots__ = ()
+
+    def forward(self, x):
+        xp = cuda.get_array_module(x)
+        self.mask = x > 0
+        return xp.maximum(x, 0, out=x)
+
+
+def relu_(x):
+    """`relu` written into the array of `x` (see `dezero.core.add_`)."""
+    return modified(x, ReLUInplace()(x))
+
+
 def softmax_simple(x, axis=1):
     x = as_variable(x)
     y = exp(x)
@@ -351,6 +584,9 @@ def softmax_simple(x, axis=1):
 
 
 class Softmax(Function):
+    __slots__ = ('axis',)
+    saves = 'outputs'
+
     def __init__(self, axis=1):
         self.axis = axis
 
@@ -368,12 +604,21 @@ class Softmax(Function):
         gx -= y * sumdx
         return gx
 
+    def jvp(self, xs, ys, txs):
+        y, tx = ys[0], txs[0]
+        ty = y * tx
+        ty -= y * ty.sum(axis=self.axis, keepdims=True)
+        return ty
+
 
 def softmax(x, axis=1):
     return Softmax(axis)(x)
 
 
 class LogSoftmax(Function):
+    __slots__ = ('axis',)
+    saves = 'outputs'
+
     def __init__(self, axis=1):
         self.axis = axis
 
@@ -387,32 +632,235 @@ class LogSoftmax(Function):
         gx = gy - exp(y) * gy.sum(axis=self.axis, keepdims=True)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        xp = cuda.get_array_module(ys[0])
+        tx = txs[0]
+        return tx - (xp.exp(ys[0]) * tx).sum(axis=self.axis, keepdims=True)
+
 
 def log_softmax(x, axis=1):
     return LogSoftmax(axis)(x)
 
 
 class LeakyReLU(Function):
+    __slots__ = ('mask', 'slope')
+    saves = 'mask'
+    saved_attrs = ('mask',)
+    linear = True
+
     def __init__(self, slope):
         self.slope = slope
 
     def forward(self, x):
+        self.mask = x > 0
         y = x.copy()
-        y[x <= 0] *= self.slope
+        y[~self.mask] *= self.slope
         return y
 
     def backward(self, gy):
-        x, = self.inputs
-        mask = (x.data > 0).astype(gy.dtype)
+        mask = self.mask.astype(gy.dtype)
         mask[mask <= 0] = self.slope
         gx = gy * mask
         return gx
 
+    def jvp(self, xs, ys, txs):
+        xp = cuda.get_array_module(txs[0])
+        return xp.where(self.mask, txs[0], txs[0] * self.slope)
+
 
 def leaky_relu(x, slope=0.2):
     return LeakyReLU(slope)(x)
 
 
+# =============================================================================
+# fused: sigmoid_mul / tanh_mul / cell_update / bias_activation
+# =============================================================================
+# Each op runs in a single Function with out= buffers. The backward works on
+# raw arrays unless a graph of the gradients is being built
+# (create_graph=True), in which case it falls back to differentiable ops.
+def _as_grads(gxs, inputs):
+    gxs = [Variable(gx) for gx in gxs]
+    return tuple(sum_to(gx, x.shape) for gx, x in zip(gxs, inputs))
+
+
+class SigmoidMul(Function):
+    """y = sigmoid(x) * z"""
+    __slots__ = ('s',)
+    saves = 'inputs'
+    saved_attrs = ('s',)
+
+    def forward(self, x, z):
+        xp = cuda.get_array_module(x)
+        s = xp.multiply(x, 0.5)
+        xp.tanh(s, out=s)
+        s *= 0.5
+        s += 0.5
+        self.s = s
+        y = s * z
+        return y
+
+    def backward(self, gy):
+        x, z = self.inputs
+        if dezero.Config.enable_backprop:
+            s = sigmoid(x)
+            gx = gy * z * s * (1 - s)
+            gz = gy * s
+            return sum_to(gx, x.shape), sum_to(gz, z.shape)
+
+        s, gy = self.s, gy.data
+        gz = gy * s
+        gx = gy * z.data
+        gx *= s
+        gx *= 1 - s
+        return _as_grads((gx, gz), self.inputs)
+
+    def jvp(self, xs, ys, txs):
+        (x, z), (tx, tz), s = xs, txs, self.s
+        return sum_tangents(ys[0].shape,
+                            None if tx is None else tx * s * (1 - s) * z,
+                            None if tz is None else s * tz)
+
+
+def sigmoid_mul(x, z):
+    return SigmoidMul()(x, z)
+
+
+class TanhMul(Function):
+    """y = o * tanh(c)"""
+    __slots__ = ('t',)
+    saves = 'inputs'
+    saved_attrs = ('t',)
+
+    def forward(self, o, c):
+        xp = cuda.get_array_module(c)
+        t = xp.tanh(c)
+        self.t = t
+        y = o * t
+        return y
+
+    def backward(self, gy):
+        o, c = self.inputs
+        if dezero.Config.enable_backprop:
+            t = tanh(c)
+            go = gy * t
+            gc = gy * o * (1 - t * t)
+            return sum_to(go, o.shape), sum_to(gc, c.shape)
+
+        t, gy = self.t, gy.data
+        go = gy * t
+        gc = gy * o.data
+        gc *= 1 - t * t
+        return _as_grads((go, gc), self.inputs)
+
+    def jvp(self, xs, ys, txs):
+        (o, c), (to, tc), t = xs, txs, self.t
+        return sum_tangents(ys[0].shape,
+                            None if to is None else to * t,
+                            None if tc is None else o * (1 - t * t) * tc)
+
+
+def tanh_mul(o, c):
+    return TanhMul()(o, c)
+
+
+class CellUpdate(Function):
+    """y = f * c + i * u (the cell update of LSTM)"""
+    __slots__ = ()
+    saves = 'inputs'
+
+    def forward(self, f, c, i, u):
+        xp = cuda.get_array_module(f)
+        y = xp.multiply(f, c)
+        tmp = xp.multiply(i, u)
+        y += tmp
+        return y
+
+    def backward(self, gy):
+        f, c, i, u = self.inputs
+        if dezero.Config.enable_backprop:
+            gxs = (gy * c, gy * f, gy * u, gy * i)
+            return tuple(sum_to(gx, x.shape) for gx, x in zip(gxs, self.inputs))
+
+        gy = gy.data
+        gxs = (gy * c.data, gy * f.data, gy * u.data, gy * i.data)
+        return _as_grads(gxs, self.inputs)
+
+    def jvp(self, xs, ys, txs):
+        f, c, i, u = xs
+        tf, tc, ti, tu = txs
+        return sum_tangents(ys[0].shape,
+                            None if tf is None else tf * c,
+                            None if tc is None else f * tc,
+                            None if ti is None else ti * u,
+                            None if tu is None else i * tu)
+
+
+def cell_update(f, c, i, u):
+    return CellUpdate()(f, c, i, u)
+
+
+class BiasActivation(Function):
+    """y = activation(x + b) where activation is sigmoid, tanh or relu"""
+    __slots__ = ('activation', 'b_shape', 'x_shape')
+    saves = 'outputs'
+
+    def __init__(self, activation):
+        if activation not in ('sigmoid', 'tanh', 'relu'):
+            raise ValueError('unsupported activation: {}'.format(activation))
+        self.activation = activation
+
+    def forward(self, x, b):
+        xp = cuda.get_array_module(x)
+        self.x_shape, self.b_shape = x.shape, b.shape
+        y = x + b
+        if self.activation == 'sigmoid':
+            y *= 0.5
+            xp.tanh(y, out=y)
+            y *= 0.5
+            y += 0.5
+        elif self.activation == 'tanh':
+            xp.tanh(y, out=y)
+        else:
+            xp.maximum(y, 0, out=y)
+        return y
+
+    def backward(self, gy):
+        y = self.outputs[0]()  # weakref
+        if dezero.Config.enable_backprop:
+            if self.activation == 'sigmoid':
+                gz = gy * y * (1 - y)
+            elif self.activation == 'tanh':
+                gz = gy * (1 - y * y)
+            else:
+                gz = gy * (y.data > 0)
+            return sum_to(gz, self.x_shape), sum_to(gz, self.b_shape)
+
+        y = y.data
+        if self.activation == 'sigmoid':
+            gz = gy.data * y
+            gz *= 1 - y
+        elif self.activation == 'tanh':
+            gz = 1 - y * y
+            gz *= gy.data
+        else:
+            gz = gy.data * (y > 0)
+        gz = Variable(gz)
+        return sum_to(gz, self.x_shape), sum_to(gz, self.b_shape)
+
+    def jvp(self, xs, ys, txs):
+        y = ys[0]
+        tz = sum_tangents(y.shape, *txs)
+        if self.activation == 'sigmoid':
+            return y * (1 - y) * tz
+        elif self.activation == 'tanh':
+            return (1 - y * y) * tz
+        return tz * (y > 0)
+
+
+def bias_activation(x, b, activation='relu'):
+    return BiasActivation(activation)(x, b)
+
+
 # =============================================================================
 # loss function: mean_squared_error / softmax_cross_entropy / sigmoid_cross_entropy / binary_cross_entropy
 # =============================================================================
@@ -424,6 +872,9 @@ def mean_squared_error_simple(x0, x1):
 
 
 class MeanSquaredError(Function):
+    __slots__ = ()
+    saves = 'inputs'
+
     def forward(self, x0, x1):
         diff = x0 - x1
         y = (diff ** 2).sum() / len(diff)
@@ -437,6 +888,12 @@ class MeanSquaredError(Function):
         gx1 = -gx0
         return gx0, gx1
 
+    def jvp(self, xs, ys, txs):
+        (x0, x1), (t0, t1) = xs, txs
+        diff = x0 - x1
+        tdiff = sum_tangents(diff.shape, t0, None if t1 is None else -t1)
+        return (2 * diff * tdiff).sum() / len(diff)
+
 
 def mean_squared_error(x0, x1):
     return MeanSquaredError()(x0, x1)
@@ -454,6 +911,9 @@ def softmax_cross_entropy_simple(x, t):
 
 
 class SoftmaxCrossEntropy(Function):
+    __slots__ = ()
+    saves = 'inputs'
+
     def forward(self, x, t):
         N = x.shape[0]
         log_z = utils.logsumexp(x, axis=1)
@@ -470,10 +930,18 @@ class SoftmaxCrossEntropy(Function):
         y = softmax(x)
         # convert to one-hot
         xp = cuda.get_array_module(t.data)
-        t_onehot = xp.eye(CLS_NUM, dtype=t.dtype)[t.data]
+        t_onehot = xp.eye(CLS_NUM, dtype=x.dtype)[t.data]
         y = (y - t_onehot) * gy
         return y
 
+    def jvp(self, xs, ys, txs):
+        (x, t), tx = xs, txs[0]
+        N, CLS_NUM = x.shape
+        xp = cuda.get_array_module(x)
+        p = xp.exp(x - utils.logsumexp(x, axis=1))
+        p -= xp.eye(CLS_NUM, dtype=x.dtype)[t]
+        return (p * tx).sum() / np.float32(N)
+
 
 def softmax_cross_entropy(x, t):
     return SoftmaxCrossEntropy()(x, t)
@@ -529,7 +997,41 @@ def dropout(x, dropout_ratio=0.5):
         return x
 
 
+class DropoutInplace(Function):
+    __slots__ = ('dropout_ratio', 'mask', 'scale')
+    saves = 'mask'
+    saved_attrs = ('mask',)
+
+    def __init__(self, dropout_ratio):
+        self.dropout_ratio = dropout_ratio
+
+    def forward(self, x):
+        xp = cuda.get_array_module(x)
+        self.mask = xp.random.rand(*x.shape) > self.dropout_ratio
+        self.scale = xp.array(1.0 - self.dropout_ratio).astype(x.dtype)
+        x *= self.mask
+        x /= self.scale
+        return x
+
+    def backward(self, gy):
+        return gy * self.mask / self.scale
+
+    def jvp(self, xs, ys, txs):
+        return txs[0] * self.mask / self.scale
+
+
+def dropout_(x, dropout_ratio=0.5):
+    """`dropout` written into the array of `x` (see `dezero.core.add_`)."""
+    if dezero.Config.train:
+        return modified(x, DropoutInplace(dropout_ratio)(x))
+    return x
+
+
 class BatchNorm(Function):
+    __slots__ = ('avg_mean', 'avg_var', 'decay', 'eps', 'inv_std')
+    saves = 'inputs'
+    saved_attrs = ('inv_std',)
+
     def __init__(self, mean, var, decay, eps):
         self.avg_mean = mean
         self.avg_var = var
@@ -584,18 +1086,57 @@ class BatchNorm(Function):
         if x.ndim == 4:
             N, C, H, W = x.shape
             x = x.transpose(0, 2, 3, 1).reshape(-1, C)
-        mean = x.sum(axis=0) / batch_size
-        xc = (x - mean) * self.inv_std
 
-        gbeta = sum(gy, axis=0)
-        ggamma = sum(xc * gy, axis=0)
-        gx = gy - gbeta / batch_size - xc * ggamma / batch_size
-        gx *= gamma * self.inv_std
+        if self.inv_std is None:
+            # test mode: y is an affine function of x
+            xp = cuda.get_array_module(x)
+            inv_std = 1 / xp.sqrt(self.avg_var + self.eps)
+            xc = (x - self.avg_mean) * inv_std
+            gbeta = sum(gy, axis=0)
+            ggamma = sum(xc * gy, axis=0)
+            gx = gy * (gamma * inv_std)
+        else:
+            mean = x.sum(axis=0) / batch_size
+            xc = (x - mean) * self.inv_std
+
+            gbeta = sum(gy, axis=0)
+            ggamma = sum(xc * gy, axis=0)
+            gx = gy - gbeta / batch_size - xc * ggamma / batch_size
+            gx *= gamma * self.inv_std
 
         if gy_ndim == 4:
             gx = gx.reshape(N, H, W, C).transpose(0, 3, 1, 2)
         return gx, ggamma, gbeta
 
+    def jvp(self, xs, ys, txs):
+        (x, gamma, beta), (tx, tgamma, tbeta) = xs, txs
+        x_ndim = x.ndim
+        if x_ndim == 4:
+            N, C, H, W = x.shape
+            x = x.transpose(0, 2, 3, 1).reshape(-1, C)
+            if tx is not None:
+                tx = tx.transpose(0, 2, 3, 1).reshape(-1, C)
+
+        xp = cuda.get_array_module(x)
+        if dezero.Config.train:
+            inv_std = self.inv_std
+            xc = (x - x.mean(axis=0)) * inv_std
+        else:
+            inv_std = 1 / xp.sqrt(self.avg_var + self.eps)
+            xc = (x - self.avg_mean) * inv_std
+
+        txc = None
+        if tx is not None:
+            txc = tx * inv_std
+            if dezero.Config.train:
+                txc = txc - txc.mean(axis=0) - xc * (xc * txc).mean(axis=0)
+        ty = sum_tangents(xc.shape, None if txc is None else gamma * txc,
+                          None if tgamma is None else tgamma * xc, tbeta)
+
+        if x_ndim == 4:
+            ty = ty.reshape(N, H, W, C).transpose(0, 3, 1, 2)
+        return ty
+
 
 def batch_nrom(x, gamma, beta, mean, var, decay=0.9, eps=2e-5):
     return BatchNorm(mean, var, decay, eps)(x, gamma, beta)
@@ -609,6 +1150,9 @@ def embed_id(x, W):
 # max / min / clip
 # =============================================================================
 class Max(Function):
+    __slots__ = ('axis', 'keepdims')
+    linear = True
+
     def __init__(self, axis=None, keepdims=False):
         self.axis = axis
         self.keepdims = keepdims
@@ -628,8 +1172,16 @@ class Max(Function):
         gy = broadcast_to(gy, cond.shape)
         return gy * cond
 
+    def jvp(self, xs, ys, txs):
+        x, y = xs[0], ys[0]
+        shape = utils.max_backward_shape(x, self.axis)
+        cond = (x == y.reshape(shape))
+        return (txs[0] * cond).sum(axis=self.axis, keepdims=self.keepdims)
+
 
 class Min(Max):
+    __slots__ = ()
+
     def forward(self, x):
         y = x.min(axis=self.axis, keepdims=self.keepdims)
         return y
@@ -644,25 +1196,128 @@ def min(x, axis=None, keepdims=False):
 
 
 class Clip(Function):
+    __slots__ = ('mask', 'x_max', 'x_min')
+    saves = 'mask'
+    saved_attrs = ('mask',)
+    linear = True
+
     def __init__(self, x_min, x_max):
         self.x_min = x_min
         self.x_max = x_max
 
     def forward(self, x):
         xp = cuda.get_array_module(x)
+        self.mask = (x >= self.x_min) * (x <= self.x_max)
         y = xp.clip(x, self.x_min, self.x_max)
         return y
 
     def backward(self, gy):
-        x, = self.inputs
-        mask = (x.data >= self.x_min) * (x.data <= self.x_max)
-        gx = gy * mask
+        gx = gy * self.mask
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return txs[0] * self.mask
+
 
 def clip(x, x_min, x_max):
     return Clip(x_min, x_max)(x)
 
+# =============================================================================
+# checkpoint
+# =============================================================================
+class Checkpoint(Function):
+    """Runs `fn` without building its graph and recomputes it in backward.
+
+    Only the inputs of the segment are kept. The NumPy random state and
+    `Config.train` are restored for the recomputation so that e.g. dropout
+    draws the same mask. Gradients of the parameters used inside `fn` are
+    accumulated while this Function is backpropagated. Higher-order
+    gradients through the segment are not supported.
+    """
+    __slots__ = ('fn', 'rng_state', 'train')
+    saves = 'inputs'
+    saved_attrs = ('rng_state',)
+    uses_params = True
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def forward(self, *xs):
+        self.train = dezero.Config.train
+        self.rng_state = np.random.get_state()
+        with dezero.no_grad():
+            ys = self.fn(*[Variable(x) for x in xs])
+        if isinstance(ys, tuple):
+            return tuple(y.data for y in ys)
+        return ys.data
+
+    def backward(self, *gys):
+        rng_state = np.random.get_state()
+        np.random.set_state(self.rng_state)
+        try:
+            with dezero.using_config('enable_backprop', True), \
+                    dezero.using_config('train', self.train):
+                xs = [Variable(x.data, requires_grad=x.requires_grad)
+                      for x in self.inputs]
+                ys = self.fn(*xs)
+        finally:
+            np.random.set_state(rng_state)
+
+        if not isinstance(ys, tuple):
+            ys = (ys,)
+        # 出力が途中の関数を共有していてもよいように、1回の逆伝播で流す
+        outputs = []
+        for y, gy in zip(ys, gys):
+            if gy is not None:
+                y.grad = gy
+                outputs.append(y)
+        _backward(outputs)
+        return tuple(x.grad for x in xs)
+
+    def jvp(self, xs, ys, txs):
+        # fn is run again with the tangents attached to its inputs
+        tangents = dezero.Config.forward_ad
+        rng_state = np.random.get_state()
+        np.random.set_state(self.rng_state)
+        try:
+            with dezero.no_grad(), dezero.using_config('train', self.train):
+                inputs = [Variable(x) for x in xs]
+                for x, tx in zip(inputs, txs):
+                    if tx is not None:
+                        tangents[x] = tx
+                outputs = self.fn(*inputs)
+        finally:
+            np.random.set_state(rng_state)
+        if not isinstance(outputs, tuple):
+            return tangents.get(outputs)
+        return tuple(tangents.get(y) for y in outputs)
+
+    def taylor(self, xs, ys, sxs):
+        # jvp stores whatever the table holds: here the coefficient lists
+        order = len(sxs[0]) - 1
+        series = self.jvp(xs, ys, [None if all(c is None for c in sx[1:])
+                                   else sx[1:] for sx in sxs])
+        if not isinstance(series, tuple):
+            series = (series,)
+        series = tuple([y] + (sy if sy is not None else [None] * order)
+                       for y, sy in zip(ys, series))
+        return series if len(series) > 1 else series[0]
+
+
+def checkpoint(fn, *inputs):
+    """Activation recomputation (gradient checkpointing).
+
+    Args:
+        fn (callable): `dezero.Layer` or function of Variables to run as a
+            single segment.
+        inputs (`dezero.Variable` or `ndarray`): Inputs of `fn`.
+
+    Returns:
+        `dezero.Variable` or tuple of them: Outputs of `fn`.
+    """
+    return Checkpoint(fn)(*inputs)
+
+
 # =============================================================================
 # conv2d / col2im / im2col / basic_math
 # =============================================================================
@@ -675,6 +1330,7 @@ from dezero.functions_conv import pooling_simple
 from dezero.functions_conv import pooling
 from dezero.functions_conv import average_pooling
 from dezero.core import add
+from dezero.core import add_
 from dezero.core import sub
 from dezero.core import rsub
 from dezero.core import mul
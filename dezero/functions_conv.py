@@ -1,7 +1,7 @@
 import numpy as np
 from dezero import cuda
-from dezero.core import Function, as_variable
-from dezero.utils import pair, get_conv_outsize, get_deconv_outsize
+from dezero.core import Function, as_variable, sum_tangents
+from dezero.utils import pair, get_conv_outsize, get_deconv_outsize, tensordot
 from dezero.functions import linear, broadcast_to
 
 
@@ -81,6 +81,8 @@ def pooling_simple(x, kernel_size, stride=1, pad=0):
 #  conv2d / deconv2d
 # =============================================================================
 class Conv2d(Function):
+    saves = 'inputs'
+
     def __init__(self, stride=1, pad=0):
         super().__init__()
         self.stride = pair(stride)
@@ -92,7 +94,7 @@ class Conv2d(Function):
         KH, KW = W.shape[2:]
         col = im2col_array(x, (KH, KW), self.stride, self.pad, to_matrix=False)
 
-        y = xp.tensordot(col, W, ((1, 2, 3), (1, 2, 3)))
+        y = tensordot(col, W, ((1, 2, 3), (1, 2, 3)))
         if b is not None:
             y += b
         y = xp.rollaxis(y, 3, 1)
@@ -101,23 +103,36 @@ class Conv2d(Function):
 
     def backward(self, gy):
         x, W, b = self.inputs
+        gx = gW = gb = None
         # ==== gx ====
-        gx = deconv2d(gy, W, b=None, stride=self.stride, pad=self.pad,
-                      outsize=(x.shape[2], x.shape[3]))
+        if x.requires_grad:
+            gx = deconv2d(gy, W, b=None, stride=self.stride, pad=self.pad,
+                          outsize=(x.shape[2], x.shape[3]))
         # ==== gW ====
-        gW = Conv2DGradW(self)(x, gy)
+        if W.requires_grad:
+            gW = Conv2DGradW(self)(x, gy)
         # ==== gb ====
-        gb = None
-        if b.data is not None:
+        if b.requires_grad:
             gb = gy.sum(axis=(0, 2, 3))
         return gx, gW, gb
 
+    def jvp(self, xs, ys, txs):
+        (x, W, b), (tx, tW, tb) = xs, txs
+        ty = sum_tangents(ys[0].shape,
+                          None if tx is None else self.forward(tx, W, None),
+                          None if tW is None else self.forward(x, tW, None))
+        if tb is not None:
+            ty = ty + tb.reshape((1, -1, 1, 1))
+        return ty
+
 
 def conv2d(x, W, b=None, stride=1, pad=0):
     return Conv2d(stride, pad)(x, W, b)
 
 
 class Deconv2d(Function):
+    saves = 'inputs'
+
     def __init__(self, stride=1, pad=0, outsize=None):
         super().__init__()
         self.stride = pair(stride)
@@ -139,7 +154,7 @@ class Deconv2d(Function):
             out_h, out_w = pair(self.outsize)
         img_shape = (N, OC, out_h, out_w)
 
-        gcol = xp.tensordot(Weight, x, (0, 1))
+        gcol = tensordot(Weight, x, (0, 1))
         gcol = xp.rollaxis(gcol, 3)
         y = col2im_array(gcol, img_shape, (KH, KW), self.stride, self.pad,
                          to_matrix=False)
@@ -151,18 +166,28 @@ class Deconv2d(Function):
 
     def backward(self, gy):
         x, W, b = self.inputs
-
+        gx = gW = gb = None
         # ==== gx ====
-        gx = conv2d(gy, W, b=None, stride=self.stride, pad=self.pad)
+        if x.requires_grad:
+            gx = conv2d(gy, W, b=None, stride=self.stride, pad=self.pad)
         # ==== gW ====
-        f = Conv2DGradW(self)
-        gW = f(gy, x)
+        if W.requires_grad:
+            f = Conv2DGradW(self)
+            gW = f(gy, x)
         # ==== gb ====
-        gb = None
-        if b.data is not None:
+        if b.requires_grad:
             gb = gy.sum(axis=(0, 2, 3))
         return gx, gW, gb
 
+    def jvp(self, xs, ys, txs):
+        (x, W, b), (tx, tW, tb) = xs, txs
+        ty = sum_tangents(ys[0].shape,
+                          None if tx is None else self.forward(tx, W, None),
+                          None if tW is None else self.forward(x, tW, None))
+        if tb is not None:
+            ty = ty + tb.reshape((1, -1, 1, 1))
+        return ty
+
 
 def deconv2d(x, W, b=None, stride=1, pad=0, outsize=None):
     return Deconv2d(stride, pad, outsize)(x, W, b)
@@ -177,11 +202,9 @@ class Conv2DGradW(Function):
         self.pad = conv2d.pad
 
     def forward(self, x, gy):
-        xp = cuda.get_array_module(x)
-
         col = im2col_array(x, self.kernel_size, self.stride, self.pad,
                            to_matrix=False)
-        gW = xp.tensordot(gy, col, ((0, 2, 3), (0, 4, 5)))
+        gW = tensordot(gy, col, ((0, 2, 3), (0, 4, 5)))
         return gW
 
     def backward(self, gys):
@@ -194,11 +217,20 @@ class Conv2DGradW(Function):
         ggy = conv2d(x, gW, stride=self.stride, pad=self.pad)
         return gx, ggy
 
+    def jvp(self, xs, ys, txs):
+        (x, gy), (tx, tgy) = xs, txs
+        return sum_tangents(ys[0].shape,
+                            None if tx is None else self.forward(tx, gy),
+                            None if tgy is None else self.forward(x, tgy))
+
 
 # =============================================================================
 #  pooling(max-pooling) / average_pooling
 # =============================================================================
 class Pooling(Function):
+    saves = 'shapes'
+    saved_attrs = ('indexes',)
+
     def __init__(self, kernel_size, stride=1, pad=0):
         super().__init__()
         self.kernel_size = kernel_size
@@ -206,6 +238,7 @@ class Pooling(Function):
         self.pad = pad
 
     def forward(self, x):
+        self.input_shape, self.dtype = x.shape, x.dtype
         col = im2col_array(x, self.kernel_size, self.stride, self.pad,
                            to_matrix=False)
 
@@ -218,15 +251,20 @@ class Pooling(Function):
     def backward(self, gy):
         return Pooling2DGrad(self)(gy)
 
+    def jvp(self, xs, ys, txs):
+        return Pooling2DWithIndexes(self).forward(txs[0])
+
 
 class Pooling2DGrad(Function):
+    saves = 'shapes'
+
     def __init__(self, mpool2d):
         self.mpool2d = mpool2d
         self.kernel_size = mpool2d.kernel_size
         self.stride = mpool2d.stride
         self.pad = mpool2d.pad
-        self.input_shape = mpool2d.inputs[0].shape
-        self.dtype = mpool2d.inputs[0].dtype
+        self.input_shape = mpool2d.input_shape
+        self.dtype = mpool2d.dtype
         self.indexes = mpool2d.indexes
 
     def forward(self, gy):
@@ -254,14 +292,19 @@ class Pooling2DGrad(Function):
         f = Pooling2DWithIndexes(self.mpool2d)
         return f(ggx)
 
+    def jvp(self, xs, ys, txs):
+        return self.forward(txs[0])
+
 
 class Pooling2DWithIndexes(Function):
+    saves = 'shapes'
+
     def __init__(self, mpool2d):
         self.kernel_size = mpool2d.kernel_size
         self.stride = mpool2d.stride
         self.pad = mpool2d.pad
-        self.input_shpae = mpool2d.inputs[0].shape
-        self.dtype = mpool2d.inputs[0].dtype
+        self.input_shpae = mpool2d.input_shape
+        self.dtype = mpool2d.dtype
         self.indexes = mpool2d.indexes
 
     def forward(self, x):
@@ -274,12 +317,17 @@ class Pooling2DWithIndexes(Function):
         col = col[np.arange(len(indexes)), indexes]
         return col.reshape(N, C, OH, OW)
 
+    def jvp(self, xs, ys, txs):
+        return self.forward(txs[0])
+
 
 def pooling(x, kernel_size, stride=1, pad=0):
     return Pooling(kernel_size, stride, pad)(x)
 
 
 class AveragePooling(Function):
+    saves = 'shapes'
+
     def __init__(self, kernel_size, stride=1, pad=0):
         super().__init__()
         self.kernel_size = kernel_size
@@ -305,6 +353,9 @@ class AveragePooling(Function):
                     self.pad, to_matrix=False)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return self.forward(txs[0])
+
 
 def average_pooling(x, kernel_size, stride=1, pad=0):
     return AveragePooling(kernel_size, stride, pad)(x)
@@ -314,6 +365,8 @@ def average_pooling(x, kernel_size, stride=1, pad=0):
 #  im2col / col2im
 # =============================================================================
 class Im2col(Function):
+    saves = 'shapes'
+
     def __init__(self, kernel_size, stride, pad, to_matrix):
         super().__init__()
         self.input_shape = None
@@ -333,6 +386,9 @@ class Im2col(Function):
                     self.pad, self.to_matrix)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return self.forward(txs[0])
+
 
 def im2col(x, kernel_size, stride=1, pad=0, to_matrix=True):
     """Extract patches from an image based on the filter.
@@ -365,6 +421,8 @@ def im2col(x, kernel_size, stride=1, pad=0, to_matrix=True):
 
 
 class Col2im(Function):
+    saves = 'shapes'
+
     def __init__(self, input_shape, kernel_size, stride, pad, to_matrix):
         super().__init__()
         self.input_shape = input_shape
@@ -383,6 +441,9 @@ class Col2im(Function):
                     self.to_matrix)
         return gx
 
+    def jvp(self, xs, ys, txs):
+        return self.forward(txs[0])
+
 
 def col2im(x, input_shape, kernel_size, stride=1, pad=0, to_matrix=True):
     return Col2im(input_shape, kernel_size, stride, pad, to_matrix)(x)
@@ -1,8 +1,9 @@
 import weakref
 import numpy as np
-from dezero.core import Parameter
+from dezero.core import Parameter, Config, using_config
 import dezero.functions as F
 from dezero import cuda
+from dezero.utils import pair
 import os
 
 class Layer:
@@ -23,7 +24,15 @@ class Layer:
                 yield obj
         
     def __call__(self, *inputs):
-        outputs = self.forward(*inputs)
+        scope = Config.layer_scope
+        if scope is None:
+            outputs = self.forward(*inputs)
+        else:
+            Config.layer_scope = LayerScope(self, scope)
+            try:
+                outputs = self.forward(*inputs)
+            finally:
+                Config.layer_scope = scope
         if not isinstance(outputs, tuple):
             outputs = (outputs, )
         self.inputs = [weakref.ref(x) for x in inputs]
@@ -76,6 +85,40 @@ class Layer:
         for param in self.params():
             param.to_gpu()
             
+class LayerScope:
+    """One call of a Layer recorded by `record_layers`.
+
+    Functions created during the call point to it through `Function.scope`;
+    `parent` is the scope of the enclosing Layer call (the root scope has
+    no layer).
+    """
+    __slots__ = ('layer', 'parent')
+
+    def __init__(self, layer, parent):
+        self.layer = layer
+        self.parent = parent
+
+
+def record_layers():
+    """Record which Layer call created each Function so that the graph
+    exporters in `dezero.utils` can collapse Layers into single nodes.
+
+    Usage:
+        with L.record_layers():
+            y = model(x)
+        utils.write_graph(y, 'graph.dot', collapse=True)
+    """
+    return using_config('layer_scope', LayerScope(None, None))
+
+
+def _cast(*xs):
+    # mixed precision: compute in Config.compute_dtype, keep the Parameters
+    dtype = Config.compute_dtype
+    if dtype is None:
+        return xs
+    return tuple(F.astype(x, dtype) for x in xs)
+
+
 class Linear(Layer):
     def __init__(self, out_size, nobias=False, dtype=np.float32, in_size=None):
         super().__init__()
@@ -103,7 +146,8 @@ class Linear(Layer):
             xp = cuda.get_array_module(x)
             self._init_W(xp)
 
-        y = F.linear(x, self.W, self.b)
+        x, W, b = _cast(x, self.W, self.b)
+        y = F.linear(x, W, b)
         return y
     
 class Conv2d(Layer):
@@ -139,8 +183,9 @@ class Conv2d(Layer):
             xp = cuda.get_array_module(x)
             self._init_W(xp)
             
-#         y = F.conv2d_simple(x, self.W, self.b, self.stride, self.pad)
-        y = F.conv2d(x, self.W, self.b, self.stride, self.pad)
+        x, W, b = _cast(x, self.W, self.b)
+#         y = F.conv2d_simple(x, W, b, self.stride, self.pad)
+        y = F.conv2d(x, W, b, self.stride, self.pad)
         return y
     
     
@@ -184,22 +229,17 @@ class LSTM(Layer):
 
     def forward(self, x):
         if self.h is None:
-            f = F.sigmoid(self.x2f(x))
-            i = F.sigmoid(self.x2i(x))
             o = F.sigmoid(self.x2o(x))
             u = F.tanh(self.x2u(x))
+            c_new = F.sigmoid_mul(self.x2i(x), u)
         else:
-            f = F.sigmoid(self.x2f(x) + self.h2f(self.h))
-            i = F.sigmoid(self.x2i(x) + self.h2i(self.h))
-            o = F.sigmoid(self.x2o(x) + self.h2o(self.h))
-            u = F.tanh(self.x2u(x) + self.h2u(self.h))
-
-        if self.c is None:
-            c_new = (i * u)
-        else:
-            c_new = (f * self.c) + (i * u)
+            f = F.bias_activation(self.x2f(x), self.h2f(self.h), 'sigmoid')
+            i = F.bias_activation(self.x2i(x), self.h2i(self.h), 'sigmoid')
+            o = F.bias_activation(self.x2o(x), self.h2o(self.h), 'sigmoid')
+            u = F.bias_activation(self.x2u(x), self.h2u(self.h), 'tanh')
+            c_new = F.cell_update(f, self.c, i, u)
 
-        h_new = o * F.tanh(c_new)
+        h_new = F.tanh_mul(o, c_new)
 
         self.h, self.c = h_new, c_new
         return h_new
@@ -0,0 +1,431 @@
+import numpy as np
+from dezero import utils
+from dezero.core import (Variable, Config, using_config, Add, Sub, Mul, Div,
+                         Neg, Pow, Square)
+from dezero.functions import (Exp, Log, Sin, Cos, Tanh, Sigmoid, ReLU, MatMul,
+                              Linear)
+
+
+def lazy():
+    """Record Functions as an expression DAG instead of running them.
+
+    Inside the context the supported Functions (arithmetic, elementwise
+    math, `F.matmul` and `F.linear`) return `LazyVariable`s whose arrays are
+    computed only when `.data` is read (this includes `backward`, which
+    runs eagerly). The whole pending expression is then evaluated at once:
+
+    - chains of matmuls are reassociated to the cheapest order,
+    - broadcast terms of a sum (biases) are added together before they are
+      added to the full-size term,
+    - elementwise ops write into the buffer of a temporary input that has
+      no other use.
+
+    Other Functions run eagerly on materialized inputs. The autograd graph
+    is recorded as usual.
+
+    Usage:
+        with dezero.lazy.lazy():
+            y = model(x)
+        y.data  # runs the whole forward
+    """
+    return using_config('lazy', True)
+
+
+_data = Variable.data  # the slot of Variable.data
+
+
+class LazyVariable(Variable):
+    """Output of a deferred Function.
+
+    `node` is `(function, inputs, versions)` until the array is computed. An
+    intermediate that was folded into the expression of its consumer (or
+    whose buffer was reused by it) keeps its node and is recomputed if it is
+    read later.
+    """
+    __slots__ = ('node', '_shape', '_dtype', '_uses')
+
+    def __init__(self, node, shape, dtype, requires_grad=True):
+        super().__init__(None, requires_grad=requires_grad)
+        self.node = node
+        self._shape = shape
+        self._dtype = dtype
+        # number of recorded Functions that take this Variable as input
+        self._uses = 0
+
+    @property
+    def data(self):
+        data = _data.__get__(self)
+        if data is None and self.node is not None:
+            evaluate(self)
+            data = _data.__get__(self)
+        return data
+
+    @data.setter
+    def data(self, value):
+        _data.__set__(self, value)
+        if value is not None:
+            self.node = None
+
+    @property
+    def shape(self):
+        data = _data.__get__(self)
+        return self._shape if data is None else data.shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def dtype(self):
+        data = _data.__get__(self)
+        return self._dtype if data is None else data.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+
+def _pending(x):
+    return (isinstance(x, LazyVariable) and x.node is not None
+            and _data.__get__(x) is None)
+
+
+def _none(x):
+    # the missing bias of F.linear
+    return not isinstance(x, LazyVariable) and x.data is None
+
+
+# =============================================================================
+# recording
+# =============================================================================
+def _like(x):
+    # an array with the dtype of `x` for np.result_type (0-dim arrays keep
+    # NumPy's scalar casting rules)
+    if isinstance(x, LazyVariable) and _data.__get__(x) is None:
+        return np.zeros((1,) * min(x.ndim, 1), x.dtype)
+    return x.data
+
+
+def _unary(f, x):
+    return x.shape, x.dtype
+
+
+def _binary(f, x0, x1):
+    return (np.broadcast_shapes(x0.shape, x1.shape),
+            np.result_type(_like(x0), _like(x1)))
+
+
+def _matmul(f, x, W, b=None):
+    if x.ndim < 1 or W.ndim != 2:
+        return None
+    shape = x.shape[:-1] + W.shape[1:]
+    if b is None or _none(b):
+        return shape, np.result_type(_like(x), _like(W))
+    return (np.broadcast_shapes(shape, b.shape),
+            np.result_type(_like(x), _like(W), _like(b)))
+
+
+_shape_rules = {
+    Add: _binary, Sub: _binary, Mul: _binary, Div: _binary,
+    Neg: _unary, Pow: _unary, Square: _unary, Exp: _unary, Log: _unary,
+    Sin: _unary, Cos: _unary, Tanh: _unary, Sigmoid: _unary, ReLU: _unary,
+    MatMul: _matmul, Linear: _matmul,
+}
+
+
+def defer(f, inputs, requires_grad):
+    """Called by `Function.__call__` in lazy mode. Returns the outputs of `f`
+    without running it, or None if `f` has to run eagerly."""
+    rule = _shape_rules.get(type(f))
+    if rule is None or Config.compute_dtype is not None:
+        return None
+    spec = rule(f, *inputs)
+    if spec is None:
+        return None
+    versions = None
+    for x in inputs:
+        if isinstance(x, LazyVariable):
+            x._uses += 1
+        if x._version is not None:
+            versions = tuple([x._version[0] if x._version else 0
+                              for x in inputs])
+    shape, dtype = spec
+    return [LazyVariable((f, tuple(inputs), versions), shape, dtype,
+                         requires_grad)]
+
+
+# =============================================================================
+# evaluation
+# =============================================================================
+# plans: ('call', f, inputs) | ('prod', factors) | ('sum', terms)
+# factors are Variables, terms are Variables or ('prod', factors)
+def _needed(x, f):
+    # True if the autograd graph reads the array of `x` (so it is computed
+    # once and kept rather than folded into its consumer `f`)
+    g = x.creator
+    if g is None:
+        return False
+    return g.saves in (None, 'outputs') or f.saves in (None, 'inputs')
+
+
+def _absorbed(x, f, types):
+    if not (_pending(x) and x._uses == 1 and type(x.node[0]) in types):
+        return False
+    g, inputs, _ = _node(x)
+    if type(g) is Linear:
+        # (x W + b) is a term of a sum, (x W) a factor of a product
+        if _none(inputs[2]) != (types is _prod_types):
+            return False
+    if types is _prod_types and (x.ndim != 2 or inputs[0].ndim != 2):
+        return False
+    return not _needed(x, f)
+
+
+_prod_types = (MatMul, Linear)
+_sum_types = (Add, Linear)
+
+
+def _factors(x, f):
+    if not _absorbed(x, f, _prod_types):
+        return [x]
+    g, inputs, _ = x.node
+    return _factors(inputs[0], g) + _factors(inputs[1], g)
+
+
+def _terms(x, f):
+    if not _absorbed(x, f, _sum_types):
+        return [x]
+    g, inputs, _ = x.node
+    if type(g) is Linear:
+        return [('prod', _factors(inputs[0], g) + _factors(inputs[1], g))] \
+            + _terms(inputs[2], g)
+    # Add.backward needs the shapes that forward would have stored
+    g.x0_shape, g.x1_shape = inputs[0].shape, inputs[1].shape
+    return _terms(inputs[0], g) + _terms(inputs[1], g)
+
+
+def _node(v):
+    # inputs modified in place after they were recorded cannot be used
+    f, inputs, versions = v.node
+    for i, x in enumerate(inputs):
+        if x._version is not None and x._version[0] != (
+                0 if versions is None else versions[i]):
+            raise RuntimeError(
+                f'an input of the deferred {type(f).__name__} was modified '
+                'by an in-place operation before it was computed')
+    return v.node
+
+
+def _plan(v):
+    f, inputs, _ = _node(v)
+    if type(f) is MatMul or type(f) is Linear and _none(inputs[2]):
+        if v.ndim >= 1 and inputs[1].ndim == 2:
+            factors = _factors(inputs[0], f) + _factors(inputs[1], f)
+            if len(factors) > 2:
+                return ('prod', factors)
+    elif type(f) is Linear:
+        return ('sum', [('prod', _factors(inputs[0], f)
+                         + _factors(inputs[1], f))] + _terms(inputs[2], f))
+    elif type(f) is Add:
+        f.x0_shape, f.x1_shape = inputs[0].shape, inputs[1].shape
+        terms = _terms(inputs[0], f) + _terms(inputs[1], f)
+        if len(terms) > 2:
+            return ('sum', terms)
+    return ('call', f, inputs)
+
+
+def _dependencies(plan):
+    if plan[0] == 'call':
+        return plan[2]
+    deps = []
+    for x in plan[1]:
+        if isinstance(x, tuple):
+            deps.extend(x[1])
+        else:
+            deps.append(x)
+    return deps
+
+
+def evaluate(target):
+    """Compute the array of `target` and of the pending Variables it depends
+    on."""
+    plans = {}
+    computed = []
+    fresh = set()
+    # 深さ優先で依存先から計算する
+    stack = [target]
+    while stack:
+        v = stack[-1]
+        if not _pending(v):
+            stack.pop()
+            continue
+        plan = plans.get(id(v))
+        if plan is None:
+            plan = plans[id(v)] = _plan(v)
+            stack.extend(x for x in _dependencies(plan) if _pending(x))
+            continue
+        stack.pop()
+        y, is_fresh = _compute(v, plan, fresh)
+        _data.__set__(v, y)
+        computed.append(v)
+        if is_fresh:
+            fresh.add(id(v))
+    # inputs of materialized Variables are no longer needed
+    for v in computed:
+        if _data.__get__(v) is not None:
+            v.node = None
+
+
+def _donor(x, y_shape, y_dtype, fresh):
+    # a temporary whose buffer can be overwritten: computed in this pass,
+    # used only here and outside of any autograd graph
+    if (id(x) not in fresh or x._uses != 1 or x.creator is not None
+            or y_dtype.kind != 'f'):
+        return None
+    data = _data.__get__(x)
+    if data is None or data.shape != y_shape or data.dtype != y_dtype:
+        return None
+    return data
+
+
+def _give(x, fresh):
+    # its buffer now holds the consumer's result; recompute it if read again
+    _data.__set__(x, None)
+    fresh.discard(id(x))
+
+
+def _compute(v, plan, fresh):
+    if plan[0] == 'prod':
+        return _product([x.data for x in plan[1]]), True
+    if plan[0] == 'sum':
+        return _sum(plan[1], fresh), True
+
+    f, inputs = plan[1], plan[2]
+    ufunc = _ufuncs.get(type(f))
+    if ufunc is None:
+        y = f.forward(*[x.data for x in inputs])
+        return y, False
+    xs = [x.data for x in inputs]
+    y_shape = np.broadcast_shapes(*[x.shape for x in xs])
+    y_dtype = np.result_type(*xs)
+    out = None
+    for x in inputs:
+        out = _donor(x, y_shape, y_dtype, fresh)
+        if out is not None:
+            _give(x, fresh)
+            break
+    if type(f) in (Add, Sub):
+        f.x0_shape, f.x1_shape = xs[0].shape, xs[1].shape
+    return ufunc(f, *xs, out=out), True
+
+
+def _relu(f, x, out=None):
+    f.mask = x > 0
+    return np.maximum(x, 0.0, out=out)
+
+
+def _sigmoid(f, x, out=None):
+    y = np.multiply(x, 0.5, out=out)
+    np.tanh(y, out=y)
+    y *= 0.5
+    y += 0.5
+    return y
+
+
+def _wrap_ufunc(ufunc):
+    return lambda f, *xs, out=None: ufunc(*xs, out=out)
+
+
+# elementwise Functions computed with an optional output buffer; the
+# results are always new arrays
+_ufuncs = {
+    Add: _wrap_ufunc(np.add), Sub: _wrap_ufunc(np.subtract),
+    Mul: _wrap_ufunc(np.multiply), Div: _wrap_ufunc(np.divide),
+    Neg: _wrap_ufunc(np.negative), Square: _wrap_ufunc(np.square),
+    Exp: _wrap_ufunc(np.exp), Log: _wrap_ufunc(np.log),
+    Sin: _wrap_ufunc(np.sin), Cos: _wrap_ufunc(np.cos),
+    Tanh: _wrap_ufunc(np.tanh),
+    Pow: lambda f, x, out=None: np.power(x, f.c, out=out),
+    ReLU: _relu, Sigmoid: _sigmoid,
+}
+
+
+def _product(arrays):
+    """Product of a chain of matrices in the order with the fewest
+    multiply-adds (only the first one may have more than 2 dims)."""
+    first = arrays[0]
+    lead = first.shape[:-1]
+    arrays = [first.reshape(-1, first.shape[-1])] + arrays[1:]
+    n = len(arrays)
+    dims = [arrays[0].shape[0]] + [a.shape[1] for a in arrays]
+    # cost[i][j]: cheapest product of arrays[i..j], split[i][j]: its last split
+    cost = [[0] * n for _ in range(n)]
+    split = [[0] * n for _ in range(n)]
+    for length in range(1, n):
+        for i in range(n - length):
+            j = i + length
+            cost[i][j] = None
+            for k in range(i, j):
+                c = cost[i][k] + cost[k + 1][j] + dims[i] * dims[k + 1] * dims[j + 1]
+                if cost[i][j] is None or c < cost[i][j]:
+                    cost[i][j], split[i][j] = c, k
+
+    def multiply(i, j):
+        if i == j:
+            return arrays[i]
+        k = split[i][j]
+        return utils.dot(multiply(i, k), multiply(k + 1, j))
+
+    y = multiply(0, n - 1)
+    return y.reshape(lead + y.shape[1:])
+
+
+def _sum(terms, fresh):
+    arrays = []
+    owned = None
+    for term in terms:
+        if isinstance(term, tuple):
+            arrays.append(_product([x.data for x in term[1]]))
+            owned = len(arrays) - 1 if owned is None else owned
+        else:
+            arrays.append(term.data)
+    y_shape = np.broadcast_shapes(*[a.shape for a in arrays])
+    y_dtype = np.result_type(*arrays)
+
+    full = [i for i, a in enumerate(arrays)
+            if a.shape == y_shape and a.dtype == y_dtype]
+    if not full:
+        y = arrays[0]
+        for a in arrays[1:]:
+            y = y + a
+        return y
+
+    if owned not in full:
+        owned = None
+        for i in full:
+            term = terms[i]
+            if not isinstance(term, tuple) and _donor(term, y_shape, y_dtype,
+                                                      fresh) is not None:
+                _give(term, fresh)
+                owned = i
+                break
+    # the broadcast terms (biases) are summed first, then added once
+    small = sorted((i for i in range(len(arrays)) if i not in full),
+                   key=lambda i: arrays[i].size)
+    rest = [i for i in full if i != owned]
+    s = None
+    for i in small:
+        s = arrays[i] if s is None else s + arrays[i]
+    others = [arrays[i] for i in rest] + ([] if s is None else [s])
+
+    if owned is None:
+        y = others[0] + others[1] if len(others) > 1 else others[0].copy()
+        others = others[2:]
+    else:
+        y = arrays[owned]
+    for a in others:
+        np.add(y, a, out=y)
+    return y
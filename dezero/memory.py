@@ -0,0 +1,164 @@
+import sys
+import sysconfig
+import collections
+import threading
+import contextlib
+import numpy as np
+from dezero import cuda
+from dezero.core import Config
+
+
+def _unused(pool, i):
+    # 参照がpoolと引数だけなら使われていない
+    return sys.getrefcount(pool[i]) == 2
+
+
+class Arena:
+    """Pool of NumPy arrays keyed by (shape, dtype).
+
+    A buffer handed out by `empty` goes back to the pool by itself once
+    nothing refers to it any more (neither the array nor a view of it), so
+    a training loop with fixed shapes allocates its intermediates in the
+    first iteration and recycles them afterwards. Only Functions that
+    allocate through `empty`, `zeros` or `empty_like` use the arena; the
+    built-in Functions allocate with NumPy directly, because recycling the
+    im2col, pooling and matmul buffers of a small CNN gave no measurable
+    gain. The buffers are kept
+    until `clear` is called, or until `max_bytes` is reached: then the free
+    buffers of the least recently used shapes are dropped, and if that is
+    not enough the new array is allocated outside the arena.
+
+    The arena is only used when enabled with `use_arena`. Whether a buffer
+    is free is read from its reference count, which needs CPython with the
+    GIL: on other implementations and on free-threaded builds the count is
+    not exact and `Arena()` raises RuntimeError.
+
+    `stats` has the number of `requests`, how many were served by `reuses`,
+    the `bytes` held by the arena, their maximum `peak_bytes` and the number
+    of buffers dropped by `evictions`.
+
+    Usage:
+        class Square(Function):
+            def forward(self, x):
+                return np.multiply(x, x, out=memory.empty_like(x))
+            ...
+
+        arena = Arena(max_bytes=256 * 2 ** 20)
+        with use_arena(arena):
+            for x, t in train_loader:
+                ...
+        print(arena.reuse_rate, arena.stats['peak_bytes'])
+    """
+    def __init__(self, max_bytes=None):
+        _check_refcount()
+        self.max_bytes = max_bytes
+        self.pools = collections.OrderedDict()
+        self.stats = {'requests': 0, 'reuses': 0, 'bytes': 0, 'peak_bytes': 0,
+                      'evictions': 0}
+        self.lock = threading.Lock()  # Config is per thread, the arena is not
+
+    @property
+    def reuse_rate(self):
+        requests = self.stats['requests']
+        return self.stats['reuses'] / requests if requests else 0.0
+
+    def empty(self, shape, dtype):
+        shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        key = (shape, np.dtype(dtype))
+        stats = self.stats
+        with self.lock:
+            stats['requests'] += 1
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = self.pools[key] = []
+            self.pools.move_to_end(key)
+            for i in range(len(pool)):
+                if _unused(pool, i):
+                    stats['reuses'] += 1
+                    return pool[i]
+            a = np.empty(*key)
+            if (self.max_bytes is not None and
+                    stats['bytes'] + a.nbytes > self.max_bytes and
+                    not self._evict(stats['bytes'] + a.nbytes - self.max_bytes,
+                                    key)):
+                return a
+            pool.append(a)
+            stats['bytes'] += a.nbytes
+            stats['peak_bytes'] = max(stats['peak_bytes'], stats['bytes'])
+            return a
+
+    def _evict(self, nbytes, current):
+        # 古い形状から使われていないバッファを捨てる
+        stats = self.stats
+        for key in list(self.pools):
+            if key == current:
+                continue
+            pool = self.pools[key]
+            for i in reversed(range(len(pool))):
+                if _unused(pool, i):
+                    nbytes -= pool[i].nbytes
+                    stats['bytes'] -= pool[i].nbytes
+                    stats['evictions'] += 1
+                    del pool[i]
+                    if nbytes <= 0:
+                        break
+            if not pool:
+                del self.pools[key]
+            if nbytes <= 0:
+                return True
+        return False
+
+    def clear(self):
+        """Drop the pooled buffers (arrays still in use stay valid)."""
+        with self.lock:
+            self.pools = collections.OrderedDict()
+            self.stats['bytes'] = 0
+
+
+def _check_refcount():
+    if sys.implementation.name != 'cpython' or \
+            sysconfig.get_config_var('Py_GIL_DISABLED'):
+        raise RuntimeError('Arena needs exact reference counts '
+                           '(CPython with the GIL)')
+    pool = [np.empty(1)]
+    if not _unused(pool, 0):
+        raise RuntimeError('Arena needs exact reference counts '
+                           '(CPython with the GIL)')
+
+
+@contextlib.contextmanager
+def use_arena(arena=None):
+    """Let `empty`, `zeros` and `empty_like` take their arrays from `arena`
+    (a new `Arena` if None), which is yielded."""
+    if arena is None:
+        arena = Arena()
+    old_arena = Config.arena
+    Config.arena = arena
+    try:
+        yield arena
+    finally:
+        Config.arena = old_arena
+
+
+# =============================================================================
+# allocation helpers for Functions
+# =============================================================================
+def empty(shape, dtype, xp=np):
+    """`xp.empty` taken from the active arena (CuPy has its own pool)."""
+    arena = Config.arena
+    if arena is None or xp is not np:
+        return xp.empty(shape, dtype)
+    return arena.empty(shape, dtype)
+
+
+def zeros(shape, dtype, xp=np):
+    arena = Config.arena
+    if arena is None or xp is not np:
+        return xp.zeros(shape, dtype)
+    a = arena.empty(shape, dtype)
+    a.fill(0)
+    return a
+
+
+def empty_like(a):
+    return empty(a.shape, a.dtype, cuda.get_array_module(a))
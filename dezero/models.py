@@ -6,9 +6,12 @@ import dezero.functions as F
 import dezero.layers as L
 
 class Model(Layer):
-    def plot(self, *inputs, to_file='model.png', verbose=True):
-        y = self.forward(*inputs)
-        return utils.plot_dot_graph(y, verbose=verbose, to_file=to_file)
+    def plot(self, *inputs, to_file='model.png', verbose=True, max_depth=None,
+             collapse=False):
+        with L.record_layers():
+            y = self.forward(*inputs)
+        return utils.plot_dot_graph(y, verbose=verbose, to_file=to_file,
+                                    max_depth=max_depth, collapse=collapse)
     
     
 class MLP(Model):
@@ -55,27 +58,27 @@ class VGG16(Model):
             self.load_weights(weights_path)
 
     def forward(self, x):
-        x = F.relu(self.conv1_1(x))
-        x = F.relu(self.conv1_2(x))
+        x = F.relu_(self.conv1_1(x))
+        x = F.relu_(self.conv1_2(x))
         x = F.pooling(x, 2, 2)
-        x = F.relu(self.conv2_1(x))
-        x = F.relu(self.conv2_2(x))
+        x = F.relu_(self.conv2_1(x))
+        x = F.relu_(self.conv2_2(x))
         x = F.pooling(x, 2, 2)
-        x = F.relu(self.conv3_1(x))
-        x = F.relu(self.conv3_2(x))
-        x = F.relu(self.conv3_3(x))
+        x = F.relu_(self.conv3_1(x))
+        x = F.relu_(self.conv3_2(x))
+        x = F.relu_(self.conv3_3(x))
         x = F.pooling(x, 2, 2)
-        x = F.relu(self.conv4_1(x))
-        x = F.relu(self.conv4_2(x))
-        x = F.relu(self.conv4_3(x))
+        x = F.relu_(self.conv4_1(x))
+        x = F.relu_(self.conv4_2(x))
+        x = F.relu_(self.conv4_3(x))
         x = F.pooling(x, 2, 2)
-        x = F.relu(self.conv5_1(x))
-        x = F.relu(self.conv5_2(x))
-        x = F.relu(self.conv5_3(x))
+        x = F.relu_(self.conv5_1(x))
+        x = F.relu_(self.conv5_2(x))
+        x = F.relu_(self.conv5_3(x))
         x = F.pooling(x, 2, 2)
         x = F.reshape(x, (x.shape[0], -1))
-        x = F.dropout(F.relu(self.fc6(x)))
-        x = F.dropout(F.relu(self.fc7(x)))
+        x = F.dropout_(F.relu_(self.fc6(x)))
+        x = F.dropout_(F.relu_(self.fc7(x)))
         x = self.fc8(x)
         return x
 
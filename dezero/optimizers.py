@@ -1,5 +1,6 @@
 import numpy as np
 from dezero import cuda
+from dezero.core import Variable, hvp
 
 import math
 
@@ -7,21 +8,30 @@ class Optimizer:
     def __init__(self):
         self.target = None
         self.hooks = []
+        self.loss_scaler = None
         
     def setup(self, target):
         self.target = target
         return self
     
+    def set_loss_scaler(self, loss_scaler):
+        self.loss_scaler = loss_scaler
+        return self
+    
     def update(self):
         # None 意外のパラメータをリストにまとめる
         params = [p for p in self.target.params() if p.grad is not None]
         
+        # 勾配がオーバーフローしたステップは飛ばす
+        if self.loss_scaler is not None and not self.loss_scaler.unscale(params):
+            return False
         # 前処理（オプション）
         for f in self.hooks:
             f(params)
         # パラメターの更新
         for param in params:
             self.update_one(param)
+        return True
             
     def update_one(self, param):
         raise NotImplementedError()
@@ -119,7 +129,10 @@ class Adam(Optimizer):
 
     def update(self, *args, **kwargs):
         self.t += 1
-        super().update(*args, **kwargs)
+        if not super().update(*args, **kwargs):
+            self.t -= 1  # skipped by the loss scaler
+            return False
+        return True
 
     @property
     def lr(self):
@@ -141,4 +154,188 @@ class Adam(Optimizer):
 
         m += (1 - beta1) * (grad - m)
         v += (1 - beta2) * (grad * grad - v)
-        param.data -= self.lr * m / (xp.sqrt(v) + eps)
\ No newline at end of file
+        param.data -= self.lr * m / (xp.sqrt(v) + eps)
+
+
+# =============================================================================
+# second order
+# =============================================================================
+class NewtonCG(Optimizer):
+    """Newton-CG (Hessian-free) optimizer.
+
+    Each step solves `(H + damping * I) d = grad` with conjugate gradient,
+    using `hvp` for the products with the Hessian, and moves the
+    parameters by `-lr * d`. If CG meets negative curvature it stops with
+    the direction found so far (the gradient on the first iteration).
+
+    The damping is adapted as in Levenberg-Marquardt: the loss passed to
+    the next `update` is compared with the decrease predicted by the
+    quadratic model, and the damping is raised when the model was too
+    optimistic and lowered when it was accurate. A step that increased the
+    loss is undone and `update` returns False; the next call should pass
+    the loss recomputed at the restored parameters. This assumes
+    consecutive losses are comparable (full batch or large batches).
+
+    `update` takes the loss and runs the backward itself.
+
+    Usage:
+        optimizer = NewtonCG().setup(model)
+        for i in range(iters):
+            loss = F.mean_squared_error(model(x), t)
+            optimizer.update(loss)
+    """
+    def __init__(self, lr=1.0, damping=1.0, max_iter=10, tol=1e-10,
+                 adapt_damping=True):
+        super().__init__()
+        self.lr = lr
+        self.damping = damping
+        self.max_iter = max_iter
+        self.tol = tol
+        self.adapt_damping = adapt_damping
+        self.cg_iters = 0
+        self.prev_loss = None
+        self.predicted = None
+        self.prev_params = None
+
+    def update(self, loss):
+        if self.adapt_damping and self.predicted is not None:
+            actual = float(loss.data) - self.prev_loss
+            self.adapt(actual)
+            if not actual <= 0:
+                # the step increased the loss: take it back
+                for param, data in self.prev_params:
+                    param.data[...] = data
+                self.predicted = None
+                return False
+
+        params = list(self.target.params())
+        for param in params:
+            param.cleargrad()
+        loss.backward(create_graph=True)
+        params = [p for p in params if p.grad is not None]
+
+        for f in self.hooks:
+            f(params)
+        grads = [p.grad for p in params]
+        b = [g.data for g in grads]
+        d, r = self.solve(lambda v: hvp(loss, params, v, grads), b)
+        if self.adapt_damping:
+            self.prev_params = [(p, p.data.copy()) for p in params]
+        for param, di in zip(params, d):
+            param.data -= self.lr * di
+
+        # q(-lr d) = -lr g.d + lr^2/2 d.(H + damping I)d with (H + damping I)d = b - r
+        lr = self.lr
+        self.predicted = -lr * _dot(b, d) + 0.5 * lr * lr * (_dot(d, b) - _dot(d, r))
+        self.prev_loss = float(loss.data)
+        return True
+
+    def adapt(self, actual):
+        rho = actual / self.predicted if self.predicted < 0 else 0.0
+        if rho < 0.25:
+            self.damping *= 1.5
+        elif rho > 0.75:
+            self.damping /= 1.5
+
+    def solve(self, matvec, b):
+        """Conjugate gradient for `(A + damping * I) x = b`.
+
+        Returns:
+            tuple: The solution `x` and the residual `b - (A + damping * I) x`.
+        """
+        damping = self.damping
+        x = [bi * 0 for bi in b]
+        r = [bi.copy() for bi in b]
+        p = [ri.copy() for ri in r]
+        rs = _dot(r, r)
+        self.cg_iters = 0
+        for i in range(self.max_iter):
+            Ap = [a + damping * pi for a, pi in zip(matvec(p), p)]
+            pAp = _dot(p, Ap)
+            if pAp <= 0:
+                # negative curvature
+                if i == 0:
+                    x = p
+                    r = [bi * 0 for bi in b]
+                break
+            alpha = rs / pAp
+            for xi, pi, ri, ai in zip(x, p, r, Ap):
+                xi += alpha * pi
+                ri -= alpha * ai
+            self.cg_iters = i + 1
+            rs_new = _dot(r, r)
+            if rs_new < self.tol:
+                break
+            beta = rs_new / rs
+            p = [ri + beta * pi for ri, pi in zip(r, p)]
+            rs = rs_new
+        return x, r
+
+
+def _dot(xs, ys):
+    return float(sum((x * y).sum() for x, y in zip(xs, ys)))
+
+
+# =============================================================================
+# mixed precision
+# =============================================================================
+class LossScaler:
+    """Dynamic loss scaling for training with float16 activations.
+
+    The loss is multiplied by `loss_scale` before backward so that small
+    gradients do not underflow in float16. `Optimizer.update` then divides
+    the gradients by the scale, or skips the step if any of them is inf/nan
+    and lowers the scale. After `growth_interval` steps without overflow
+    the scale is raised again.
+
+    Usage:
+        scaler = LossScaler()
+        optimizer = Adam().setup(model).set_loss_scaler(scaler)
+        with dezero.using_config('compute_dtype', np.float16):
+            y = model(x)
+        loss = F.softmax_cross_entropy(F.astype(y, np.float32), t)
+        model.cleargrads()
+        scaler.scale(loss).backward()
+        optimizer.update()
+    """
+    def __init__(self, loss_scale=2.0 ** 15, growth_factor=2.0,
+                 backoff_factor=0.5, growth_interval=1000):
+        self.loss_scale = loss_scale
+        self.growth_factor = growth_factor
+        self.backoff_factor = backoff_factor
+        self.growth_interval = growth_interval
+        self.good_steps = 0
+        self.skipped_steps = 0
+
+    def scale(self, loss):
+        return loss * self.loss_scale
+
+    def unscale(self, params):
+        """Divide the gradients of `params` by the scale.
+
+        Returns:
+            bool: False (and the gradients are left as is) if a gradient
+                overflowed.
+        """
+        for param in params:
+            xp = cuda.get_array_module(param.grad.data)
+            if not xp.isfinite(param.grad.data).all():
+                self.loss_scale *= self.backoff_factor
+                self.good_steps = 0
+                self.skipped_steps += 1
+                return False
+
+        inv_scale = 1.0 / self.loss_scale
+        for param in params:
+            grad = param.grad
+            if grad is getattr(param, 'grad_buffer', None):
+                grad.data *= inv_scale
+            else:
+                # the gradient Variable may be shared with other inputs
+                param.grad = Variable(grad.data * grad.data.dtype.type(inv_scale))
+
+        self.good_steps += 1
+        if self.good_steps == self.growth_interval:
+            self.loss_scale *= self.growth_factor
+            self.good_steps = 0
+        return True
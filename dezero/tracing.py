@@ -0,0 +1,246 @@
+from dezero.core import Variable, Parameter, Config, using_config, as_array
+
+
+class TracedStep:
+    """Trace one forward+backward of `model` and replay it on new batches.
+
+    The first call runs eagerly while recording every Function applied in
+    the forward pass. Later calls with the same input shapes/dtypes and the
+    same `Config.train` reuse the recorded Function and Variable objects:
+    only `Function.forward` is run on the new arrays and the kept graph is
+    backpropagated again. Any other call falls back to eager mode.
+
+    Values computed outside of Functions (e.g. the mask of `F.dropout`)
+    are frozen at trace time, so models using them should stay eager.
+
+    Args:
+        model (`dezero.Layer`): Model to train.
+        loss_fn (callable): Called as `loss_fn(y, t)` with the model output.
+        optimize (bool): If True the recorded graph is passed through
+            `optimize_graph` before the first backward. The removed nodes
+            and bytes are kept in `stats`.
+
+    Usage:
+        step = TracedStep(model, F.softmax_cross_entropy)
+        for x, t in train_loader:
+            loss = step(x, t)
+            optimizer.update()
+    """
+    def __init__(self, model, loss_fn, optimize=False):
+        self.model = model
+        self.loss_fn = loss_fn
+        self.optimize = optimize
+        self.stats = None
+        self.key = None
+        self.ops = None
+        self.placeholders = None
+        self.leaves = None
+        self.y = None
+        self.loss = None
+
+    def __call__(self, x, t):
+        key = self._key(x, t)
+        if self.ops is None:
+            return self._trace(x, t, key)
+        if key == self.key:
+            return self._replay(x, t)
+        return self._eager(x, t)
+
+    @staticmethod
+    def _key(*inputs):
+        return tuple((x.shape, x.dtype) for x in inputs), Config.train
+
+    def _eager(self, x, t):
+        y = self.model(x)
+        loss = self.loss_fn(y, t)
+        self.model.cleargrads()
+        loss.backward()
+        return loss
+
+    def _trace(self, x, t, key):
+        placeholders = (Variable(x, requires_grad=False),
+                        Variable(t, requires_grad=False))
+        ops = []
+        with using_config('tape', ops):
+            y = self.model(placeholders[0])
+            loss = self.loss_fn(y, placeholders[1])
+        if self.optimize:
+            ops, (y, loss), self.stats = optimize_graph(ops, (y, loss),
+                                                        keep=placeholders)
+        self.model.cleargrads()
+        loss.backward(retain_graph=True)
+
+        leaves = []
+        seen = set()
+        for f, inputs, outputs in ops:
+            for v in inputs:
+                if (v.creator is None and not isinstance(v, Parameter)
+                        and id(v) not in seen):
+                    seen.add(id(v))
+                    leaves.append(v)
+
+        self.key = key
+        self.ops = ops
+        self.placeholders = placeholders
+        self.leaves = leaves
+        self.y, self.loss = y, loss
+        return loss
+
+    def _replay(self, x, t):
+        self.placeholders[0].data = x
+        self.placeholders[1].data = t
+
+        for f, inputs, outputs in self.ops:
+            ys = f.forward(*[v.data for v in inputs])
+            if not isinstance(ys, tuple):
+                ys = (ys,)
+            for output, y in zip(outputs, ys):
+                output.data = as_array(y)
+
+        self.model.cleargrads()
+        for v in self.leaves:
+            v.cleargrad()
+        self.loss.cleargrad()
+        self.loss.backward(retain_graph=True)
+        return self.loss
+
+
+# =============================================================================
+# graph passes: common subexpression elimination / dead node elimination
+# =============================================================================
+_const_max_size = 64
+
+
+def _nbytes(variables):
+    return sum(v.data.nbytes for v in variables
+                        if v.data is not None and hasattr(v.data, 'nbytes'))
+
+
+def _attr_key(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return tuple(_attr_key(v) for v in value)
+    return ('id', id(value))
+
+
+def _function_attrs(f):
+    attrs = dict(getattr(f, '__dict__', {}))
+    for cls in type(f).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if hasattr(f, name):
+                attrs[name] = getattr(f, name)
+    return attrs
+
+
+_graph_attrs = ('inputs', 'outputs', 'generation', 'scope', 'versions',
+                'sources')
+
+
+def _function_key(f):
+    # only the parameters of f: the arrays that forward saves for backward
+    # (Function.saved_attrs, e.g. the mask of ReLU) differ between any two calls
+    attrs = tuple(sorted((name, _attr_key(value))
+                         for name, value in _function_attrs(f).items()
+                         if name not in _graph_attrs
+                         and name not in f.saved_attrs))
+    return type(f), attrs
+
+
+def _inplace(variables):
+    # arrays written in place (e.g. by F.add_) have a version counter: the
+    # same Variable can hold different values at two points of the tape
+    return any(v._version is not None for v in variables)
+
+
+def _input_key(v, keep):
+    if (v.creator is None and not isinstance(v, Parameter)
+            and id(v) not in keep and v.data is not None
+            and v.data.size <= _const_max_size):
+        # small constants (e.g. the 1 in `1 - y`) are compared by value
+        return 'const', v.data.dtype.str, v.data.shape, v.data.tobytes()
+    return 'id', id(v)
+
+
+def eliminate_common_subexpressions(ops, outputs, keep=()):
+    """Merge ops that apply the same Function type with the same parameters
+    to the same inputs. Ops that read or write an array modified in place
+    (e.g. by `F.relu_`) are never merged.
+
+    The inputs of the ops that remain (and their `Function.inputs`) are
+    rewritten to point at the surviving outputs.
+
+    Args:
+        ops (list): Tape recorded through `Config.tape`.
+        outputs (list of `dezero.Variable`): Variables requested by the
+            caller. Merged ones are replaced by their surviving twin.
+        keep (iterable of `dezero.Variable`): Leaf Variables whose values
+            change between runs (placeholders); never compared by value.
+
+    Returns:
+        tuple: `(ops, outputs, stats)` where `stats` has the number of
+            removed `nodes` and the `bytes` of their outputs.
+    """
+    keep = set(id(v) for v in keep)
+    replace = {}
+    seen = {}
+    new_ops = []
+    stats = {'nodes': 0, 'bytes': 0}
+
+    for f, inputs, outs in ops:
+        if any(id(v) in replace for v in inputs):
+            inputs = [replace.get(id(v), v) for v in inputs]
+            f.inputs = tuple(inputs)
+
+        if _inplace(inputs) or _inplace(outs):
+            new_ops.append((f, inputs, outs))
+            continue
+        key = (_function_key(f), tuple(_input_key(v, keep) for v in inputs))
+        if key in seen:
+            twin_outs = seen[key][2]
+            for y, twin in zip(outs, twin_outs):
+                replace[id(y)] = twin
+            stats['nodes'] += 1
+            stats['bytes'] += _nbytes(outs)
+            continue
+        seen[key] = (f, inputs, outs)
+        new_ops.append((f, inputs, outs))
+
+    outputs = [replace.get(id(v), v) for v in outputs]
+    return new_ops, outputs, stats
+
+
+def eliminate_dead_nodes(ops, outputs):
+    """Drop ops whose outputs do not reach any of `outputs`.
+
+    Returns:
+        tuple: `(ops, stats)`.
+    """
+    live = set(id(v) for v in outputs)
+    new_ops = []
+    stats = {'nodes': 0, 'bytes': 0}
+
+    for f, inputs, outs in reversed(ops):
+        if any(id(y) in live for y in outs):
+            new_ops.append((f, inputs, outs))
+            live.update(id(x) for x in inputs)
+        else:
+            stats['nodes'] += 1
+            stats['bytes'] += _nbytes(outs)
+    new_ops.reverse()
+    return new_ops, stats
+
+
+def optimize_graph(ops, outputs, keep=()):
+    """Run common subexpression and dead node elimination on a tape.
+
+    Returns:
+        tuple: `(ops, outputs, stats)`. `stats` reports the removed nodes
+            and bytes per pass (`cse`, `dce`) and in total.
+    """
+    ops, outputs, cse = eliminate_common_subexpressions(ops, outputs, keep)
+    ops, dce = eliminate_dead_nodes(ops, outputs)
+    stats = {'cse': cse, 'dce': dce,
+             'nodes': cse['nodes'] + dce['nodes'],
+             'bytes': cse['bytes'] + dce['bytes']}
+    return ops, outputs, stats
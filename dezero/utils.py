@@ -1,21 +1,25 @@
 import os
+import io
+import json
+import collections
 import subprocess
 import numpy as np
 import urllib.request
+from dezero import cuda
+from dezero.core import (Function, Variable, as_variable, no_grad,
+                         using_config, _freed_message, _Link)
 
 cache_dir = os.path.join(os.path.expanduser('~'), '.dezero')
 
-def plot_dot_graph(output, verbose=True, to_file='graph.png'):
-    dot_graph = get_dot_graph(output, verbose)
-    
+def plot_dot_graph(output, verbose=True, to_file='graph.png', max_depth=None,
+                   collapse=False):
     # 1. dotデータをファイルに保存
     tmp_dir = os.path.join(os.path.expanduser('~'), 'dezero')
     if not os.path.exists(tmp_dir): # ~/.dezeroディレクトリがなかったら作成
         os.mkdir(tmp_dir)
     graph_path = os.path.join(tmp_dir, 'tmp_graph.dot')
     
-    with open(graph_path, 'w') as f:
-        f.write(dot_graph)
+    write_graph(output, graph_path, 'dot', verbose, max_depth, collapse)
         
     # dotコマンドを呼ぶ
     extension = os.path.splitext(to_file)[1][1:] # 拡張子（png, pdfなど）
@@ -30,51 +34,204 @@ def plot_dot_graph(output, verbose=True, to_file='graph.png'):
         pass
 
 
-def get_dot_graph(output, verbose=True):
-    txt = ''
-    funcs = []
-    seen_set = set()
-    
-    def add_func(f):
-        if f not in seen_set:
-            funcs.append(f)
-            seen_set.add(f)
-            
-    add_func(output.creator)
-    txt += _dot_var(output, verbose)
-    
-    while funcs:
-        func = funcs.pop()
-        txt += _dot_func(func)
-        for x in func.inputs:
-            txt += _dot_var(x, verbose)
-            
-            if x.creator is not None:
-                add_func(x.creator)
-    return 'digraph g {\n' + txt + '}'
-            
-
-def _dot_var(v, verbose=False):
-    dot_var = '{} [label="{}", color=orange, style=filled]\n'
-    
+def get_dot_graph(output, verbose=True, max_depth=None, collapse=False):
+    f = io.StringIO()
+    write_graph(output, f, 'dot', verbose, max_depth, collapse)
+    return f.getvalue()
+
+
+def write_graph(output, file, format='dot', verbose=True, max_depth=None,
+                collapse=False):
+    """Write the graph that created `output` to a file as it is traversed.
+
+    Args:
+        output (`dezero.Variable`): Variable the graph ends at.
+        file (str or file object): Destination.
+        format (str): `'dot'` (Graphviz) or `'json'`. JSON is a list of
+            records `{"kind": "variable" | "function" | "layer", "id",
+            "label"}` and `{"kind": "edge", "source", "target"}`.
+        verbose (bool): Add the shape and dtype to variable labels.
+        max_depth (int): Only draw the nodes at most `max_depth` Functions
+            (or collapsed Layers) away from `output`. Variables at the
+            border are drawn without their creator.
+        collapse (bool or int): Draw every Layer call at this nesting level
+            (True is 1, the outermost calls) as a single node. The graph
+            must have been built under `layers.record_layers()`.
+    """
+    if isinstance(file, str):
+        with open(file, 'w') as f:
+            return write_graph(output, f, format, verbose, max_depth, collapse)
+    if format == 'dot':
+        writer = _DotWriter(file, verbose)
+    elif format == 'json':
+        writer = _JsonWriter(file, verbose)
+    else:
+        raise ValueError('format must be dot or json: {}'.format(format))
+
+    tops = {}
+
+    def node_of(f):
+        # the Layer call at level `collapse` that f belongs to (f if none)
+        scope = getattr(f, 'scope', None)
+        if scope is None or scope.layer is None:
+            return f
+        top = tops.get(scope)
+        if top is None:
+            chain = []
+            while scope.layer is not None:
+                chain.append(scope)
+                scope = scope.parent
+            if len(chain) < level:
+                return f
+            top = tops[chain[0]] = chain[-level]
+        return top
+
+    level = int(collapse)
+    var, edge = writer.var, writer.edge
+    writer.begin()
+    var(output)
+    seen_vars = {id(output)}
+    seen_nodes = set()
+    seen_edges = set()
+    links = {}
+
+    def resolve(x):
+        # an input kept as a _Link: its Variable, or a single stand-in per
+        # freed output (drawn without data)
+        if not isinstance(x, _Link):
+            return x
+        v = x()
+        if v is None:
+            v = links.setdefault((x.creator, x.index), x)
+        return v
+    # 0-1 BFS: Functions inside the same collapsed node cost no hop
+    depth = {}
+    done = set()
+    queue = collections.deque()
+    if output.creator is not None and max_depth != 0:
+        f = output.creator
+        depth[f] = 1
+        queue.append(f)
+        edge(node_of(f) if level else f, output)
+
+    while queue:
+        f = queue.popleft()
+        if f in done:
+            continue
+        done.add(f)
+        d = depth[f]
+        if level:
+            node = node_of(f)
+            if node not in seen_nodes:
+                seen_nodes.add(node)
+                writer.node(node)
+        else:
+            node = f
+            writer.node(f)
+        expand = max_depth is None or d < max_depth
+
+        if f.inputs is None:
+            raise RuntimeError(_freed_message)
+        inputs = [resolve(x) for x in f.inputs]
+        for i, x in enumerate(inputs):
+            g = gnode = x.creator
+            if not level:
+                if i and x in inputs[:i]:
+                    continue  # x is used twice by f: draw the edge once
+            else:
+                if g is not None:
+                    gnode = node_of(g)
+                    if gnode is node:
+                        # inside the node: not drawn
+                        if depth.get(g, d + 1) > d:
+                            depth[g] = d
+                            queue.appendleft(g)
+                        continue
+                key = (id(x), id(node))
+                if key in seen_edges:
+                    continue
+                seen_edges.add(key)
+            xid = id(x)
+            if xid not in seen_vars:
+                seen_vars.add(xid)
+                var(x)
+                if g is not None and expand:
+                    if g not in depth:
+                        depth[g] = d + 1
+                        queue.append(g)
+                    edge(gnode, x)
+            edge(x, node)
+    writer.end()
+
+
+def _var_label(v, verbose):
+    if isinstance(v, _Link):
+        return ''
     name = '' if v.name is None else v.name
     if verbose and v.data is not None:
         if v.name is not None:
             name += ': '
-        name += str(v.shape) + ' ' + str(v.dtype)
-    return dot_var.format(id(v), name)
+        name += str(v.data.shape) + ' ' + str(v.data.dtype)
+    return name
 
-def _dot_func(f):
-    dot_func = '{} [label="{}", color=lightblue, style=filled, shape=box]\n'
-    txt = dot_func.format(id(f), f.__class__.__name__)
-    
-    dot_edge = '{} -> {}\n'
-    for x in f.inputs:
-        txt += dot_edge.format(id(x), id(f))
-    for y in f.outputs:
-        txt += dot_edge.format(id(f), id(y())) # yはweakref
-        
-    return txt
+
+def _node_label(node):
+    if isinstance(node, Function):
+        return node.__class__.__name__
+    return node.layer.__class__.__name__
+
+
+class _DotWriter:
+    def __init__(self, file, verbose):
+        self.write = file.write
+        self.verbose = verbose
+
+    def begin(self):
+        self.write('digraph g {\n')
+
+    def end(self):
+        self.write('}')
+
+    def var(self, v):
+        self.write('%d [label="%s", color=orange, style=filled]\n'
+                   % (id(v), _var_label(v, self.verbose)))
+
+    def node(self, node):
+        self.write('%d [label="%s", color=%s, style=filled, shape=box]\n'
+                   % (id(node), _node_label(node),
+                      'lightblue' if isinstance(node, Function) else 'palegreen'))
+
+    def edge(self, a, b):
+        self.write('%d -> %d\n' % (id(a), id(b)))
+
+
+class _JsonWriter:
+    def __init__(self, file, verbose):
+        self.write = file.write
+        self.verbose = verbose
+        self.sep = ''
+
+    def begin(self):
+        self.write('[\n')
+
+    def end(self):
+        self.write('\n]\n')
+
+    def var(self, v):
+        self.write('{}{{"kind": "variable", "id": {}, "label": {}}}'.format(
+            self.sep, id(v), json.dumps(_var_label(v, self.verbose))))
+        self.sep = ',\n'
+
+    def node(self, node):
+        kind = 'function' if isinstance(node, Function) else 'layer'
+        self.write('{}{{"kind": "{}", "id": {}, "label": "{}"}}'.format(
+            self.sep, kind, id(node), _node_label(node)))
+        self.sep = ',\n'
+
+    def edge(self, a, b):
+        self.write('{}{{"kind": "edge", "source": {}, "target": {}}}'.format(
+            self.sep, id(a), id(b)))
+        self.sep = ',\n'
 
 
 def sum_to(x, shape):
@@ -124,6 +281,18 @@ def reshape_sum_backward(gy, x_shape, axis, keepdims):
     gy = gy.reshape(shape)  # reshape
     return gy
 
+def max_backward_shape(x, axis):
+    """Shape of the output of max/min over `axis` with the reduced axes
+    kept as 1 (so that it broadcasts against `x`)."""
+    if axis is None:
+        axis = range(x.ndim)
+    elif isinstance(axis, int):
+        axis = (axis,)
+    axis = [a % x.ndim for a in axis]
+
+    shape = [s if ax not in axis else 1 for ax, s in enumerate(x.shape)]
+    return shape
+
 def get_file(url, file_name=None):
     """Download a file from the `url` if it is not in the cache.
     The file at the `url` is downloaded to the `~/.dezero`.
@@ -178,8 +347,142 @@ def logsumexp(x, axis=1):
     np.log(s, out=s)
     m += s
     return m
-        
-        
+
+
+def _is_cpu_half(a, b):
+    return (isinstance(a, np.ndarray) and a.dtype == np.float16
+            and b.dtype == np.float16)
+
+
+def dot(a, b):
+    """`a.dot(b)` that sums the products of float16 arrays in float32.
+
+    NumPy has no float16 BLAS (its float16 matmul is orders of magnitude
+    slower), so on CPU the operands are upcast like a tensor core would
+    accumulate, and the result is cast back to float16.
+    """
+    if _is_cpu_half(a, b):
+        return a.astype(np.float32).dot(b.astype(np.float32)).astype(np.float16)
+    return a.dot(b)
+
+
+def tensordot(a, b, axes=2):
+    """`tensordot` with the same float16 handling as `dot`."""
+    if _is_cpu_half(a, b):
+        y = np.tensordot(a.astype(np.float32), b.astype(np.float32), axes)
+        return y.astype(np.float16)
+    xp = cuda.get_array_module(a)
+    return xp.tensordot(a, b, axes)
+
+
+def gradient_check(f, *inputs, params=None, n_projections=8, eps=1e-4,
+                   atol=1e-8, seed=0):
+    """Check the gradients of `f` against central differences along random
+    directions.
+
+    The outputs are reduced to `L = sum(y * w)` with random weights `w`.
+    For each projection all the inputs and parameters are moved at once
+    along a random unit direction `v`, and `(L(x + eps v) - L(x - eps v))
+    / (2 eps)` is compared with `grad(L) . v` from one backward pass. The
+    cost is one backward and `2 * n_projections` forwards whatever the
+    size of the layer. The check runs in float64, and the parameters get
+    their dtype and gradient back afterwards. Random ops (e.g. dropout) see
+    the same random state in every forward.
+
+    Args:
+        f (callable): A `Function`, a `Layer` or any function of Variables.
+        inputs (`ndarray` or `Variable`): Inputs of `f`. Float inputs are
+            checked; others (e.g. labels) are held fixed and None (e.g. a
+            missing bias) is passed as is.
+        params (list of `Parameter`): Parameters to check. Defaults to
+            `f.params()` for a `Layer`.
+        n_projections (int): Number of random directions.
+        eps (float): Step of the central differences.
+        atol (float): Floor of the denominator of the relative error, so
+            that projections where both derivatives are close to zero do
+            not count as errors.
+        seed (int): Seed of the random weights and directions.
+
+    Returns:
+        float: Worst relative error `|fd - ad| / max(|fd|, |ad|, atol)`
+            over the projections.
+
+    Usage:
+        assert gradient_check(L.Conv2d(64, 3, pad=1), x) < 1e-6
+    """
+    rng = np.random.RandomState(seed)
+    def is_float(x):
+        return (x is not None and x.data is not None
+                and x.data.dtype.kind == 'f')
+
+    xs = [x if x is None else as_variable(x) for x in inputs]
+    xp = cuda.get_array_module([x for x in xs if x is not None][0])
+    xs = [Variable(x.data.astype(np.float64)) if is_float(x) else x
+          for x in xs]
+    targets = [x for x in xs if is_float(x)]
+
+    if params is None and hasattr(f, 'params'):
+        if any(p.data is None for p in f.params()):
+            with no_grad():
+                f(*xs)  # 遅延初期化のパラメータを作る
+        params = list(f.params())
+    params = list(params or ())
+    saved = [(p.data, p.grad) for p in params]
+    rng_state = np.random.get_state()
+
+    def forward():
+        np.random.set_state(rng_state)
+        ys = f(*xs)
+        return ys if isinstance(ys, (tuple, list)) else (ys,)
+
+    def project(ys, ws):
+        return sum(float((as_variable(y).data * w).sum())
+                   for y, w in zip(ys, ws))
+
+    try:
+        for p in params:
+            p.data = p.data.astype(np.float64)
+            p.cleargrad()
+        targets += params
+
+        ys = forward()
+        ws = [xp.asarray(rng.standard_normal(y.shape)) for y in ys]
+        loss = None
+        for y, w in zip(ys, ws):
+            term = (y * w).sum()
+            loss = term if loss is None else loss + term
+        with using_config('inplace_grad', False):
+            loss.backward()
+        grads = [t.grad.data if t.grad is not None else 0 for t in targets]
+
+        worst = 0.0
+        for _ in range(n_projections):
+            vs = [xp.asarray(rng.standard_normal(t.shape)) for t in targets]
+            norm = np.sqrt(sum(float((v * v).sum()) for v in vs))
+            vs = [v / norm for v in vs]
+            ad = sum(float((g * v).sum()) for g, v in zip(grads, vs))
+
+            origs = [t.data for t in targets]
+            with no_grad():
+                for t, x, v in zip(targets, origs, vs):
+                    t.data = x + eps * v
+                plus = project(forward(), ws)
+                for t, x, v in zip(targets, origs, vs):
+                    t.data = x - eps * v
+                minus = project(forward(), ws)
+            for t, x in zip(targets, origs):
+                t.data = x
+            fd = (plus - minus) / (2 * eps)
+
+            scale = max(abs(fd), abs(ad), atol)
+            worst = max(worst, abs(fd - ad) / scale)
+    finally:
+        np.random.set_state(rng_state)
+        for p, (data, grad) in zip(params, saved):
+            p.data, p.grad = data, grad
+    return worst
+
+
 # Conv utils
 def get_deconv_outsize(size, k, s, p):
     return s * (size - 1) + k - 2 * p
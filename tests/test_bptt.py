@@ -0,0 +1,16 @@
+import numpy as np
+import dezero.functions as F
+from dezero import Variable
+from dezero.bptt import _graph_size
+
+
+# =============================================================================
+# graph size
+# =============================================================================
+def test_graph_size_counts_each_variable_once():
+    x = Variable(np.random.randn(8))
+    h = F.tanh(x)
+    y = F.sum(h * h + h)  # h is read three times
+    nodes, nbytes = _graph_size(y)
+    assert nodes == 4
+    assert nbytes == h.data.nbytes  # Add and Sum do not keep their inputs
@@ -0,0 +1,146 @@
+import math
+import weakref
+import numpy as np
+import pytest
+import dezero.functions as F
+from dezero import Variable
+from dezero.core import Pow
+
+
+def nth_grad(f, x, n):
+    x = Variable(np.array(x))
+    y = f(x)
+    for _ in range(n):
+        x.cleargrad()
+        y.backward(create_graph=True)
+        y = F.sum(x.grad)
+    return x.grad.data
+
+
+# =============================================================================
+# Function.saves
+# =============================================================================
+def test_inputs_are_freed_when_backward_does_not_read_them():
+    x = Variable(np.array([1.0, 2.0]))
+    y = x * 2
+    z = F.sum(y + 1) + F.sum(F.relu(y))  # Add.saves == 'shapes', ReLU 'mask'
+    ref = weakref.ref(y)
+    del y
+    assert ref() is None
+    z.backward()
+    assert np.allclose(x.grad.data, [4.0, 4.0])
+
+
+def test_inputs_in_use_still_get_their_gradient():
+    x = Variable(np.array([1.0, 2.0]))
+    y = x * 2
+    z = F.sum(F.reshape(y, (2, 1)) * 3)
+    z.backward(retrain_grad=True)
+    assert np.allclose(y.grad.data, [3.0, 3.0])
+    assert np.allclose(x.grad.data, [6.0, 6.0])
+
+
+def test_unchain_backward_cuts_freed_inputs():
+    x = Variable(np.array([1.0, 2.0]))
+    h = F.exp(x)
+    a = F.sin(x) * 2
+    y = F.sum(a + h)
+    add = y.creator.inputs[0].creator
+    del a
+    y.unchain_backward()
+    assert h.creator is None and add.inputs[1] is h
+    assert add.inputs[0].data is None and add.inputs[0].creator is None
+    y.backward()  # stops at the inputs of Sum
+    assert x.grad is None and h.grad is None
+
+
+def test_higher_order_derivative_through_shape_only_functions():
+    # d^4/dx^4 exp(x)/x = exp(x) sum_k C(4,k) (-1)^k k! / x^(k+1)
+    x = np.array([0.7, 1.5, 3.0])
+    expected = np.exp(x) * sum(math.comb(4, k) * (-1) ** k * math.factorial(k)
+                               / x ** (k + 1) for k in range(5))
+    gx = nth_grad(lambda v: F.exp(v) / v, x, 4)
+    assert np.allclose(gx, expected)
+
+
+def test_inplace_check_only_for_saved_arrays():
+    x = Variable(np.array([-1.0, 2.0]))
+    h = x * 1
+    y = F.sum(h + 1)  # Add does not read h in backward
+    F.relu_(h)
+    y.backward()
+    assert np.allclose(x.grad.data, [1.0, 1.0])
+
+    h = x * 1
+    y = F.sum(h * h)  # Mul reads h
+    F.relu_(h)
+    with pytest.raises(RuntimeError):
+        y.backward()
+
+
+# =============================================================================
+# retain_graph
+# =============================================================================
+def test_second_backward_through_freed_graph_raises():
+    x = Variable(np.array([1.0, 2.0]))
+    y = F.sin(x)
+    (y * 2).backward()
+    with pytest.raises(RuntimeError):
+        (y * 3).backward()
+
+    loss = F.sum(F.sin(x))
+    loss.backward()
+    with pytest.raises(RuntimeError):
+        loss.backward()
+
+
+def test_retain_graph_allows_second_backward():
+    x = Variable(np.array([1.0, 2.0]))
+    y = F.sin(x)
+    (y * 2).backward(retain_graph=True)
+    (y * 3).backward()
+    assert np.allclose(x.grad.data, 5 * np.cos(x.data))
+
+
+def test_create_graph_retains_graph_by_default():
+    x = Variable(np.array(2.0))
+    y = x ** 3
+    y.backward(create_graph=True)
+    gx = x.grad
+    x.cleargrad()
+    gx.backward()
+    assert np.allclose(x.grad.data, 12.0)
+
+
+def test_backward_frees_saved_inputs():
+    x = Variable(np.random.randn(3))
+    h = F.tanh(x * 2)
+    loss = F.sum(h * h)
+    mul = loss.creator.inputs[0].creator
+    loss.backward()
+    assert loss.creator.inputs is None and mul.inputs is None
+    assert h.creator is not None  # the link stays so that reuse is detected
+
+
+def test_freed_function_keeps_constructor_arguments():
+    x = Variable(np.array([0.5, 2.0]))
+    pow3, clip = Pow(3), F.Clip(0.0, 1.0)
+    y = clip(pow3(x))
+    y.backward()
+    assert clip.mask is None
+    x.cleargrad()
+    clip(pow3(x)).backward()
+    assert np.allclose(x.grad.data, [0.75, 0.0])
+
+
+def test_unchain_backward_cuts_state_after_freed_backward():
+    x = Variable(np.random.randn(3))
+    h = F.tanh(x * 2)  # kept like the state of an RNN
+    loss = F.sum(F.exp(h) * 3)
+    loss.backward()
+    loss.unchain_backward()
+    assert h.creator is None
+
+    x.cleargrad()
+    F.sum(h * x).backward()
+    assert np.allclose(x.grad.data, h.data)
@@ -0,0 +1,169 @@
+import numpy as np
+import pytest
+import dezero.functions as F
+from dezero import Variable, derivatives, jvp, no_grad, taylor
+from dezero.core import Square
+
+
+# =============================================================================
+# checkpoint
+# =============================================================================
+def test_checkpoint_outputs_sharing_intermediates():
+    def fn(x):
+        h = F.sin(x)
+        return h * 2, h * 3
+
+    x = Variable(np.array([0.5, 1.0, 2.0]))
+    a, b = F.checkpoint(fn, x)
+    F.sum(a + b).backward()
+    assert np.allclose(x.grad.data, 5 * np.cos(x.data))
+
+    x.cleargrad()
+    a, b = F.checkpoint(fn, x)
+    F.sum(b).backward()  # a gets no gradient
+    assert np.allclose(x.grad.data, 3 * np.cos(x.data))
+
+
+# =============================================================================
+# jvp (forward-mode AD)
+# =============================================================================
+def rand(*shape):
+    return np.random.randn(*shape)
+
+
+def pos(*shape):
+    return np.random.rand(*shape) + 0.5
+
+
+jvp_cases = {
+    'sin': (F.sin, [rand(3, 4)]),
+    'cos': (F.cos, [rand(3, 4)]),
+    'tanh': (F.tanh, [rand(3, 4)]),
+    'exp': (F.exp, [rand(3, 4)]),
+    'log': (F.log, [pos(3, 4)]),
+    'add': (lambda a, b: a + b, [rand(3, 4), rand(4)]),
+    'sub': (lambda a, b: a - b, [rand(3, 4), rand(3, 1)]),
+    'mul': (lambda a, b: a * b, [rand(3, 4), rand(4)]),
+    'div': (lambda a, b: a / b, [rand(3, 4), pos(3, 4)]),
+    'neg': (lambda a: -a, [rand(3, 4)]),
+    'pow': (lambda a: a ** 3.5, [pos(3, 4)]),
+    'square': (lambda a: Square()(a), [rand(3, 4)]),
+    'reshape': (lambda a: F.reshape(a, (2, 6)), [rand(3, 4)]),
+    'transpose': (F.transpose, [rand(3, 4)]),
+    'get_item': (lambda a: F.get_item(a, (slice(1, 3), [0, 2, 2])),
+                 [rand(3, 4)]),
+    'sum': (lambda a: F.sum(a, axis=1, keepdims=True), [rand(3, 4)]),
+    'sum_to': (lambda a: F.sum_to(a, (1, 4)), [rand(3, 4)]),
+    'broadcast_to': (lambda a: F.broadcast_to(a, (3, 4)), [rand(1, 4)]),
+    'matmul': (F.matmul, [rand(3, 4), rand(4, 2)]),
+    'linear': (F.linear, [rand(3, 4), rand(4, 2), rand(2)]),
+    'sigmoid': (F.sigmoid, [rand(3, 4)]),
+    'relu': (F.relu, [rand(3, 4)]),
+    'leaky_relu': (F.leaky_relu, [rand(3, 4)]),
+    'softmax': (F.softmax, [rand(3, 4)]),
+    'log_softmax': (F.log_softmax, [rand(3, 4)]),
+    'sigmoid_mul': (F.sigmoid_mul, [rand(3, 4), rand(3, 4)]),
+    'tanh_mul': (F.tanh_mul, [rand(3, 4), rand(3, 4)]),
+    'cell_update': (F.cell_update, [rand(3, 4) for _ in range(4)]),
+    'bias_activation': (lambda a, b: F.bias_activation(a, b, 'tanh'),
+                        [rand(3, 4), rand(3, 4)]),
+    'mean_squared_error': (F.mean_squared_error, [rand(3, 4), rand(3, 4)]),
+    'softmax_cross_entropy': (
+        lambda a: F.softmax_cross_entropy(a, np.array([0, 3, 1])),
+        [rand(3, 4)]),
+    'max': (lambda a: F.max(a, axis=1), [rand(3, 4)]),
+    'clip': (lambda a: F.clip(a, -0.5, 0.5), [rand(3, 4)]),
+    'batch_norm': (lambda a, g, b: F.batch_nrom(a, g, b, np.zeros(4),
+                                                np.ones(4)),
+                   [rand(5, 4), rand(4), rand(4)]),
+    'checkpoint': (lambda a, b: F.checkpoint(lambda u, v: F.sin(u) * v, a, b),
+                   [rand(3, 4), rand(3, 4)]),
+    'conv2d': (lambda x, W, b: F.conv2d(x, W, b, pad=1),
+               [rand(2, 3, 5, 5), rand(4, 3, 3, 3), rand(4)]),
+    'deconv2d': (lambda x, W, b: F.deconv2d(x, W, b, stride=2),
+                 [rand(2, 3, 4, 4), rand(3, 2, 3, 3), rand(2)]),
+    'pooling': (lambda x: F.pooling(x, 2, 2), [rand(2, 3, 4, 4)]),
+    'average_pooling': (lambda x: F.average_pooling(x, 2, 2),
+                        [rand(2, 3, 4, 4)]),
+    'im2col': (lambda x: F.im2col(x, 3, pad=1), [rand(2, 3, 4, 4)]),
+    'col2im': (lambda x: F.col2im(x, (2, 3, 4, 4), 3, pad=1),
+               [rand(2, 3, 3, 3, 4, 4)]),
+}
+
+
+@pytest.mark.parametrize('name', sorted(jvp_cases))
+def test_jvp_matches_finite_differences(name):
+    fn, xs = jvp_cases[name]
+    vs = [rand(*x.shape) for x in xs]
+    y, ty = jvp(fn, xs, vs)
+
+    eps = 1e-6
+    def at(s):
+        with no_grad():
+            return fn(*[Variable(x + s * eps * v)
+                       for x, v in zip(xs, vs)]).data
+    fd = (at(1) - at(-1)) / (2 * eps)
+    assert ty.shape == y.shape
+    assert np.allclose(ty, fd, rtol=1e-5, atol=1e-8)
+
+
+def test_jvp_fixed_and_unused_inputs():
+    x, W = rand(3, 4), rand(4, 2)
+    y, ty = jvp(F.matmul, [x, W], [None, np.ones_like(W)])
+    assert np.allclose(ty, x.dot(np.ones_like(W)))
+
+    (a, b), (ta, tb) = jvp(lambda x, z: (F.sin(x), z * 2), [x, x], [x, None])
+    assert np.allclose(ta, np.cos(x) * x) and not tb.any()
+
+
+# =============================================================================
+# taylor (Taylor-mode AD)
+# =============================================================================
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+taylor_cases = {
+    # f, x, f'''(x)
+    'sin': (F.sin, rand(5), lambda x: -np.cos(x)),
+    'cos': (F.cos, rand(5), lambda x: np.sin(x)),
+    'exp': (F.exp, rand(5), np.exp),
+    'log': (F.log, pos(5), lambda x: 2 / x ** 3),
+    'pow': (lambda x: x ** 3.5, pos(5), lambda x: 3.5 * 2.5 * 1.5 * x ** 0.5),
+    'square': (lambda x: Square()(x) * x, rand(5), lambda x: 6 + 0 * x),
+    'div': (lambda x: x / (x + 2), pos(5), lambda x: 12 / (x + 2) ** 4),
+    'tanh': (F.tanh, rand(5),
+             lambda x: (1 - np.tanh(x) ** 2) * (6 * np.tanh(x) ** 2 - 2)),
+    'sigmoid': (F.sigmoid, rand(5), lambda x: sigmoid(x) * (1 - sigmoid(x))
+                * (1 - 6 * sigmoid(x) + 6 * sigmoid(x) ** 2)),
+    'mul': (lambda x: x * F.sin(x), rand(5),
+            lambda x: -3 * np.sin(x) - x * np.cos(x)),
+    'linear_ops': (lambda x: F.reshape(F.sum_to(F.broadcast_to(
+        F.exp(x), (2, 5)), (1, 5)), (5,)) / 2 - x, rand(5), np.exp),
+    'checkpoint': (lambda x: F.checkpoint(F.sin, x), rand(5),
+                   lambda x: -np.cos(x)),
+}
+
+
+@pytest.mark.parametrize('name', sorted(taylor_cases))
+def test_third_derivative_matches_closed_form(name):
+    fn, x, expected = taylor_cases[name]
+    ds = derivatives(fn, x, 3)
+    with no_grad():
+        assert np.allclose(ds[0], fn(x).data)
+    assert np.allclose(ds[3], expected(x))
+
+
+@pytest.mark.parametrize('fn', [F.matmul, F.linear])
+def test_taylor_bilinear(fn):
+    # (x + x1 t)(W + W1 t) = xW + (x1 W + x W1) t + x1 W1 t^2
+    x, W, x1, W1 = rand(3, 4), rand(4, 2), rand(3, 4), rand(4, 2)
+    y, (y1, y2, y3) = taylor(fn, [x, W], [[x1, None, None], [W1]])
+    assert np.allclose(y1, x1.dot(W) + x.dot(W1))
+    assert np.allclose(y2, x1.dot(W1))
+    assert np.allclose(y3, 0)
+
+
+def test_taylor_unsupported_function():
+    with pytest.raises(NotImplementedError):
+        derivatives(F.softmax, rand(2, 3), 2)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import dezero.functions as F
+import dezero.layers as L
+from dezero import Model, Parameter, Variable, no_grad
+from dezero.models import MLP
+
+
+# =============================================================================
+# inference under no_grad
+# =============================================================================
+def test_no_grad_returns_variables_without_graph():
+    model = MLP((8, 3))
+    x = np.random.randn(4, 5)
+    expected = model(x).data
+    with no_grad():
+        y = model(x)
+    assert isinstance(y, Variable) and y.creator is None
+    assert np.allclose(y.data, expected)
+
+
+def test_no_grad_inside_layer_forward():
+    class Net(Model):
+        def __init__(self):
+            super().__init__()
+            self.l1 = L.Linear(3)
+            self.l1.W.data = np.random.randn(5, 3)
+            self.b = Parameter(np.random.randn(5))
+
+        def forward(self, x):
+            h = self.l1(x)
+            assert isinstance(h, Variable) and isinstance(h.data, np.ndarray)
+            return F.linear_simple(h, self.l1.W.T, self.b)
+
+    x = np.random.randn(2, 5)
+    net = Net()
+    expected = net(x).data
+    with no_grad():
+        assert np.allclose(net(x).data, expected)
+
+
+@pytest.mark.parametrize('cls, names', [(L.RNN, ('h',)),
+                                        (L.LSTM, ('h', 'c'))])
+def test_recurrent_state_stays_variable(cls, names):
+    layer = cls(4)
+    x = np.random.randn(2, 3)
+    with no_grad():
+        layer(x)
+        layer(x)
+    for name in names:
+        assert isinstance(getattr(layer, name), Variable)
+
+    y = F.sum(layer(x))  # grad-enabled step on top of the inferred state
+    y.backward()
+    assert all(p.grad is not None for p in layer.params())
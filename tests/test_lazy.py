@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+import dezero.functions as F
+import dezero.lazy as lazy
+from dezero import Parameter, Variable, no_grad
+from dezero.core import add_
+from dezero.lazy import LazyVariable, _data
+
+
+def run(fn, xs, mode):
+    xs = [Parameter(x.copy()) for x in xs]
+    if mode == 'lazy':
+        with lazy.lazy():
+            y = fn(*xs)
+            y.backward()
+    else:
+        y = fn(*xs)
+        y.backward()
+    return y.data, [x.grad.data for x in xs]
+
+
+def check_lazy(fn, xs):
+    y, gxs = run(fn, xs, 'lazy')
+    y_expected, gxs_expected = run(fn, xs, 'eager')
+    assert np.allclose(y, y_expected)
+    for gx, gx_expected in zip(gxs, gxs_expected):
+        assert np.allclose(gx, gx_expected)
+
+
+def spy_products(monkeypatch):
+    lengths = []
+    product = lazy._product
+    def spy(arrays):
+        lengths.append(len(arrays))
+        return product(arrays)
+    monkeypatch.setattr(lazy, '_product', spy)
+    return lengths
+
+
+# =============================================================================
+# matmul chains
+# =============================================================================
+def test_matmul_chain_is_reassociated(monkeypatch):
+    x, A, B, v = [np.random.randn(*s) for s in
+                  [(30, 40), (40, 50), (50, 60), (60, 1)]]
+    lengths = spy_products(monkeypatch)
+    with no_grad(), lazy.lazy():
+        y = F.matmul(F.matmul(F.matmul(x, A), B), v)
+        assert isinstance(y, LazyVariable) and _data.__get__(y) is None
+        y_data = y.data
+    assert lengths == [4]
+    assert np.allclose(y_data, x.dot(A).dot(B).dot(v))
+
+
+def test_product_order_has_fewest_multiply_adds(monkeypatch):
+    shapes = []
+    dot = lazy.utils.dot
+    def spy(a, b):
+        shapes.append((a.shape, b.shape))
+        return dot(a, b)
+    monkeypatch.setattr(lazy.utils, 'dot', spy)
+    x, A, v = np.random.randn(20, 30), np.random.randn(30, 40), \
+        np.random.randn(40, 1)
+    y = lazy._product([x, A, v])
+    assert shapes == [((30, 40), (40, 1)), ((20, 30), (30, 1))]
+    assert np.allclose(y, x.dot(A).dot(v))
+
+
+def test_matmul_chain_gradients_match_eager():
+    xs = [np.random.randn(*s) for s in [(5, 6), (6, 7), (7, 2), (2,)]]
+    check_lazy(lambda x, A, B, b: F.sum(F.tanh(F.linear(F.matmul(x, A), B,
+                                                        b))), xs)
+
+
+# =============================================================================
+# sums of broadcast terms
+# =============================================================================
+def test_biases_are_summed_before_the_full_term(monkeypatch):
+    x, W, b0, b1 = [np.random.randn(*s) for s in [(8, 5), (5, 3), (3,), (3,)]]
+    lengths = spy_products(monkeypatch)
+    with no_grad(), lazy.lazy():
+        y = F.linear(x, W, b0) + b1
+        plan = lazy._plan(y)
+        y_data = y.data
+    assert plan[0] == 'sum' and len(plan[1]) == 3 and plan[1][0][0] == 'prod'
+    assert lengths == [2]
+    assert np.allclose(y_data, x.dot(W) + b0 + b1)
+
+
+def test_bias_sum_gradients_match_eager():
+    xs = [np.random.randn(*s) for s in [(4, 3), (3,), (1, 3), (4, 1)]]
+    check_lazy(lambda x, b0, b1, b2: F.sum(F.sin(x + b0 + b1 + b2)), xs)
+
+
+# =============================================================================
+# buffer donation
+# =============================================================================
+def test_donated_intermediate_is_recomputed_when_read():
+    x = np.random.rand(3, 4)
+    with no_grad(), lazy.lazy():
+        a = F.exp(x)
+        b = F.sin(a)
+        b_data = b.data
+        # a's buffer now holds b
+        assert _data.__get__(a) is None and a.node is not None
+        a_data = a.data
+    assert np.allclose(b_data, np.sin(np.exp(x)))
+    assert np.allclose(a_data, np.exp(x))
+    assert not np.shares_memory(a_data, b_data)
+
+
+def test_intermediate_in_the_graph_is_not_donated():
+    x = Variable(np.random.rand(3, 4))
+    with lazy.lazy():
+        a = F.exp(x)
+        b = F.sin(a)
+        b_data = b.data
+        assert _data.__get__(a) is not None
+    assert np.allclose(a.data, np.exp(x.data))
+    assert np.allclose(b_data, np.sin(np.exp(x.data)))
+
+
+def test_elementwise_chain_gradients_match_eager():
+    xs = [np.random.rand(3, 4) + 0.5, np.random.randn(4)]
+    check_lazy(lambda x, b: F.sum(F.sigmoid(F.log(x) * b) ** 2
+                                  - F.relu(-x + b) / x), xs)
+
+
+# =============================================================================
+# in-place modification
+# =============================================================================
+def test_input_modified_before_evaluation_raises():
+    x = Variable(np.ones(3))
+    with no_grad(), lazy.lazy():
+        y = x * 2
+        add_(x, 1.0)
+        with pytest.raises(RuntimeError):
+            y.data
+    assert np.allclose(x.data, 2)
+
+
+def test_input_modified_before_recording_is_used():
+    x = Variable(np.ones(3))
+    with no_grad(), lazy.lazy():
+        add_(x, 1.0)
+        y = x * 2
+        assert np.allclose(y.data, 4)
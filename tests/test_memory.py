@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from dezero import Config, Function, Variable
+from dezero.memory import Arena, use_arena
+import dezero.memory as memory
+
+
+# =============================================================================
+# Arena
+# =============================================================================
+def test_buffer_is_reused_only_when_unreferenced():
+    arena = Arena()
+    a = arena.empty((3, 4), np.float32)
+    view = a[1:]
+    del a
+    b = arena.empty((3, 4), np.float32)
+    assert not np.shares_memory(b, view)
+    del view
+    c = arena.empty((3, 4), np.float32)
+    assert arena.stats['reuses'] == 1 and arena.stats['requests'] == 3
+    assert arena.stats['bytes'] == 2 * c.nbytes
+
+
+def test_max_bytes_evicts_least_recently_used():
+    arena = Arena(max_bytes=3 * 800)
+    for shape in [(100,), (50, 2), (10, 10)]:
+        arena.empty(shape, np.float64)
+    arena.empty((100,), np.float64)  # (50, 2) is now the oldest
+    kept = arena.empty((5, 20), np.float64)
+    assert arena.stats['evictions'] == 1
+    assert ((50, 2), np.dtype(np.float64)) not in arena.pools
+    assert arena.stats['bytes'] <= arena.max_bytes
+
+    held = [arena.empty((10, 10), np.float64), arena.empty((100,), np.float64),
+            kept]
+    a = arena.empty((4, 25), np.float64)  # nothing free: not pooled
+    assert arena.stats['bytes'] == 3 * 800
+    assert all(a is not b for pool in arena.pools.values() for b in pool)
+
+
+class Square(Function):
+    def forward(self, x):
+        return np.multiply(x, x, out=memory.empty_like(x))
+
+    def backward(self, gy):
+        x, = self.inputs
+        return 2 * x * gy
+
+
+def test_use_arena_restores_config():
+    x = np.random.randn(3, 4)
+    with use_arena() as arena:
+        for _ in range(3):
+            y = Square()(Variable(x))
+            y.backward()
+        assert np.allclose(y.data, x * x)
+    assert Config.arena is None
+    assert arena.stats['requests'] == 3 and arena.stats['reuses'] == 1
+    assert Square()(x).data is not y.data  # no arena: plain NumPy
+
+
+def test_arena_needs_exact_refcounts(monkeypatch):
+    monkeypatch.setattr(memory, '_unused', lambda pool, i: False)
+    with pytest.raises(RuntimeError):
+        Arena()
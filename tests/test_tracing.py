@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+import dezero.functions as F
+from dezero import Variable, optimizers, using_config
+from dezero.models import MLP
+from dezero.tracing import TracedStep, optimize_graph
+
+
+def record(fn, *xs):
+    ops = []
+    with using_config('tape', ops):
+        y = fn(*xs)
+    return ops, y
+
+
+# =============================================================================
+# optimize_graph
+# =============================================================================
+@pytest.mark.parametrize('fn', [
+    F.relu, lambda x: F.leaky_relu(x, 0.1), lambda x: F.clip(x, -0.5, 0.5),
+    lambda x: F.sigmoid_mul(x, x), lambda x: F.tanh_mul(x, x),
+    lambda x: F.pooling(x, 2, 2)])
+def test_cse_merges_functions_with_saved_arrays(fn):
+    x = Variable(np.random.randn(2, 3, 4, 4))
+    ops, y = record(lambda x: fn(x) + fn(x), x)
+    expected = y.data.copy()
+    ops, (y,), stats = optimize_graph(ops, [y], keep=[x])
+    assert stats['cse']['nodes'] == 1
+    a, b = y.creator.inputs
+    assert a is b
+    assert np.allclose(F.add(a, b).data, expected)
+
+
+def test_cse_keeps_different_parameters_and_inplace_ops():
+    x = Variable(np.random.randn(3, 4))
+    ops, y = record(lambda x: F.sum(x, axis=0) + F.sum(x, axis=1)[0], x)
+    _, _, stats = optimize_graph(ops, [y], keep=[x])
+    assert stats['cse']['nodes'] == 0
+
+    ops, y = record(lambda x: F.add_(x * 1, 1.0) + F.add_(x * 1, 1.0), x)
+    _, _, stats = optimize_graph(ops, [y], keep=[x])
+    assert stats['cse']['nodes'] == 0  # x * 1 is then written in place
+
+
+def test_dce_drops_unused_branch():
+    x = Variable(np.random.randn(3))
+    ops, (y, _) = record(lambda x: (F.sin(x), F.exp(F.cos(x))), x)
+    ops, _, stats = optimize_graph(ops, [y], keep=[x])
+    assert stats['dce']['nodes'] == 2
+    assert [type(f).__name__ for f, _, _ in ops] == ['Sin']
+
+
+# =============================================================================
+# TracedStep
+# =============================================================================
+@pytest.mark.parametrize('optimize', [False, True])
+def test_traced_step_replay_matches_eager(optimize):
+    np.random.seed(0)
+    model = MLP((10, 3))
+    x0, t0 = np.random.randn(4, 5), np.array([0, 1, 2, 0])
+    x1, t1 = np.random.randn(4, 5), np.array([2, 2, 1, 0])
+    step = TracedStep(model, F.softmax_cross_entropy, optimize=optimize)
+    step(x0, t0)
+    loss = step(x1, t1)
+    grads = [p.grad.data.copy() for p in model.params()]
+
+    expected = F.softmax_cross_entropy(model(x1), t1)
+    model.cleargrads()
+    expected.backward()
+    assert np.allclose(loss.data, expected.data)
+    for g, p in zip(grads, model.params()):
+        assert np.allclose(g, p.grad.data)
+
+
+def test_traced_step_falls_back_to_eager_on_new_shape():
+    model = MLP((10, 3))
+    optimizer = optimizers.SGD().setup(model)
+    step = TracedStep(model, F.softmax_cross_entropy)
+    step(np.random.randn(4, 5), np.array([0, 1, 2, 0]))
+    optimizer.update()
+    x, t = np.random.randn(2, 5), np.array([1, 2])
+    loss = step(x, t)
+    assert np.allclose(loss.data, F.softmax_cross_entropy(model(x), t).data)
+    assert step.key[0][0][0] == (4, 5)
@@ -0,0 +1,100 @@
+import io
+import json
+import numpy as np
+import pytest
+import dezero.functions as F
+import dezero.layers as L
+from dezero import Function, Variable
+from dezero.core import Pow
+from dezero.functions_conv import Conv2d
+from dezero.utils import get_dot_graph, gradient_check, write_graph
+
+
+# =============================================================================
+# graph export
+# =============================================================================
+def export_json(y, **kwargs):
+    f = io.StringIO()
+    write_graph(y, f, 'json', **kwargs)
+    return json.loads(f.getvalue())
+
+
+def count(records, kind):
+    return sum(1 for r in records if r['kind'] == kind)
+
+
+def test_write_graph_one_node_per_variable():
+    x = Variable(np.array([1.0, 2.0]))
+    a = F.sin(x)
+    y = a * 2 + a  # a is read by Mul (saves inputs) and Add (saves shapes)
+    records = export_json(y)
+    # x, a, 2, a * 2, y / Sin, Mul, Add
+    assert count(records, 'variable') == 5
+    assert count(records, 'function') == 3
+    assert count(records, 'edge') == 8
+    sin_id = id(a.creator)
+    assert sum(1 for r in records
+               if r['kind'] == 'edge' and r['source'] == sin_id) == 1
+
+    dot = get_dot_graph(y)
+    assert dot.count('label=') == 8
+
+
+def test_write_graph_max_depth():
+    x = Variable(np.array(1.0))
+    y = F.exp(F.sin(F.cos(x)))
+    records = export_json(y, max_depth=1)
+    assert count(records, 'function') == 1
+    assert count(records, 'variable') == 2
+
+
+def test_graph_freed_by_backward_is_not_drawn():
+    x = Variable(np.random.randn(3))
+    loss = F.sum(F.exp(F.sin(x)))
+    loss.backward(retain_graph=True)
+    assert get_dot_graph(loss).count('label=') == 7
+    loss.backward()
+    with pytest.raises(RuntimeError):
+        get_dot_graph(loss)
+
+
+# =============================================================================
+# gradient_check
+# =============================================================================
+class WrongSquare(Function):
+    def forward(self, x):
+        return x ** 2
+
+    def backward(self, gy):
+        x, = self.inputs
+        return gy * x  # 2 * x * gy が正しい
+
+
+def test_gradient_check_layers():
+    x = np.random.randn(2, 3, 6, 6).astype(np.float32)
+    conv = L.Conv2d(4, 3, pad=1)
+    assert gradient_check(conv, x) < 1e-6
+    assert conv.W.data.dtype == np.float32 and conv.W.grad is None
+    assert gradient_check(L.Linear(5), x.reshape(2, -1)) < 1e-6
+
+
+def test_gradient_check_functions():
+    x = np.random.randn(3, 4)
+    assert gradient_check(Pow(3), x) < 1e-6
+    assert gradient_check(F.Sum(1, False), x) < 1e-6
+    W = np.random.randn(2, 3, 3, 3)
+    x = np.random.randn(1, 3, 5, 5)
+    assert gradient_check(Conv2d(1, 1), x, W, None) < 1e-6
+
+
+def test_gradient_check_finds_wrong_backward():
+    x = np.random.randn(3, 4)
+    assert gradient_check(lambda x: x ** 2, x) < 1e-6
+    assert gradient_check(WrongSquare(), x) > 0.1
+
+
+def test_gradient_check_near_zero_gradient():
+    x = np.random.randn(3, 4)
+    f = lambda x: x * 1e-10 + 1.0  # 差分の丸め誤差が勾配と同程度
+    assert gradient_check(f, x) < 1e-2
+    assert gradient_check(f, x, atol=0) > 0.1